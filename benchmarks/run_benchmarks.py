@@ -0,0 +1,274 @@
+"""
+Benchmarks of the main UI paths against the in-memory Supabase stand-in.
+
+Each dataset size runs in its own process with a fresh data directory. The
+process seeds a FakeSupabase, builds the real PaymentApp on a headless Tk and
+measures each case: wall time (median of the repeats), the part of it spent
+inside the fake backend, queries issued through the data layer, requests that
+reached the backend, and peak Python memory (tracemalloc, in a separate run so
+it does not skew the timings).
+
+    xvfb-run python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --latency-ms 20 --json results.json
+    python benchmarks/run_benchmarks.py --baseline results.json
+
+Xvfb is started automatically when there is no display and it is installed.
+With --baseline, the exit status is 1 when a case is slower than the
+baseline times --tolerance, or issues more queries than the baseline did.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+DEFAULT_SIZES = (1000, 10000, 100000)
+IDLE_TIMEOUT = 600.0
+
+def seed(fake, size, seed_value=42):
+    """Fill the fake with size payments spread over size / 10 clients"""
+    generator = random.Random(seed_value)
+    client_count = max(10, size // 10)
+    first_names = ["Ana", "João", "Maria", "José", "Antônio", "Francisca", "Carlos", "Paula", "Luís", "Lúcia"]
+    fake.load("clients", (
+        {"name": f"{generator.choice(first_names)} Cliente {index:06d}", "phone": f"+5544{generator.randrange(10 ** 8, 10 ** 9)}"}
+        for index in range(client_count)
+    ))
+    start = date.today() - timedelta(days=365)
+    fake.load("payments", (
+        {
+            "client_id": generator.randrange(1, client_count + 1),
+            "amount": round(generator.uniform(50, 5000), 2),
+            "due_date": (start + timedelta(days=generator.randrange(730))).isoformat(),
+            "is_paid": generator.random() < 0.3,
+        }
+        for _ in range(size)
+    ))
+
+def wait_idle(root, runner, timeout=IDLE_TIMEOUT):
+    """Process Tk events until every background request has been delivered"""
+    deadline = time.perf_counter() + timeout
+    root.update()
+    while runner.pending or not runner.calls.empty():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("background requests did not finish")
+        time.sleep(0.001)
+        root.update()
+    root.update()
+
+class Worker:
+    """
+    Runs the cases for one dataset size inside the current process.
+    """
+    def __init__(self, size, latency, source):
+        sys.path.insert(0, SRC_DIR)
+        import supabase_client
+        from fake_supabase import FakeSupabase
+        from metrics import metrics
+
+        self.size = size
+        self.metrics = metrics
+        self.fake = FakeSupabase(latency=latency)
+        seed(self.fake, size)
+        self.mirror = supabase_client.supabase
+        self.mirror.connect = lambda: self.fake
+        if source == "mirror":
+            from mirror_sync import MirrorSync
+            MirrorSync(self.mirror).sync()
+
+        import tkinter as tk
+        from paymentapp import PaymentApp
+        self.root = tk.Tk()
+        self.app = PaymentApp(self.root)
+        # Keep the numbers free of background pulls
+        self.app.mirror_sync.start = lambda: None
+        self.idle()
+
+    def idle(self):
+        wait_idle(self.root, self.app.runner)
+
+    def query_count(self):
+        return sum(row['count'] for row in self.metrics.query_report())
+
+    def measure(self, name, setup, run, repeat):
+        """Time run() repeat times after setup(), then measure its peak memory once more"""
+        timings, queries, requests, backend = [], [], [], []
+        for _ in range(repeat):
+            setup()
+            self.idle()
+            self.fake.reset_counters()
+            before = self.query_count()
+            started = time.perf_counter()
+            run()
+            self.idle()
+            timings.append(time.perf_counter() - started)
+            queries.append(self.query_count() - before)
+            requests.append(sum(self.fake.requests.values()))
+            backend.append(self.fake.busy_seconds)
+        setup()
+        self.idle()
+        tracemalloc.start()
+        run()
+        self.idle()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {
+            "size": self.size,
+            "case": name,
+            "wall_ms": statistics.median(timings) * 1000,
+            "queries": max(queries),
+            "remote_requests": max(requests),
+            "backend_ms": statistics.median(backend) * 1000,
+            "peak_kib": peak / 1024,
+        }
+
+    def cases(self):
+        """(name, setup, run) of every benchmark case"""
+        app = self.app
+        client_name = next(iter(app.client_index.id_by_display))
+
+        def reset_main():
+            if app.client_filter is not None or "client_id" in app.pager.filters:
+                app.refresh_data()
+
+        def filter_by_client():
+            app.combobox_client_filter.set(client_name)
+            app.filter_by_client()
+
+        def reminder_candidates():
+            # The candidate building of send_reminder, without sending anything
+            app.reminder_candidates(list(app.table.get_children()))
+
+        def build_reminders():
+            # Candidates plus the rendering of their messages from the templates
+            from send_reminder import build_reminders
+            build_reminders(app.reminder_candidates(list(app.table.get_children())))
+
+        def open_client_crud():
+            from clientcrud import ClientCRUD
+            self.client_crud = ClientCRUD(self.root, app)
+
+        def open_payment_crud():
+            import paymentcrud
+            # Confirm the deletion dialog automatically
+            paymentcrud.messagebox.askyesno = lambda *args, **kwargs: True
+            self.payment_crud = paymentcrud.PaymentCRUD(self.root, app)
+
+        def select_payments():
+            if not hasattr(self, "payment_crud"):
+                open_payment_crud()
+                self.idle()
+            keys = self.payment_crud.payment_table.get_children()[:100]
+            self.payment_crud.payment_table.selection_set(keys)
+
+        return [
+            ("PaymentApp.load_data", reset_main, app.load_data),
+            ("PaymentApp.filter_by_client", reset_main, filter_by_client),
+            ("PaymentApp.toggle_paid", reset_main, app.toggle_paid),
+            ("VirtualTable.sort_by", reset_main, lambda: app.table.sort_by("Valor")),
+            ("PaymentApp.reminder_candidates", reset_main, reminder_candidates),
+            ("send_reminder.build_reminders", reset_main, build_reminders),
+            ("ClientCRUD.load_clients", lambda: hasattr(self, "client_crud") or open_client_crud(), lambda: self.client_crud.load_clients()),
+            ("PaymentCRUD.delete_payments", select_payments, lambda: self.payment_crud.delete_payments()),
+        ]
+
+    def run(self, repeat):
+        results = []
+        for name, setup, run in self.cases():
+            results.append(self.measure(name, setup, run, repeat))
+        self.root.destroy()
+        return results
+
+def ensure_display():
+    """Start Xvfb when there is no display; returns the process to stop, or None"""
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return None
+    if not shutil.which("Xvfb"):
+        sys.exit("No display: install Xvfb or run under xvfb-run.")
+    display = ":%d" % (90 + os.getpid() % 100)
+    process = subprocess.Popen(["Xvfb", display, "-screen", "0", "1600x900x24"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    os.environ["DISPLAY"] = display
+    return process
+
+def run_size(size, args):
+    """Run the cases for one size in a fresh process and return its results"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, PAYMENT_MANAGER_DATA_DIR=data_dir)
+        command = [
+            sys.executable, os.path.abspath(__file__), "--worker", str(size),
+            "--latency-ms", str(args.latency_ms), "--source", args.source, "--repeat", str(args.repeat),
+        ]
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def print_table(results):
+    print(f"{'size':>8}  {'case':<32} {'wall ms':>10} {'backend ms':>10} {'queries':>8} {'remote':>7} {'peak KiB':>10}")
+    for row in results:
+        print(
+            f"{row['size']:>8}  {row['case']:<32} {row['wall_ms']:>10.1f} {row['backend_ms']:>10.1f}"
+            f" {row['queries']:>8} {row['remote_requests']:>7} {row['peak_kib']:>10.0f}"
+        )
+
+def regressions(results, baseline, tolerance):
+    """Cases slower than the baseline times tolerance or issuing more queries"""
+    previous = {(row['size'], row['case']): row for row in baseline}
+    found = []
+    for row in results:
+        base = previous.get((row['size'], row['case']))
+        if base is None:
+            continue
+        if row['wall_ms'] > base['wall_ms'] * tolerance:
+            found.append(f"{row['case']} @ {row['size']}: {row['wall_ms']:.1f} ms vs {base['wall_ms']:.1f} ms")
+        if row['queries'] > base['queries']:
+            found.append(f"{row['case']} @ {row['size']}: {row['queries']} queries vs {base['queries']}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="artificial latency of each backend request")
+    parser.add_argument("--source", choices=("supabase", "mirror"), default="supabase",
+                        help="read from the fake backend directly, or from a local mirror synced beforehand")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare with the results of an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown over the baseline")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        results = Worker(args.worker, args.latency_ms / 1000, args.source).run(args.repeat)
+        print(json.dumps(results))
+        return
+
+    xvfb = ensure_display()
+    try:
+        results = []
+        for size in args.sizes:
+            results.extend(run_size(size, args))
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            found = regressions(results, json.load(baseline_file), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+-- Delta sync support: an updated_at high-water mark on every synced table and
+-- a tombstone table recording deleted rows, including cascaded deletes.
+
+alter table clients add column if not exists updated_at timestamptz not null default now();
+alter table payments add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists clients_updated_at_idx on clients (updated_at, id);
+create index if not exists payments_updated_at_idx on payments (updated_at, id);
+
+create or replace function set_updated_at() returns trigger as $$
+begin
+    new.updated_at = clock_timestamp();
+    return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists clients_set_updated_at on clients;
+create trigger clients_set_updated_at before insert or update on clients
+    for each row execute function set_updated_at();
+
+drop trigger if exists payments_set_updated_at on payments;
+create trigger payments_set_updated_at before insert or update on payments
+    for each row execute function set_updated_at();
+
+create table if not exists deleted_rows (
+    id bigserial primary key,
+    table_name text not null,
+    row_id bigint not null,
+    deleted_at timestamptz not null default now()
+);
+
+create index if not exists deleted_rows_table_idx on deleted_rows (table_name, id);
+-- Syncs re-read the tombstones of the last seconds, see DELTA_SYNC_OVERLAP
+create index if not exists deleted_rows_deleted_at_idx on deleted_rows (table_name, deleted_at);
+
+create or replace function record_deleted_row() returns trigger as $$
+begin
+    insert into deleted_rows (table_name, row_id) values (tg_table_name, old.id);
+    return old;
+end;
+$$ language plpgsql;
+
+drop trigger if exists clients_record_deleted_row on clients;
+create trigger clients_record_deleted_row after delete on clients
+    for each row execute function record_deleted_row();
+
+drop trigger if exists payments_record_deleted_row on payments;
+create trigger payments_record_deleted_row after delete on payments
+    for each row execute function record_deleted_row();
@@ -1,6 +1,16 @@
-import tkinter as tk
-from paymentapp import PaymentApp
+import argparse
+from startup_profile import StartupProfiler
+
+parser = argparse.ArgumentParser(description="Sistema de Pagamentos")
+parser.add_argument("--profile-startup", action="store_true", help="report import times and time to first paint on stderr")
+args = parser.parse_args()
+
+profiler = StartupProfiler(enabled=args.profile_startup)
+with profiler.imports():
+    import tkinter as tk
+    from paymentapp import PaymentApp
 
 root = tk.Tk()
 app = PaymentApp(root)
+profiler.watch(root, app.runner)
 root.mainloop()
@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from settings import *
+from repositories import BacklogRepository
+from local_mirror import is_offline_error
+
+class AuditLogWriter:
+    """
+    Writes backlog entries to Supabase in batches from a background thread.
+    Every entry is appended to a local spool file before it is queued, and the
+    spool is compacted once the server confirms the insert, so entries survive a
+    slow or unreachable backend and are replayed the next time the app starts.
+    Each process needs its own spool_path, or one would replay and drop the
+    entries of the other. Entries the server refuses are moved to a
+    "_rejected" file next to the spool instead of blocking the ones after them.
+    """
+    def __init__(self, spool_path=AUDIT_SPOOL_PATH, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL):
+        self.repository = BacklogRepository()
+        self.spool_path = spool_path
+        self.rejected_path = os.path.splitext(spool_path)[0] + "_rejected.jsonl"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.pending = self.read_spool()
+
+        self.thread = threading.Thread(target=self.run, name="audit-log", daemon=True)
+        self.thread.start()
+        if self.pending:
+            self.wakeup.set()
+
+    def log(self, responsible_user, descriptions):
+        """Queue entries for the backlog table without waiting for the server"""
+        created_at = datetime.now(timezone.utc).isoformat()
+        entries = [
+            {"responsible_user": responsible_user, "description": description, "created_at": created_at}
+            for description in descriptions
+        ]
+        with self.lock:
+            self.append_to_spool(entries)
+            self.pending.extend(entries)
+            if len(self.pending) >= self.batch_size:
+                self.wakeup.set()
+
+    def run(self):
+        """Flush the queue when a batch is full, on every timer tick and once more when closing"""
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+            if self.stopping:
+                return
+
+    def flush(self):
+        """Insert the queued entries batch by batch, keeping them spooled while the backend cannot be reached"""
+        one_by_one = 0
+        while True:
+            with self.lock:
+                batch = self.pending[:1 if one_by_one else self.batch_size]
+            if not batch:
+                return
+            try:
+                self.repository.insert_many(batch)
+            except Exception as error:
+                if is_offline_error(error):
+                    # Backend slow or unreachable: the entries stay in the spool for the next attempt
+                    return
+                if len(batch) > 1:
+                    # Refused by the server: go through the batch one entry at a time to set aside only the bad ones
+                    one_by_one = len(batch)
+                    continue
+                self.reject(batch[0], error)
+            one_by_one = max(0, one_by_one - 1)
+            with self.lock:
+                # Only this thread removes entries and new ones are appended at the end
+                del self.pending[:len(batch)]
+                self.rewrite_spool()
+
+    def reject(self, entry, error):
+        """Move an entry the server refused to the rejected file and report it"""
+        print(f"Backlog entry refused by the server, kept in {self.rejected_path}: {error}", file=sys.stderr)
+        try:
+            with open(self.rejected_path, "a", encoding="utf-8") as rejected:
+                rejected.write(json.dumps(dict(entry, error=str(error)), ensure_ascii=False) + "\n")
+        except OSError:
+            # Reported above; the entry must not block the spool either way
+            pass
+
+    def close(self, timeout=AUDIT_CLOSE_TIMEOUT):
+        """Flush what is queued before the app exits; anything left stays in the spool"""
+        self.stopping = True
+        self.wakeup.set()
+        self.thread.join(timeout)
+
+    def read_spool(self):
+        """Load the entries left over by a previous run"""
+        if not os.path.exists(self.spool_path):
+            return []
+        entries = []
+        with open(self.spool_path, encoding="utf-8") as spool:
+            for line in spool:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash while it was being written
+                    continue
+        return entries
+
+    def append_to_spool(self, entries):
+        """Append entries to the spool file, one JSON object per line"""
+        os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+        with open(self.spool_path, "a", encoding="utf-8") as spool:
+            for entry in entries:
+                spool.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def rewrite_spool(self):
+        """Replace the spool with the entries still waiting for the server"""
+        temporary_path = self.spool_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as spool:
+            for entry in self.pending:
+                spool.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(temporary_path, self.spool_path)
@@ -0,0 +1,126 @@
+import queue
+import sys
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+from settings import *
+from metrics import metrics
+
+class BackgroundRunner:
+    """
+    Runs data-access calls on a bounded pool of worker threads and delivers their
+    results on the Tk thread by polling a queue with root.after.
+    Requests submitted under the same key supersede each other: when a newer one
+    is submitted, the older one is skipped if it has not started yet and its
+    callbacks are dropped if it has.
+    """
+    def __init__(self, root, max_workers=MAX_REQUESTS_IN_FLIGHT, poll_ms=BACKGROUND_POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase")
+        self.results = queue.Queue()
+        self.calls = queue.Queue()
+        self.generations = {}
+        self.unique_keys = count()
+        self.pending = 0
+        self.busy = False
+        self.busy_listeners = []
+        self.root.after(self.poll_ms, self.poll)
+
+    def submit(self, key, func, on_success=None, on_error=None, owner=None):
+        """
+        Run func in the background. on_success(result) or on_error(error) runs on the
+        Tk thread, unless a newer request with the same key was submitted or the
+        owner widget was destroyed. A key of None never supersedes anything.
+        """
+        if key is None:
+            key = ("unique", next(self.unique_keys))
+        # Tag the queries and time the callbacks under the UI action that submitted the request
+        func = metrics.bind(func)
+        on_success = on_success and metrics.bind(on_success, timed=True)
+        on_error = on_error and metrics.bind(on_error, timed=True)
+        generation = self.generations.get(key, 0) + 1
+        self.generations[key] = generation
+        self.pending += 1
+        self.notify_busy()
+        self.executor.submit(self.run, key, generation, func, on_success, on_error or self.show_error, owner)
+
+    def cancel(self, key):
+        """Drop the result of the latest request submitted under key"""
+        self.generations[key] = self.generations.get(key, 0) + 1
+
+    def is_current(self, key, generation):
+        """Whether a request is still the latest one submitted under its key"""
+        return self.generations.get(key) == generation
+
+    def run(self, key, generation, func, on_success, on_error, owner):
+        """Execute a request on a worker thread and queue its outcome"""
+        if not self.is_current(key, generation):
+            self.results.put((key, generation, None, None, owner))
+            return
+        try:
+            result = func()
+        except Exception as error:
+            self.results.put((key, generation, on_error, error, owner))
+        else:
+            self.results.put((key, generation, on_success, result, owner))
+
+    def call_soon(self, callback, *args):
+        """Schedule callback(*args) on the Tk thread; safe to call from any thread"""
+        self.calls.put((callback, args))
+
+    def poll(self):
+        """Deliver finished requests and scheduled calls to their callbacks on the Tk thread"""
+        while True:
+            try:
+                callback, args = self.calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+        while True:
+            try:
+                key, generation, callback, value, owner = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending -= 1
+            if callback is None or not self.is_current(key, generation):
+                continue
+            if owner is not None and not owner.winfo_exists():
+                continue
+            try:
+                callback(value)
+            except Exception:
+                # Keep polling even if a callback fails, reporting it like a Tk callback error
+                self.root.report_callback_exception(*sys.exc_info())
+        self.notify_busy()
+        self.root.after(self.poll_ms, self.poll)
+
+    def add_busy_listener(self, listener):
+        """Call listener(busy) whenever requests start or finish"""
+        self.busy_listeners.append(listener)
+        listener(self.pending > 0)
+
+    def remove_busy_listener(self, listener):
+        """Stop notifying a listener added with add_busy_listener"""
+        if listener in self.busy_listeners:
+            self.busy_listeners.remove(listener)
+
+    def notify_busy(self):
+        """Tell the listeners when the runner goes from idle to busy or back"""
+        busy = self.pending > 0
+        if busy == self.busy:
+            return
+        self.busy = busy
+        for listener in list(self.busy_listeners):
+            listener(busy)
+
+    def show_error(self, error):
+        """Default error callback"""
+        messagebox.showerror("Erro", f"Falha ao acessar o banco de dados: {error}")
+
+    def shutdown(self):
+        """Stop accepting requests and drop the ones that have not started"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,199 @@
+"""
+Headless batch reminders, e.g. from cron.
+Selects the unpaid payments due up to a number of days ahead with server-side
+filters, streams them in chunks, sends their reminders through a reminder
+backend and writes the outcome to the backlog. Progress is checkpointed after
+every message so an interrupted run can be resumed with --resume. Never imports
+Tk.
+
+    python src/batch_reminders.py --dry-run
+    python src/batch_reminders.py --method selenium --max-messages 200 --resume
+"""
+import argparse
+import getpass
+import json
+import os
+import socket
+import sys
+import threading
+from datetime import datetime, timedelta
+from settings import *
+from supabase_client import supabase
+from metrics import metrics
+from mirror_sync import MirrorSync
+from audit_log import AuditLogWriter
+from repositories import ClientRepository
+from payment_export import payment_chunks
+from reminder_backends import BACKENDS, create_backend
+from reminder_dispatcher import ReminderDispatcher
+from send_reminder import build_reminders
+
+class Checkpoint:
+    """
+    Progress of a batch run, saved to a JSON file after every message: the
+    (due_date, id) cursor of the last finished chunk, the payments already
+    handled in the chunk after it and the totals so far. Without a path
+    nothing is saved, as in a dry run.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.cursor = None
+        self.handled = set()
+        self.sent = 0
+        self.failed = 0
+
+    def load(self):
+        """Restore the state of an interrupted run, if there is one"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as checkpoint_file:
+            state = json.load(checkpoint_file)
+        self.cursor = tuple(state['cursor']) if state['cursor'] else None
+        self.handled = set(state['handled'])
+        self.sent = state['sent']
+        self.failed = state['failed']
+        return True
+
+    def save(self):
+        if not self.path:
+            return
+        state = {"cursor": self.cursor, "handled": sorted(self.handled), "sent": self.sent, "failed": self.failed}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(state, checkpoint_file)
+        os.replace(temporary_path, self.path)
+
+    def handle(self, payment_id, sent):
+        """Record that the reminder of a payment was sent or failed for good"""
+        with self.lock:
+            self.handled.add(payment_id)
+            if sent:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.save()
+
+    def advance(self, cursor):
+        """Record that every payment up to cursor has been handled"""
+        with self.lock:
+            self.cursor = cursor
+            self.handled.clear()
+            self.save()
+
+    def clear(self):
+        """Forget the run once it has finished"""
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class CheckpointedDispatcher(ReminderDispatcher):
+    """
+    Dispatcher that records each reminder in a Checkpoint as soon as it is sent
+    or has failed every retry.
+    """
+    def __init__(self, backend, checkpoint, **options):
+        super().__init__(backend, **options)
+        self.checkpoint = checkpoint
+
+    def send_with_retries(self, reminder):
+        error = super().send_with_retries(reminder)
+        if error is None or not self.cancelled.is_set():
+            self.checkpoint.handle(reminder['payment']['id'], error is None)
+        return error
+
+def with_clients(payments, repository):
+    """Payments in the form build_reminders expects, with their client fetched in one request per chunk"""
+    clients = {client['id']: client for client in repository.get_many({payment['client_id'] for payment in payments})}
+    return [
+        {
+            'id': payment['id'],
+            'client_name': clients[payment['client_id']]['name'],
+            'client_phone': clients[payment['client_id']]['phone'],
+            'amount': payment['amount'],
+            'due_date': payment['due_date'],
+        }
+        for payment in payments if payment['client_id'] in clients
+    ]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--method", choices=sorted(BACKENDS), default=REMINDER_METHOD, help="reminder backend")
+    parser.add_argument("--dry-run", action="store_true", help="print the messages instead of sending them; nothing is logged or checkpointed")
+    parser.add_argument("--days-ahead", type=int, default=REMINDER_DAYS_AHEAD, help="also remind payments due up to this many days from today")
+    parser.add_argument("--overdue-only", action="store_true", help="only remind payments already past due")
+    parser.add_argument("--max-messages", type=int, help="stop after this many messages; --resume continues from there")
+    parser.add_argument("--chunk-size", type=int, default=REMINDER_BATCH_SIZE, help="payments fetched per request")
+    parser.add_argument("--checkpoint", default=REMINDER_CHECKPOINT_PATH, help="checkpoint file of the run")
+    parser.add_argument("--resume", action="store_true", help="continue the run recorded in the checkpoint file, if any")
+    return parser.parse_args(argv)
+
+def run(args):
+    """Send the reminders of a batch run and return the process exit status"""
+    today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    due_until = (today - timedelta(days=1) if args.overdue_only else today + timedelta(days=args.days_ahead)).date()
+    checkpoint = Checkpoint(None if args.dry_run else args.checkpoint)
+    if args.resume and checkpoint.load():
+        print(f"Resuming after {checkpoint.sent} sent and {checkpoint.failed} failed reminder(s).")
+
+    metrics.set_action("batch_reminders")
+    supabase.open(MIRROR_BATCH_PATH)
+    # Pull the changes into the local mirror first, so no reminder goes out for a payment already paid
+    mirror_sync = MirrorSync(supabase)
+    mirror_sync.sync()
+    if not supabase.online:
+        print("Supabase is unreachable; no reminders were sent.", file=sys.stderr)
+        mirror_sync.stop()
+        metrics.close()
+        return 2
+
+    backend = create_backend("print" if args.dry_run else args.method)
+    dispatcher = CheckpointedDispatcher(backend, checkpoint)
+    audit_log = None if args.dry_run else AuditLogWriter(AUDIT_BATCH_SPOOL_PATH)
+    user = f"{getpass.getuser()}@{socket.gethostname()} - batch_reminders"
+    clients = ClientRepository()
+    budget = args.max_messages
+    finished = False
+    backend.open()
+    try:
+        for payments in payment_chunks(only_open=True, due_until=due_until, chunk_size=args.chunk_size, after=checkpoint.cursor):
+            last = payments[-1]
+            cursor = (last[PAYMENTS_ORDER_BY], last['id'])
+            reminders = build_reminders(with_clients([payment for payment in payments if payment['id'] not in checkpoint.handled], clients), today)
+            complete = budget is None or len(reminders) <= budget
+            report = dispatcher.dispatch(reminders if complete else reminders[:budget], open_backend=False)
+            if audit_log is not None:
+                audit_log.log(user, describe(report))
+            if budget is not None:
+                budget -= report.done()
+            if not complete or report.cancelled:
+                break
+            checkpoint.advance(cursor)
+            if budget == 0:
+                break
+        else:
+            finished = True
+    finally:
+        backend.close()
+        if audit_log is not None:
+            audit_log.close()
+        mirror_sync.stop()
+        metrics.close()
+
+    print(f"Sent {checkpoint.sent}, failed {checkpoint.failed}." + ("" if finished else " Stopped early; run again with --resume to continue."))
+    if finished:
+        checkpoint.clear()
+    return 1 if checkpoint.failed else 0
+
+def describe(report):
+    """Backlog entries of a dispatch: one for the reminders sent and one per failure"""
+    entries = []
+    if report.sent:
+        entries.append(f"Sent batch reminder for payments: {[reminder['payment']['id'] for reminder in report.sent]}")
+    for reminder, error in report.failed:
+        payment = reminder['payment']
+        entries.append(f"Failed batch reminder for payment ID {payment['id']} ({payment['client_name']}): {error}")
+    return entries
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -0,0 +1,133 @@
+import threading
+from settings import *
+from repositories import ClientRepository
+from client_search import ClientSearchIndex
+
+MISSING_CLIENT = {'name': '', 'phone': ''}
+
+class ClientIndex:
+    """
+    In-memory index of the clients table shared by every window.
+    Loads id -> name/phone and name -> ids in a single query; after being
+    invalidated by client CRUD operations it only fetches the clients changed
+    or deleted since the last sync. Also keeps the search index of client names
+    and a two-way map between ids and the display names shown in the client
+    comboboxes, so a selected client resolves to its id without a query.
+    """
+    def __init__(self):
+        self.by_id = {}
+        self.ids_by_name = {}
+        self.display_by_id = {}
+        self.id_by_display = {}
+        self.search = ClientSearchIndex()
+        self.loaded = False
+        self.repository = ClientRepository()
+        self.sync = self.repository.delta_sync()
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        """Mark the index as stale so the next lookup syncs it"""
+        self.loaded = False
+
+    def reset(self):
+        """Forget the sync marks so the next lookup loads every client again"""
+        with self.lock:
+            self.sync.reset()
+            self.loaded = False
+
+    def load(self):
+        """Load every client from the database"""
+        marks = self.sync.fetch_marks()
+        clients = self.repository.all()
+        self.build({client['id']: client for client in clients})
+        self.search = ClientSearchIndex((client['id'], client['name']) for client in clients)
+        self.sync.set_marks(marks)
+
+    def update(self):
+        """Apply the clients changed or deleted since the last sync"""
+        changed, deleted_ids = self.sync.apply(self.sync.fetch_changes())
+        clients = {client_id: dict(client, id=client_id) for client_id, client in self.by_id.items()}
+        for client_id in deleted_ids:
+            clients.pop(client_id, None)
+            self.search.remove(client_id)
+        for client in changed:
+            clients[client['id']] = client
+            self.search.add(client['id'], client['name'])
+        self.build(clients)
+
+    def build(self, clients):
+        """Rebuild the lookups from clients keyed by id"""
+        by_id = {}
+        ids_by_name = {}
+        for client_id, client in clients.items():
+            by_id[client_id] = {'name': client['name'], 'phone': client['phone']}
+            ids_by_name.setdefault(client['name'], []).append(client_id)
+        display_by_id, id_by_display = self.display_names(by_id, ids_by_name)
+        # Swap the dictionaries at once so the Tk thread never sees a half-built index
+        self.by_id, self.ids_by_name, self.display_by_id, self.id_by_display = by_id, ids_by_name, display_by_id, id_by_display
+
+    @staticmethod
+    def display_names(by_id, ids_by_name):
+        """
+        Display name of every client and its reverse map: the name alone when it
+        is unique, otherwise followed by the end of the phone, e.g. "Ana (…9999)",
+        and by the id as well if that still repeats.
+        """
+        display_by_id = {}
+        id_by_display = {}
+        for name, client_ids in ids_by_name.items():
+            if len(client_ids) == 1:
+                display_by_id[client_ids[0]] = name
+                id_by_display[name] = client_ids[0]
+                continue
+            for client_id in client_ids:
+                display = f"{name} (…{by_id[client_id]['phone'][-4:]})"
+                if display in id_by_display or display in ids_by_name:
+                    display = f"{name} (…{by_id[client_id]['phone'][-4:]}, #{client_id})"
+                display_by_id[client_id] = display
+                id_by_display[display] = client_id
+        return display_by_id, id_by_display
+
+    def changed_ids(self, previous):
+        """Ids of the clients added, changed or removed since an earlier by_id snapshot"""
+        changed = {client_id for client_id, client in self.by_id.items() if previous.get(client_id) != client}
+        return changed | (previous.keys() - self.by_id.keys())
+
+    def ensure_loaded(self):
+        """Sync the index if it has been invalidated, loading it in full the first time"""
+        with self.lock:
+            if self.loaded:
+                return
+            if self.sync.is_ready():
+                self.update()
+            else:
+                self.load()
+            self.loaded = True
+
+    def get(self, client_id):
+        """Return the name and phone of a client, or empty values if it no longer exists"""
+        self.ensure_loaded()
+        return self.by_id.get(client_id, MISSING_CLIENT)
+
+    def lookup(self, client_id):
+        """
+        Like get, but never loads or syncs: safe on the Tk thread. A stale index
+        answers with what it has; the worker that syncs it patches the rows after.
+        """
+        return self.by_id.get(client_id, MISSING_CLIENT)
+
+    def id_for_display(self, display):
+        """Return the id of the client shown as display in a combobox, or None; never queries the database"""
+        return self.id_by_display.get(display.strip())
+
+    def search_display_names(self, text, limit=CLIENT_SEARCH_LIMIT):
+        """Return the display names of the best matches of text, or of every client in alphabetical order when text is empty"""
+        display_by_id = self.display_by_id
+        if not text.strip():
+            limit = max(limit, len(display_by_id))
+        return [display_by_id[client_id] for client_id in self.search.search(text, limit) if client_id in display_by_id]
+
+    def names(self):
+        """Return the client names in database order"""
+        self.ensure_loaded()
+        return [client['name'] for client in self.by_id.values()]
@@ -0,0 +1,155 @@
+import bisect
+import threading
+import unicodedata
+from layout_config import *
+from settings import *
+
+GRAM_SIZE = 3
+SCAN_RATIO = 20
+
+def normalize(text):
+    """Lowercase text and strip its accents, e.g. "João" -> "joao" """
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+class ClientSearchIndex:
+    """
+    Accent- and case-insensitive search over client names.
+    Keeps the normalized names and the suffixes that start at each later word
+    in sorted lists, so names and words starting with the query are a bisect
+    away, plus a trigram index for matches in the middle of a word.
+    Results are ranked: names starting with the query, then names with a word
+    starting with it, then (for queries of three letters or more) names
+    containing it, each group in alphabetical order.
+    Safe to update from a worker thread while the Tk thread queries it.
+    """
+    def __init__(self, clients=()):
+        self.entries = {}
+        self.names_sorted = []
+        self.words_sorted = []
+        self.grams = {}
+        self.lock = threading.Lock()
+        self.load(clients)
+
+    def load(self, clients):
+        """Index (id, name) pairs in bulk, sorting the lists once"""
+        with self.lock:
+            for client_id, name in clients:
+                normalized = normalize(name)
+                self.entries[client_id] = (name, normalized)
+                self.names_sorted.append((normalized, client_id))
+                self.words_sorted.extend((suffix, client_id) for suffix in self.word_suffixes(normalized))
+                for gram in self.trigrams(normalized):
+                    self.grams.setdefault(gram, set()).add(client_id)
+            self.names_sorted.sort()
+            self.words_sorted.sort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def word_suffixes(normalized):
+        """Suffixes of a normalized name starting at its second, third... word"""
+        return [normalized[index + 1:] for index, char in enumerate(normalized) if char == " " and normalized[index + 1:index + 2].strip()]
+
+    @staticmethod
+    def trigrams(normalized):
+        """Every three-letter substring of a normalized name"""
+        return {normalized[index:index + GRAM_SIZE] for index in range(len(normalized) - GRAM_SIZE + 1)}
+
+    def add(self, client_id, name):
+        """Index a client name, replacing the one indexed for the same id"""
+        with self.lock:
+            self.discard(client_id)
+            normalized = normalize(name)
+            self.entries[client_id] = (name, normalized)
+            bisect.insort(self.names_sorted, (normalized, client_id))
+            for suffix in self.word_suffixes(normalized):
+                bisect.insort(self.words_sorted, (suffix, client_id))
+            for gram in self.trigrams(normalized):
+                self.grams.setdefault(gram, set()).add(client_id)
+
+    def remove(self, client_id):
+        """Stop indexing a client"""
+        with self.lock:
+            self.discard(client_id)
+
+    def discard(self, client_id):
+        """Drop a client from every structure; the caller holds the lock"""
+        entry = self.entries.pop(client_id, None)
+        if entry is None:
+            return
+        normalized = entry[1]
+        self.delete_sorted(self.names_sorted, (normalized, client_id))
+        for suffix in self.word_suffixes(normalized):
+            self.delete_sorted(self.words_sorted, (suffix, client_id))
+        for gram in self.trigrams(normalized):
+            postings = self.grams.get(gram)
+            if postings is not None:
+                postings.discard(client_id)
+                if not postings:
+                    del self.grams[gram]
+
+    @staticmethod
+    def delete_sorted(items, item):
+        """Remove an item from a sorted list"""
+        index = bisect.bisect_left(items, item)
+        if index < len(items) and items[index] == item:
+            del items[index]
+
+    @staticmethod
+    def prefixed(items, query):
+        """Ids of the sorted (text, id) items whose text starts with query, in order"""
+        index = bisect.bisect_left(items, (query,))
+        while index < len(items) and items[index][0].startswith(query):
+            yield items[index][1]
+            index += 1
+
+    def infixed(self, query):
+        """Ids of the names containing query, in alphabetical order"""
+        postings = sorted((self.grams.get(gram, set()) for gram in self.trigrams(query)), key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        if len(candidates) * SCAN_RATIO < len(self.names_sorted):
+            # Few candidates: sort them
+            ordered = sorted((self.entries[client_id][1], client_id) for client_id in candidates)
+        else:
+            # Many candidates: the alphabetical scan soon finds enough of them
+            ordered = (item for item in self.names_sorted if item[1] in candidates)
+        for normalized, client_id in ordered:
+            if query in normalized:
+                yield client_id
+
+    def search(self, text, limit=CLIENT_SEARCH_LIMIT):
+        """Return the ids of the best matches of text, at most limit of them"""
+        query = normalize(text).strip()
+        with self.lock:
+            groups = [self.prefixed(self.names_sorted, query), self.prefixed(self.words_sorted, query)]
+            if len(query) >= GRAM_SIZE:
+                groups.append(self.infixed(query))
+            found = {}
+            for group in groups:
+                for client_id in group:
+                    found.setdefault(client_id, None)
+                    if len(found) >= limit:
+                        return list(found)
+            return list(found)
+
+class Debouncer:
+    """
+    Runs a callback once input has been idle for delay_ms, e.g. after the last keystroke.
+    """
+    def __init__(self, widget, callback, delay_ms=CLIENT_SEARCH_DEBOUNCE_MS):
+        self.widget = widget
+        self.callback = callback
+        self.delay_ms = delay_ms
+        self.pending = None
+
+    def trigger(self, event=None):
+        """Restart the wait before running the callback"""
+        if self.pending is not None:
+            self.widget.after_cancel(self.pending)
+        self.pending = self.widget.after(self.delay_ms, self.run)
+
+    def run(self):
+        self.pending = None
+        self.callback()
@@ -1,8 +1,13 @@
 import re
 import tkinter as tk
 from tkinter import ttk, messagebox
-from supabase_client import supabase
 from layout_config import *
+from settings import *
+from metrics import timed_action
+from repositories import ClientRepository
+from validation import is_phone_input, phone_digits, is_valid_phone
+from virtual_table import VirtualTable
+from pagination_bar import PaginationBar
 
 class ClientCRUD:
     """
@@ -17,9 +22,9 @@ class ClientCRUD:
         self.top.resizable(*CLIENT_CRUD_WINDOW_RESIZABLE)
         self.top.configure(bg=WINDOW_BG_COLOR)
 
-        self.current_page = 0
-
-        self.sort_order = {}
+        self.repository = ClientRepository()
+        self.pager = self.repository.pager(order_by=CLIENTS_ORDER_BY, page_size=CLIENTS_PAGE_SIZE)
+        self.client_sync = self.repository.delta_sync()
 
         self.frame_inputs = tk.Frame(self.top, bg=WINDOW_BG_COLOR)
         self.frame_inputs.pack(pady=FRAME_PADY)
@@ -56,16 +61,22 @@ class ClientCRUD:
         self.button_edit_phone = tk.Button(self.frame_buttons, text="Alterar Telefone", command=self.edit_client_phone, font=FONT, bg=EDIT_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
         self.button_edit_phone.grid(row=0, column=3, padx=PADX)
 
-        self.button_refresh = tk.Button(self.top, text="Atualizar Lista", command=self.load_clients, font=FONT, bg=FILTER_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_import = tk.Button(self.frame_buttons, text="Importar CSV", command=self.import_csv, font=FONT, bg=IMPORT_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_import.grid(row=0, column=4, padx=PADX)
+
+        self.label_import_progress = tk.Label(self.frame_buttons, text="", font=FONT, bg=WINDOW_BG_COLOR)
+        self.label_import_progress.grid(row=1, column=0, columnspan=5)
+
+        self.button_refresh = tk.Button(self.top, text="Atualizar Lista", command=self.refresh_clients, font=FONT, bg=FILTER_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
         self.button_refresh.pack(pady=PADY)
 
         self.client_table_frame = tk.Frame(self.top, bg=WINDOW_BG_COLOR)
         self.client_table_frame.pack(fill='both', expand=True, padx=PADX, pady=PADY)
 
-        self.client_table = ttk.Treeview(self.client_table_frame, columns=("ID", "Nome", "Telefone"), show="headings", selectmode="extended", style="mystyle.Treeview")
-        self.client_table.heading("ID", text="ID", command=lambda: self.sort_table(self.client_table, "ID"))
-        self.client_table.heading("Nome", text="Nome", command=lambda: self.sort_table(self.client_table, "Nome"))
-        self.client_table.heading("Telefone", text="Telefone", command=lambda: self.sort_table(self.client_table, "Telefone"))
+        self.client_table = VirtualTable(self.client_table_frame, columns=("ID", "Nome", "Telefone"), show="headings", selectmode="extended", style="mystyle.Treeview")
+        self.client_table.heading("ID", text="ID", command=lambda: self.client_table.sort_by("ID"))
+        self.client_table.heading("Nome", text="Nome", command=lambda: self.client_table.sort_by("Nome"))
+        self.client_table.heading("Telefone", text="Telefone", command=lambda: self.client_table.sort_by("Telefone"))
         
         self.client_table.column("ID", width=110, anchor="center")
         self.client_table.column("Nome", width=350, anchor="w")
@@ -82,11 +93,17 @@ class ClientCRUD:
 
         self.client_table.bind('<<TreeviewSelect>>', self.on_select)
 
+        self.app.runner.add_busy_listener(self.show_loading)
+        self.top.bind("<Destroy>", self.on_destroy)
+
+        self.pagination_bar = PaginationBar(self.top, self.previous_page, self.next_page, bg=WINDOW_BG_COLOR)
+        self.pagination_bar.frame.pack(pady=PADY)
+
         self.load_clients()
 
     def validate_phone(self, new_value):
         """Validate the phone input to accept only numbers and allowed special characters"""
-        return all(char.isdigit() or char in "X()-+" for char in new_value)
+        return is_phone_input(new_value)
 
     def format_phone_number(self, event):
         """Format the phone number input"""
@@ -113,66 +130,130 @@ class ClientCRUD:
 
     def on_focus_out(self, event):
         """Handle focus out event for the phone entry"""
-        phone_number = re.sub(r'\D', '', self.entry_phone.get())
-        if len(phone_number) < 10 or len(phone_number) > 14:
+        if not is_valid_phone(phone_digits(self.entry_phone.get())):
             self.entry_phone.delete(0, tk.END)
             self.entry_phone.insert(0, "(XX)XXXXX-XXXX")
             self.entry_phone.config(fg='gray')
 
-    def sort_table(self, table, column):
-        """Sort the table based on the clicked column"""
-        rows = list(table.get_children())
-        if column not in self.sort_order:
-            self.sort_order[column] = False  # Default to ascending order
-
-        rows.sort(key=lambda row: table.item(row)["values"][table["columns"].index(column)], reverse=self.sort_order[column])
-        
-        for index, row in enumerate(rows):
-            table.move(row, '', index)
-        
-        self.sort_order[column] = not self.sort_order[column]  # Toggle sort order for next click
-
     def load_clients(self):
-        """Load clients into the table"""
-        for row in self.client_table.get_children():
-            self.client_table.delete(row)
-
-        clients = supabase.table("clients").select("*").execute()
-
-        self.all_clients = clients.data
-        self.display_page(self.current_page)
-
-    def display_page(self, page):
-        """Display a specific page of clients in the table"""
-        for client in self.all_clients:
-            self.client_table.insert("", "end", values=(client['id'], client['name'], client['phone']))
+        """Load the current page of clients into the table in the background"""
+        def fetch():
+            # Read the sync marks before the page so no later change is missed
+            marks = None if self.client_sync.is_ready() else self.client_sync.fetch_marks()
+            return marks, self.pager.fetch()
+
+        def show(result):
+            marks, page = result
+            if marks is not None:
+                self.client_sync.set_marks(marks)
+            self.all_clients = self.pager.apply(page)
+            self.display_page()
+            self.pagination_bar.update(self.pager)
+
+        self.app.runner.submit((self, "clients"), fetch, show, owner=self.top)
+
+    def sync_clients(self):
+        """Fetch only the clients changed since the last sync and patch the table in place"""
+        if not self.client_sync.is_ready():
+            self.load_clients()
+            return
 
+        def show(result):
+            changed, deleted_ids = self.client_sync.apply(result)
+            self.patch_clients(changed, deleted_ids)
+
+        self.app.runner.submit((self, "clients"), self.client_sync.fetch_changes, show, owner=self.top)
+
+    def patch_clients(self, changed, deleted_ids):
+        """Apply changed and deleted clients to the loaded page and the table without reloading it"""
+        clients = {client['id']: client for client in self.all_clients}
+        removed = set(deleted_ids)
+        for client in changed:
+            if self.pager.contains(client):
+                clients[client['id']] = client
+            else:
+                # The change moved it off the current page or out of the search
+                removed.add(client['id'])
+        for client_id in removed:
+            clients.pop(client_id, None)
+        self.all_clients = list(clients.values())
+        if changed or removed:
+            self.refresh_total()
+
+        removed &= self.client_table.positions.keys()
+        if removed:
+            self.client_table.delete(*removed)
+        shown = [client for client in changed if client['id'] in clients]
+        if shown:
+            self.client_table.upsert_rows(*self.build_rows(shown))
+
+    def refresh_total(self):
+        """Count the clients under the search again: a row that left the page may have moved, not been deleted"""
+        def show(result):
+            self.pager.apply_total(result)
+            self.pagination_bar.update(self.pager)
+
+        self.app.runner.submit((self, "total"), self.pager.fetch_total, show, owner=self.top)
+
+    @timed_action
+    def refresh_clients(self):
+        """Refresh the clients, removing the name filter"""
+        if self.pager.search:
+            self.pager.set_search("name", None)
+            self.load_clients()
+        else:
+            self.sync_clients()
+
+    @timed_action
+    def next_page(self):
+        """Show the next page of clients"""
+        if self.pager.next_page():
+            self.load_clients()
+
+    @timed_action
+    def previous_page(self):
+        """Show the previous page of clients"""
+        if self.pager.previous_page():
+            self.load_clients()
+
+    def display_page(self):
+        """Display the loaded page of clients in the table"""
+        self.client_table.set_rows(*self.build_rows(self.all_clients))
+
+    def build_rows(self, clients):
+        """Table rows of clients and their typed sort values"""
+        rows = [(client['id'], client['name'], client['phone']) for client in clients]
+        sort_values = [(client['id'], client['name'].casefold(), client['phone']) for client in clients]
+        return rows, sort_values
+
+    @timed_action
     def add_client(self):
         """Add a client"""
         name = self.entry_name.get()
-        phone = re.sub(r'\D', '', self.entry_phone.get())
+        phone = phone_digits(self.entry_phone.get())
 
-        if not name or not phone or len(phone) < 10 or len(phone) > 14:
+        if not name or not is_valid_phone(phone):
             self.top.lift()
             self.show_messagebox("Erro", "Telefone Inválido. Preencha todos os campos corretamente.")
             return
 
-        existing_client = supabase.table("clients").select("*").eq("name", name).execute().data
-        if existing_client:
-            if not messagebox.askyesno("Cliente Existente", "O cliente já existe. Deseja continuar?"):
-                self.top.lift()
-                return
-
         data = {"name": name, "phone": phone}
-        response = supabase.table("clients").insert(data).execute()
-        client_id = response.data[0]['id']
 
-        self.entry_name.delete(0, tk.END)
-        self.entry_phone.delete(0, tk.END)
+        def insert():
+            return self.repository.insert(data)['id']
 
-        self.load_clients()
-        self.app.log_backlog(f"Added client: {name} with ID {client_id}")
+        def done(client_id):
+            self.app.client_index.invalidate()
+            self.app.log_backlog(f"Added client: {name} with ID {client_id}")
+            if not self.top.winfo_exists():
+                return
+            self.entry_name.delete(0, tk.END)
+            self.entry_phone.delete(0, tk.END)
+            self.sync_clients()
+
+        self.confirm_unique_name(name, lambda: self.app.runner.submit(None, insert, done))
 
+    @timed_action
     def edit_client_name(self):
         """Edit the selected client's name"""
         selected_items = self.client_table.selection()
@@ -190,17 +271,12 @@ class ClientCRUD:
             self.show_messagebox("Erro", "Preencha o novo nome do cliente.")
             return
 
-        existing_client = supabase.table("clients").select("*").eq("name", new_name).execute().data
-        if existing_client:
-            if not messagebox.askyesno("Cliente Existente", "O cliente já existe. Deseja continuar?"):
-                self.top.lift()
-                return
-
         old_name = self.client_table.item(selected_item, 'values')[1]
-        supabase.table("clients").update({"name": new_name}).eq("id", client_id).execute()
-        self.load_clients()
-        self.app.log_backlog(f"Edited client name: ID {client_id}, from {old_name} to {new_name}")
 
+        self.confirm_unique_name(new_name, lambda: self.update_client(
+            client_id, {"name": new_name}, f"Edited client name: ID {client_id}, from {old_name} to {new_name}"))
+
+    @timed_action
     def edit_client_phone(self):
         """Edit the selected client's phone"""
         selected_items = self.client_table.selection()
@@ -211,18 +287,48 @@ class ClientCRUD:
         
         selected_item = selected_items[0]
         client_id = self.client_table.item(selected_item, 'values')[0]
-        new_phone = re.sub(r'\D', '', self.entry_phone.get())
+        new_phone = phone_digits(self.entry_phone.get())
 
-        if not new_phone or len(new_phone) < 10 or len(new_phone) > 14:
+        if not is_valid_phone(new_phone):
             self.top.lift()
             self.show_messagebox("Erro", "Preencha o novo telefone do cliente corretamente. O telefone deve ter entre 10 e 14 dígitos.")
             return
 
         old_phone = self.client_table.item(selected_item, 'values')[2]
-        supabase.table("clients").update({"phone": new_phone}).eq("id", client_id).execute()
-        self.load_clients()
-        self.app.log_backlog(f"Edited client phone: ID {client_id}, from {old_phone} to {new_phone}")
 
+        self.update_client(client_id, {"phone": new_phone}, f"Edited client phone: ID {client_id}, from {old_phone} to {new_phone}")
+
+    def update_client(self, client_id, data, description):
+        """
+        Apply an edit to one client right away and confirm it in the background.
+        If the write fails the previous values are restored and an error is shown.
+        """
+        previous = next((client for client in self.all_clients if client['id'] == client_id), None)
+        if previous is None:
+            return
+        self.replace_client(dict(previous, **data))
+
+        def confirm(response):
+            self.app.client_index.invalidate()
+            self.app.log_backlog(description)
+
+        def rollback(error):
+            if not self.top.winfo_exists():
+                self.app.runner.show_error(error)
+                return
+            self.replace_client(previous)
+            self.show_messagebox("Erro", f"Falha ao salvar a alteração, que foi desfeita: {error}")
+
+        self.app.runner.submit(None, lambda: self.repository.update(client_id, data), confirm, rollback)
+
+    def replace_client(self, client):
+        """Put a changed client in the loaded page and update only its table row"""
+        self.all_clients = [client if loaded['id'] == client['id'] else loaded for loaded in self.all_clients]
+        if client['id'] in self.client_table.positions:
+            rows, sort_values = self.build_rows([client])
+            self.client_table.update_row(rows[0], sort_values[0])
+
+    @timed_action
     def delete_clients(self):
         """Delete selected clients"""
         selected_items = self.client_table.selection()
@@ -240,15 +346,29 @@ class ClientCRUD:
             self.top.lift()
             return
 
-        for selected_item in selected_items:
-            client_id = self.client_table.item(selected_item, 'values')[0]
-            client_name = self.client_table.item(selected_item, 'values')[1]
-            supabase.table("clients").delete().eq("id", client_id).execute()
-            self.app.log_backlog(f"Deleted client: ID {client_id}, Name {client_name}")
+        client_names = {selected_item: self.client_table.item(selected_item, 'values')[1] for selected_item in selected_items}
 
-        self.top.lift()
-        self.load_clients()
+        def done(deleted_ids):
+            self.app.log_backlog_many([f"Deleted client: ID {client_id}, Name {client_names[client_id]}" for client_id in deleted_ids])
+            self.app.client_index.invalidate()
+            if not self.top.winfo_exists():
+                return
+            self.top.lift()
+            self.sync_clients()
+
+        self.app.runner.submit(None, lambda: self.repository.delete_many(client_names), done)
+
+    def confirm_unique_name(self, name, proceed):
+        """Ask for confirmation when another client already has the name, then call proceed"""
+        def confirm(existing_client):
+            if existing_client and not messagebox.askyesno("Cliente Existente", "O cliente já existe. Deseja continuar?"):
+                self.top.lift()
+                return
+            proceed()
+
+        self.app.runner.submit(None, lambda: self.repository.ids_with_name(name), confirm, owner=self.top)
 
+    @timed_action
     def on_select(self, event):
         """Action when selecting a client"""
         selected_items = self.client_table.selection()
@@ -260,22 +380,41 @@ class ClientCRUD:
             self.button_edit_name.config(state="disabled")
             self.button_edit_phone.config(state="disabled")
 
+    @timed_action
     def filter_by_client(self):
-        """Filter clients by similar name without generating a new query to the database"""
-        client_name = self.entry_name.get().lower()
+        """Filter clients by similar name on the server, paging through the matches"""
+        client_name = self.entry_name.get()
         if not client_name:
             self.top.lift()
             self.show_messagebox("Erro", "Digite um nome para filtrar.")
             return
 
-        filtered_clients = [client for client in self.all_clients if client_name in client['name'].lower()]
-        self.display_filtered_clients(filtered_clients)
+        self.pager.set_search("name", client_name)
+        self.load_clients()
+
+    @timed_action
+    def import_csv(self):
+        """Import clients from a CSV file"""
+        def done(report):
+            if self.top.winfo_exists():
+                self.top.lift()
+                self.sync_clients()
+
+        self.app.import_csv("clients", self.top, self.show_import_progress, done)
+
+    def show_import_progress(self, text):
+        """Show the progress of a running import"""
+        if self.top.winfo_exists():
+            self.label_import_progress.config(text=text)
+
+    def show_loading(self, busy):
+        """Show the busy cursor while requests are in flight"""
+        self.top.config(cursor="watch" if busy else "")
 
-    def display_filtered_clients(self, filtered_clients):
-        """Display filtered clients in the table"""
-        self.client_table.delete(*self.client_table.get_children())
-        for client in filtered_clients:
-            self.client_table.insert("", "end", values=(client['id'], client['name'], client['phone']))
+    def on_destroy(self, event):
+        """Stop following the background requests when the window closes"""
+        if event.widget is self.top:
+            self.app.runner.remove_busy_listener(self.show_loading)
 
     def show_messagebox(self, title, message, icon=messagebox.ERROR):
         """Show a messagebox and keep the CRUD window in front"""
@@ -0,0 +1,215 @@
+import codecs
+import csv
+import os
+import threading
+from datetime import datetime
+from settings import *
+from repositories import ClientRepository, PaymentRepository
+from validation import is_phone_input, phone_digits, is_valid_phone, is_valid_amount
+
+# Accepted header names of each field, compared case-insensitively
+CLIENT_COLUMNS = {
+    "name": ("nome", "name", "cliente"),
+    "phone": ("telefone", "phone", "celular"),
+}
+PAYMENT_COLUMNS = {
+    "client": ("cliente", "client", "nome", "name"),
+    "amount": ("valor", "amount"),
+    "due_date": ("vencimento", "data de vencimento", "due_date"),
+    "is_paid": ("pago", "is_paid", "status"),
+}
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y")
+PAID_VALUES = {"sim", "s", "pago", "quitado", "true", "1", "yes", "x"}
+UNPAID_VALUES = {"", "não", "nao", "n", "pendente", "false", "0", "no"}
+
+class RowError(ValueError):
+    """A CSV row that cannot be imported; the message is the reason written to the reject file"""
+
+class ImportReport:
+    """
+    Outcome of an import: rows read, inserted and rejected, and where the
+    rejected rows were written.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.read = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.reject_path = None
+        self.cancelled = False
+
+class CsvImporter:
+    """
+    Streams clients or payments from a CSV file into the database.
+    The file is read row by row and inserted in batches of batch_size, so only
+    one batch is held in memory however large the file is. Rows are validated
+    with the same rules as the CRUD windows; payments name their client, which
+    is resolved through an in-memory map of client names (or display names) to ids. Rejected rows
+    are copied with their line number and reason to a reject file next to the
+    input. Meant to run on a worker thread; on_progress(bytes_read, total_bytes, report)
+    is called after each batch.
+    """
+    def __init__(self, kind, client_index, batch_size=IMPORT_BATCH_SIZE, on_progress=None):
+        if kind not in ("clients", "payments"):
+            raise ValueError(f"Unknown import kind: {kind}")
+        self.kind = kind
+        self.client_index = client_index
+        self.batch_size = batch_size
+        self.on_progress = on_progress
+        self.repository = ClientRepository() if kind == "clients" else PaymentRepository()
+        self.fields = CLIENT_COLUMNS if kind == "clients" else PAYMENT_COLUMNS
+        self.cancelled = threading.Event()
+        self.bytes_read = 0
+        self.report = None
+        self.header = None
+        self.reject_file = None
+        self.reject_writer = None
+
+    def cancel(self):
+        """Stop after the batch being inserted"""
+        self.cancelled.set()
+
+    def run(self, path):
+        """Import the file and return an ImportReport"""
+        self.report = ImportReport(path)
+        self.client_index.ensure_loaded()
+        # Copy the lists so rows inserted by this import never touch the shared index
+        self.ids_by_name = {name: list(ids) for name, ids in self.client_index.ids_by_name.items()}
+        total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+        try:
+            with open(path, "rb") as csv_file:
+                lines = codecs.iterdecode(self.count_bytes(csv_file), "utf-8-sig")
+                reader = csv.reader(lines, self.sniff(path))
+                self.header = next(reader, None)
+                if self.header is None:
+                    return self.report
+                columns = self.map_columns(self.header)
+                batch = []
+                for row in reader:
+                    if not any(cell.strip() for cell in row):
+                        continue
+                    self.report.read += 1
+                    try:
+                        batch.append((reader.line_num, row, self.parse(row, columns)))
+                    except RowError as error:
+                        self.reject(reader.line_num, row, str(error))
+                    if len(batch) >= self.batch_size:
+                        self.insert(batch)
+                        batch = []
+                        if self.on_progress:
+                            self.on_progress(self.bytes_read, total_bytes, self.report)
+                        if self.cancelled.is_set():
+                            self.report.cancelled = True
+                            return self.report
+                self.insert(batch)
+                if self.on_progress:
+                    self.on_progress(total_bytes, total_bytes, self.report)
+        finally:
+            if self.reject_file is not None:
+                self.reject_file.close()
+                self.reject_file = None
+        return self.report
+
+    def count_bytes(self, binary_file):
+        """Yield the lines of a file, counting the bytes read for the progress"""
+        for line in binary_file:
+            self.bytes_read += len(line)
+            yield line
+
+    @staticmethod
+    def sniff(path):
+        """CSV dialect of the file, accepting comma, semicolon (as spreadsheets in pt-BR save) or tab"""
+        with open(path, encoding="utf-8-sig", newline="") as csv_file:
+            sample = csv_file.read(IMPORT_SNIFF_BYTES)
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            return csv.excel
+
+    def map_columns(self, header):
+        """Position of each field in the header; raises ValueError when a required one is missing"""
+        positions = {name.strip().casefold(): index for index, name in enumerate(header)}
+        columns = {}
+        for field, names in self.fields.items():
+            index = next((positions[name] for name in names if name in positions), None)
+            if index is None and field != "is_paid":
+                raise ValueError(f"Coluna '{names[0]}' não encontrada no arquivo.")
+            columns[field] = index
+        return columns
+
+    def parse(self, row, columns):
+        """Validate a row and return the record to insert; raises RowError"""
+        values = {field: row[index].strip() if index is not None and index < len(row) else "" for field, index in columns.items()}
+        if self.kind == "clients":
+            return self.parse_client(values)
+        return self.parse_payment(values)
+
+    def parse_client(self, values):
+        name = values["name"]
+        if not name:
+            raise RowError("Nome vazio")
+        # Spreadsheets often space out the number, e.g. (44) 99999-9999
+        phone = values["phone"].replace(" ", "")
+        if not is_phone_input(phone) or not is_valid_phone(phone_digits(phone)):
+            raise RowError("Telefone inválido")
+        if name in self.ids_by_name:
+            raise RowError("Cliente já existe")
+        # Reserve the name so a repeated row in the same file is rejected too
+        self.ids_by_name[name] = []
+        return {"name": name, "phone": phone_digits(phone)}
+
+    def parse_payment(self, values):
+        client_ids = self.ids_by_name.get(values["client"])
+        if not client_ids:
+            # Also accept the display name of the comboboxes, which tells repeated names apart
+            client_id = self.client_index.id_for_display(values["client"])
+            client_ids = [client_id] if client_id is not None else []
+        if not client_ids:
+            raise RowError("Cliente não encontrado")
+        if len(client_ids) > 1:
+            raise RowError("Nome de cliente ambíguo")
+        amount = values["amount"]
+        if not is_valid_amount(amount):
+            raise RowError("Valor inválido")
+        due_date = self.parse_date(values["due_date"])
+        paid = values["is_paid"].casefold()
+        if paid not in PAID_VALUES and paid not in UNPAID_VALUES:
+            raise RowError("Status de pagamento inválido")
+        return {"client_id": client_ids[0], "amount": float(amount.replace(',', '.')), "due_date": due_date, "is_paid": paid in PAID_VALUES}
+
+    @staticmethod
+    def parse_date(text):
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(text, date_format).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+        raise RowError("Data de vencimento inválida")
+
+    def insert(self, batch):
+        """Insert a batch of parsed rows, rejecting the whole batch if the insert fails"""
+        if not batch:
+            return
+        try:
+            inserted = self.repository.insert_many([record for line, row, record in batch])
+        except Exception as error:
+            for line, row, record in batch:
+                if self.kind == "clients":
+                    self.ids_by_name.pop(record['name'], None)
+                self.reject(line, row, f"Falha ao inserir: {error}")
+            return
+        self.report.inserted += len(inserted)
+        if self.kind == "clients":
+            for client in inserted:
+                self.ids_by_name[client['name']] = [client['id']]
+
+    def reject(self, line, row, reason):
+        """Copy a rejected row to the reject file, creating it on the first rejection"""
+        if self.reject_file is None:
+            self.report.reject_path = os.path.splitext(self.report.path)[0] + IMPORT_REJECTS_SUFFIX
+            self.reject_file = open(self.report.reject_path, "w", encoding="utf-8-sig", newline="")
+            self.reject_writer = csv.writer(self.reject_file, delimiter=";")
+            self.reject_writer.writerow(["linha", "motivo"] + self.header)
+        self.reject_writer.writerow([line, reason] + row)
+        self.report.rejected += 1
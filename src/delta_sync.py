@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from supabase_client import supabase
+from settings import *
+
+EPOCH_MARK = ("1970-01-01T00:00:00+00:00", 0)
+NO_RECENT = ((), ())
+
+def parse_stamp(stamp):
+    return datetime.fromisoformat(str(stamp))
+
+class DeltaSync:
+    """
+    Incremental sync of one table.
+    Keeps a high-water mark made of the latest (updated_at, id) seen and the id of
+    the latest tombstone in deleted_rows, and fetches only the rows changed and
+    the ids deleted since then. updated_at and tombstone ids are assigned before
+    their transaction commits, so a change can become visible after a later one:
+    every sync re-reads the last overlap seconds and skips the row versions and
+    tombstones it already returned, which the marks remember. Needs the columns
+    and triggers in sql/delta_sync.sql. The fetch methods are safe to run on a
+    worker thread; apply records the new marks and should run on the thread
+    that owns the local model.
+    """
+    def __init__(self, table, columns="*", batch_size=DELTA_SYNC_BATCH_SIZE, client=None, overlap=DELTA_SYNC_OVERLAP):
+        self.client = client or supabase
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.overlap = timedelta(seconds=overlap)
+        self.updated_mark = None
+        self.tombstone_mark = None
+        self.recent = NO_RECENT
+
+    def is_ready(self):
+        """Whether a full load has set the marks"""
+        return self.updated_mark is not None
+
+    def reset(self):
+        """Forget the marks so the next load starts over"""
+        self.updated_mark = None
+        self.tombstone_mark = None
+        self.recent = NO_RECENT
+
+    def fetch_marks(self):
+        """Read the current marks; call before a full load so no change is missed"""
+        latest = (
+            self.client.table(self.table).select("id, updated_at")
+            .order("updated_at", desc=True).order("id", desc=True).limit(1).execute().data
+        )
+        tombstone = (
+            self.client.table("deleted_rows").select("id")
+            .eq("table_name", self.table).order("id", desc=True).limit(1).execute().data
+        )
+        updated_mark = (latest[0]['updated_at'], latest[0]['id']) if latest else EPOCH_MARK
+        tombstone_mark = tombstone[0]['id'] if tombstone else 0
+        return updated_mark, tombstone_mark
+
+    def set_marks(self, marks):
+        """
+        Record marks returned by fetch_marks or fetch_changes. The third item,
+        when present, holds the (id, updated_at) versions and tombstone ids
+        already returned inside the overlap window.
+        """
+        self.updated_mark, self.tombstone_mark = tuple(marks[0]), marks[1]
+        self.recent = marks[2] if len(marks) > 2 else NO_RECENT
+
+    def fetch_changes(self):
+        """Fetch the rows changed and the ids deleted since the marks, batch by batch"""
+        since_time = parse_stamp(self.updated_mark[0]) - self.overlap
+        since = since_time.isoformat(timespec="microseconds")
+        seen_versions = {tuple(version) for version in self.recent[0]}
+        seen_tombstones = set(self.recent[1])
+
+        rows_read = []
+        cursor = None
+        while True:
+            query = self.client.table(self.table).select(self.columns)
+            if cursor is None:
+                query = query.gte("updated_at", since)
+            else:
+                updated_at, last_id = cursor
+                query = query.or_(f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt.{last_id})')
+            rows = query.order("updated_at").order("id").limit(self.batch_size).execute().data
+            rows_read.extend(rows)
+            if rows:
+                cursor = (rows[-1]['updated_at'], rows[-1]['id'])
+            if len(rows) < self.batch_size:
+                break
+
+        tombstones_read = []
+        while True:
+            query = (
+                self.client.table("deleted_rows").select("id, row_id, deleted_at").eq("table_name", self.table)
+                .or_(f'id.gt.{self.tombstone_mark},deleted_at.gte."{since}"')
+            )
+            if tombstones_read:
+                query = query.gt("id", tombstones_read[-1]['id'])
+            tombstones = query.order("id").limit(self.batch_size).execute().data
+            tombstones_read.extend(tombstones)
+            if len(tombstones) < self.batch_size:
+                break
+
+        changed = [row for row in rows_read if (row['id'], row['updated_at']) not in seen_versions]
+        deleted_ids = [tombstone['row_id'] for tombstone in tombstones_read if tombstone['id'] not in seen_tombstones]
+        # A row deleted after its last change only counts as deleted
+        deleted = set(deleted_ids)
+        changed = [row for row in changed if row['id'] not in deleted]
+
+        updated_mark = self.updated_mark
+        if cursor is not None and parse_stamp(cursor[0]) > parse_stamp(updated_mark[0]):
+            updated_mark = cursor
+        tombstone_mark = max([self.tombstone_mark] + [tombstone['id'] for tombstone in tombstones_read])
+        # Remember what the next sync will read again, so it is returned only once
+        next_since = parse_stamp(updated_mark[0]) - self.overlap
+        recent = (
+            [[row['id'], row['updated_at']] for row in rows_read if parse_stamp(row['updated_at']) >= next_since],
+            [tombstone['id'] for tombstone in tombstones_read if parse_stamp(tombstone['deleted_at']) >= next_since],
+        )
+        return changed, deleted_ids, (updated_mark, tombstone_mark, recent)
+
+    def apply(self, result):
+        """Record the marks of a fetch_changes result and return its changed rows and deleted ids"""
+        changed, deleted_ids, marks = result
+        self.set_marks(marks)
+        return changed, deleted_ids
@@ -0,0 +1,52 @@
+import tkinter as tk
+from tkinter import ttk
+from layout_config import *
+from metrics import metrics
+
+class DiagnosticsWindow:
+    """
+    Window with the latency of every UI action and backend query.
+    Actions are listed with the p50/p95 of their Tk handler and the number of
+    queries each run caused, most queries first, so N+1 patterns stand out.
+    Refreshes itself while open.
+    """
+    def __init__(self, root):
+        self.top = tk.Toplevel(root)
+        self.top.title("Diagnóstico")
+        self.top.geometry(DIAGNOSTICS_WINDOW_SIZE)
+
+        tk.Label(self.top, text="Ações", font=FONT).pack(pady=(PADY, 0))
+        self.action_table = self.create_table(("Ação", "Execuções", "p50 (ms)", "p95 (ms)", "Consultas por execução", "Erros"))
+        tk.Label(self.top, text="Consultas", font=FONT).pack(pady=(PADY, 0))
+        self.query_table = self.create_table(("Tabela", "Operação", "Origem", "Ação", "Quantidade", "p50 (ms)", "p95 (ms)", "Erros"))
+
+        self.button_export = tk.Button(self.top, text="Exportar Métricas", command=metrics.export, font=FONT, bg=DIAGNOSTICS_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_export.pack(pady=PADY)
+
+        self.refresh()
+
+    def create_table(self, columns):
+        table = ttk.Treeview(self.top, columns=columns, show="headings", height=8)
+        for column in columns:
+            table.heading(column, text=column)
+            table.column(column, width=260 if column == "Ação" else 110)
+        table.pack(fill='both', expand=True, padx=PADX)
+        return table
+
+    def refresh(self):
+        """Show the current numbers and schedule the next refresh"""
+        if not self.top.winfo_exists():
+            return
+        self.action_table.delete(*self.action_table.get_children())
+        for row in metrics.action_report():
+            self.action_table.insert("", "end", values=(
+                row['action'], row['count'], f"{row['p50'] * 1000:.1f}", f"{row['p95'] * 1000:.1f}",
+                f"{row['queries_per_run']:.1f}", row['errors'],
+            ))
+        self.query_table.delete(*self.query_table.get_children())
+        for row in metrics.query_report():
+            self.query_table.insert("", "end", values=(
+                row['table'], row['operation'], row['source'], row['action'], row['count'],
+                f"{row['p50'] * 1000:.1f}", f"{row['p95'] * 1000:.1f}", row['errors'],
+            ))
+        self.top.after(DIAGNOSTICS_REFRESH_MS, self.refresh)
@@ -0,0 +1,279 @@
+"""
+In-memory stand-in for the Supabase client.
+Implements the part of the supabase-py / PostgREST query builder the app uses
+(select/insert/update/delete with eq, neq, gt, gte, lt, lte, ilike, in_, or_,
+order, limit and exact counts) over Python lists, plus the updated_at column
+and the deleted_rows tombstones that sql/delta_sync.sql adds. Deleting a
+client deletes its payments, like the foreign key does.
+Each request can wait an artificial latency, and requests are counted per
+table and operation, so benchmarks and offline runs need no Supabase project.
+"""
+import heapq
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from local_mirror import split_top_level
+
+TRACKED_TABLES = ("clients", "payments")
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+def coerce(value, sample):
+    """Convert a filter value given as text to the type stored in the column"""
+    if not isinstance(value, str) or sample is None or isinstance(sample, str):
+        return value
+    if isinstance(sample, bool):
+        return value == "true"
+    return type(sample)(value)
+
+def like_pattern(pattern):
+    """Compile an ilike pattern (% and _ wildcards) to a case-insensitive regex"""
+    regex = "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern)
+    return re.compile(f"^{regex}$", re.IGNORECASE | re.DOTALL)
+
+COMPARISONS = {
+    "eq": lambda left, right: left == right,
+    "neq": lambda left, right: left != right,
+    "gt": lambda left, right: left is not None and left > right,
+    "gte": lambda left, right: left is not None and left >= right,
+    "lt": lambda left, right: left is not None and left < right,
+    "lte": lambda left, right: left is not None and left <= right,
+}
+
+class FakeQuery:
+    """
+    Query builder over one table of a FakeSupabase.
+    """
+    def __init__(self, database, table):
+        self.database = database
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.count = None
+        self.payload = None
+        self.filters = []
+        self.id_filter = None
+        self.ordering = []
+        self.row_limit = None
+
+    def select(self, columns="*", count=None):
+        self.columns, self.count = columns, count
+        return self
+
+    def insert(self, data):
+        self.operation, self.payload = "insert", data
+        return self
+
+    def update(self, data):
+        self.operation, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def compare(self, column, operator, value):
+        test = COMPARISONS[operator]
+        coerced = {}
+
+        def check(row):
+            left = row.get(column)
+            # Convert the value once per column type instead of once per row
+            kind = type(left)
+            if kind not in coerced:
+                coerced[kind] = coerce(value, left)
+            return test(left, coerced[kind])
+        return check
+
+    def eq(self, column, value):
+        if column == "id":
+            # Answered from the id index instead of a scan
+            self.id_filter = {int(value)} if self.id_filter is None else self.id_filter & {int(value)}
+            return self
+        self.filters.append(self.compare(column, "eq", value))
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(self.compare(column, "neq", value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(self.compare(column, "gt", value))
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(self.compare(column, "gte", value))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(self.compare(column, "lt", value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(self.compare(column, "lte", value))
+        return self
+
+    def ilike(self, column, pattern):
+        regex = like_pattern(pattern)
+        self.filters.append(lambda row: row.get(column) is not None and regex.match(str(row[column])) is not None)
+        return self
+
+    def in_(self, column, values):
+        if column == "id":
+            ids = {int(value) for value in values}
+            self.id_filter = ids if self.id_filter is None else self.id_filter & ids
+            return self
+        values = list(values)
+        self.filters.append(lambda row: row.get(column) in {coerce(value, row.get(column)) for value in values})
+        return self
+
+    def or_(self, expression):
+        self.filters.append(self.logic(any, expression))
+        return self
+
+    def logic(self, combine, expression):
+        """Predicate of an and/or list of PostgREST conditions such as id.gt.5,and(a.eq.1,b.lt.2)"""
+        predicates = []
+        for condition in split_top_level(expression):
+            if condition.startswith(("and(", "or(")):
+                nested, inner = condition.split("(", 1)
+                predicates.append(self.logic(all if nested == "and" else any, inner[:-1]))
+            else:
+                column, operator, value = condition.split(".", 2)
+                if len(value) >= 2 and value[0] == value[-1] == '"':
+                    value = value[1:-1]
+                predicates.append(self.compare(column, operator, value))
+        return lambda row: combine(predicate(row) for predicate in predicates)
+
+    def order(self, column, desc=False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.row_limit = int(count)
+        return self
+
+    def matching(self, rows):
+        """Rows of the table that pass every filter"""
+        if self.id_filter is not None:
+            candidates = [rows[row_id] for row_id in sorted(self.id_filter) if row_id in rows]
+        else:
+            candidates = rows.values()
+        return [row for row in candidates if all(test(row) for test in self.filters)]
+
+    def project(self, row):
+        if self.columns.strip() == "*":
+            return dict(row)
+        return {column: row.get(column) for column in (name.strip() for name in self.columns.split(","))}
+
+    def execute(self):
+        return self.database.execute(self)
+
+class FakeSupabase:
+    """
+    In-memory database with the table() entry point of the Supabase client.
+    Safe to use from several threads. requests counts the requests per
+    (table, operation) and busy_seconds the time spent answering them.
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.tables = {}
+        self.next_ids = Counter()
+        self.requests = Counter()
+        self.busy_seconds = 0.0
+        self.last_stamp = datetime.now(timezone.utc)
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def stamp(self):
+        """Strictly increasing updated_at, like clock_timestamp() in the trigger"""
+        self.last_stamp = max(datetime.now(timezone.utc), self.last_stamp + timedelta(microseconds=1))
+        return self.last_stamp.isoformat(timespec="microseconds")
+
+    def rows(self, table):
+        return self.tables.setdefault(table, {})
+
+    def load(self, table, rows):
+        """Bulk insert rows (with or without ids) without counting requests, e.g. to seed a benchmark"""
+        with self.lock:
+            for row in rows:
+                self.add_row(table, row)
+
+    def add_row(self, table, row):
+        row = dict(row)
+        if row.get("id") is None:
+            self.next_ids[table] += 1
+            row["id"] = self.next_ids[table]
+        else:
+            self.next_ids[table] = max(self.next_ids[table], row["id"])
+        if table in TRACKED_TABLES:
+            row["updated_at"] = self.stamp()
+        self.rows(table)[row["id"]] = row
+        return row
+
+    def remove_row(self, table, row_id):
+        row = self.rows(table).pop(row_id)
+        if table == "clients":
+            for payment in [payment for payment in self.rows("payments").values() if payment.get("client_id") == row_id]:
+                self.remove_row("payments", payment["id"])
+        if table in TRACKED_TABLES:
+            self.add_row("deleted_rows", {"table_name": table, "row_id": row_id, "deleted_at": self.stamp()})
+        return row
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests.clear()
+            self.busy_seconds = 0.0
+
+    def execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            started = time.perf_counter()
+            try:
+                return self.run(query)
+            finally:
+                self.requests[(query.table, query.operation)] += 1
+                self.busy_seconds += time.perf_counter() - started
+
+    def run(self, query):
+        rows = self.rows(query.table)
+        if query.operation == "insert":
+            payload = query.payload if isinstance(query.payload, list) else [query.payload]
+            return FakeResponse([dict(self.add_row(query.table, row)) for row in payload])
+        matching = query.matching(rows)
+        if query.operation == "update":
+            for row in matching:
+                row.update(query.payload)
+                if query.table in TRACKED_TABLES:
+                    row["updated_at"] = self.stamp()
+            return FakeResponse([dict(row) for row in matching])
+        if query.operation == "delete":
+            return FakeResponse([dict(self.remove_row(query.table, row["id"])) for row in matching])
+
+        count = len(matching) if query.count else None
+        matching = self.ordered(matching, query.ordering, query.row_limit)
+        return FakeResponse([query.project(row) for row in matching], count)
+
+    @staticmethod
+    def ordered(rows, ordering, limit):
+        """Sort rows (None last ascending, first descending, as in PostgreSQL) and keep the first limit"""
+        columns = [column for column, desc in ordering]
+        key = lambda row: tuple((row.get(column) is None, row.get(column)) for column in columns)
+        directions = {desc for column, desc in ordering}
+        if len(directions) == 1:
+            desc = directions.pop()
+            if limit is not None:
+                # A page needs a partial sort only
+                return (heapq.nlargest if desc else heapq.nsmallest)(limit, rows, key=key)
+            return sorted(rows, key=key, reverse=desc)
+        for column, desc in reversed(ordering):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        return rows if limit is None else rows[:limit]
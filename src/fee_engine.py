@@ -0,0 +1,141 @@
+"""
+Late fee and interest engine for the receivables book.
+Computes days late, the 5% late fee, the 3%-per-month pro-rata interest and the
+total due for many payments at once with NumPy. Money is handled in integer
+cents and every rounding is half-up, like Decimal.quantize(ROUND_HALF_UP).
+Missing, non-numeric or non-finite amounts are flagged invalid and owe nothing.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+import numpy as np
+
+LATE_FEE_PERCENT = 5
+MONTHLY_INTEREST_PERCENT = 3
+DAYS_PER_MONTH = 30
+# Largest amount (in reais) whose cents, fees and interest fit in int64
+MAX_AMOUNT = 10 ** 12
+
+# Payments not yet late (including those due today) get their own bucket
+AGING_BUCKETS = ("A vencer", "1-30 dias", "31-60 dias", "61-90 dias", "90+ dias")
+AGING_EDGES = np.array([1, 31, 61, 91])
+
+class Charges:
+    """
+    Result of compute_charges: one NumPy array per quantity, aligned with the input.
+    Money arrays are int64 cents. valid is False for payments whose amount is
+    missing or not a finite number; every quantity of those is zero.
+    """
+    def __init__(self, amount, days_late, late_fee, interest, total, valid):
+        self.valid = valid
+        self.amount = amount
+        self.days_late = days_late
+        self.late_fee = late_fee
+        self.interest = interest
+        self.total = total
+
+    def __len__(self):
+        return len(self.amount)
+
+def parse_amounts(amounts):
+    """Convert amounts to float64 and flag the valid ones; missing or non-numeric amounts become NaN"""
+    try:
+        values = np.asarray(amounts, dtype=np.float64)
+    except (ValueError, TypeError):
+        values = np.array([np.nan if amount is None else float(amount) for amount in map(parse_amount, amounts)], dtype=np.float64)
+    valid = np.isfinite(values) & (np.abs(values) <= MAX_AMOUNT)
+    return values, valid
+
+def to_cents(amounts):
+    """Convert amounts (numbers or numeric strings) to int64 cents; raises ValueError for non-finite ones"""
+    values = np.asarray(amounts, dtype=np.float64)
+    if not (np.isfinite(values) & (np.abs(values) <= MAX_AMOUNT)).all():
+        raise ValueError("Amounts must be finite numbers")
+    return np.rint(values * 100).astype(np.int64)
+
+def parse_amount(value):
+    """Decimal of a stored amount, or None when it is missing, not a finite number or too large"""
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    return amount if amount.is_finite() and abs(amount) <= MAX_AMOUNT else None
+
+def parse_dates(due_dates):
+    """Convert "YYYY-MM-DD" strings to datetime64[D], with NaT for invalid or missing dates"""
+    try:
+        return np.array(due_dates, dtype="datetime64[D]")
+    except ValueError:
+        parsed = np.empty(len(due_dates), dtype="datetime64[D]")
+        for index, due_date in enumerate(due_dates):
+            try:
+                parsed[index] = np.datetime64(due_date, "D")
+            except (ValueError, TypeError):
+                parsed[index] = np.datetime64("NaT")
+        return parsed
+
+def divide_half_up(numerator, denominator):
+    """Integer division of non-negative arrays rounded half-up"""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+def compute_charges(amounts, due_dates, reference_date=None, paid=None):
+    """
+    Compute days late, late fee, interest and total due for every payment.
+    Paid payments and payments with an invalid due date owe nothing extra;
+    paid ones and those with an invalid amount have a total due of zero.
+    """
+    reference = np.datetime64(reference_date or date.today(), "D")
+    values, valid = parse_amounts(amounts)
+    # Invalid amounts are skipped explicitly rather than cast to a garbage value
+    amount = to_cents(np.where(valid, values, 0.0))
+    due = parse_dates(due_dates)
+
+    days_late = (reference - due).astype(np.int64)
+    days_late[np.isnat(due) | ~valid] = 0
+    np.maximum(days_late, 0, out=days_late)
+    if paid is not None:
+        paid = np.asarray(paid, dtype=bool)
+        days_late[paid] = 0
+
+    late = days_late > 0
+    late_fee = np.where(late, divide_half_up(amount * LATE_FEE_PERCENT, 100), 0)
+    interest = np.where(late, divide_half_up(amount * MONTHLY_INTEREST_PERCENT * days_late, 100 * DAYS_PER_MONTH), 0)
+    total = amount + late_fee + interest
+    if paid is not None:
+        total[paid] = 0
+
+    return Charges(amount, days_late, late_fee, interest, total, valid)
+
+def aging_report(charges, paid=None):
+    """
+    Group open payments with a valid amount by days late into the AGING_BUCKETS.
+    Returns one dict per bucket with the count, the principal and the total due.
+    """
+    open_rows = charges.valid.copy() if paid is None else charges.valid & ~np.asarray(paid, dtype=bool)
+    buckets = np.digitize(charges.days_late[open_rows], AGING_EDGES)
+    counts = np.bincount(buckets, minlength=len(AGING_BUCKETS))
+    principal = np.zeros(len(AGING_BUCKETS), dtype=np.int64)
+    totals = np.zeros(len(AGING_BUCKETS), dtype=np.int64)
+    np.add.at(principal, buckets, charges.amount[open_rows])
+    np.add.at(totals, buckets, charges.total[open_rows])
+    return [
+        {'bucket': name, 'count': int(counts[index]), 'amount': cents_to_decimal(principal[index]), 'total': cents_to_decimal(totals[index])}
+        for index, name in enumerate(AGING_BUCKETS)
+    ]
+
+def cents_to_decimal(cents):
+    """Convert integer cents to a Decimal amount"""
+    return Decimal(int(cents)).scaleb(-2)
+
+def format_cents(cents):
+    """Format integer cents the way the tables show amounts, e.g. 1234,56"""
+    cents = int(cents)
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}{cents // 100},{cents % 100:02d}"
+
+def format_brl(cents):
+    """Format integer cents as Brazilian reais, e.g. R$ 1.234,56"""
+    cents = int(cents)
+    sign = "-" if cents < 0 else ""
+    reais, cents = divmod(abs(cents), 100)
+    return f"{sign}R$ {reais:_},{cents:02d}".replace("_", ".")
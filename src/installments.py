@@ -0,0 +1,44 @@
+"""
+Installment plans: a sale split into payments due at a regular interval.
+Amounts are integer cents so the installments always add up to the total.
+"""
+import calendar
+from datetime import timedelta
+
+INTERVAL_UNITS = ("months", "weeks", "days")
+REMAINDER_PLACES = ("first", "last")
+
+def add_months(day, months):
+    """Same day of the month, months later, clamped to the last day of shorter months"""
+    year, month = divmod(day.month - 1 + months, 12)
+    year += day.year
+    return day.replace(year=year, month=month + 1, day=min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+def due_dates(first_due, count, interval=1, unit="months"):
+    """Due dates of count installments, every interval units from first_due"""
+    if unit == "months":
+        # Counted from the first due date so a 31st stays on the 31st after a short month
+        return [add_months(first_due, index * interval) for index in range(count)]
+    step = timedelta(weeks=interval) if unit == "weeks" else timedelta(days=interval)
+    return [first_due + index * step for index in range(count)]
+
+def split_amount(total_cents, count, remainder="last"):
+    """Split a total in count equal installments, the cents left over going to the first or last one"""
+    base, extra = divmod(total_cents, count)
+    amounts = [base] * count
+    amounts[0 if remainder == "first" else -1] += extra
+    return amounts
+
+def plan_installments(amount_cents, count, first_due, interval=1, unit="months", per_installment=False, remainder="last"):
+    """
+    Return the (amount_cents, due_date) of every installment. amount_cents is
+    the total of the plan, or the amount of each installment with per_installment.
+    """
+    if count < 1 or interval < 1:
+        raise ValueError("count and interval must be at least 1")
+    if unit not in INTERVAL_UNITS:
+        raise ValueError(f"Unknown interval unit: {unit}")
+    if remainder not in REMAINDER_PLACES:
+        raise ValueError(f"Unknown remainder place: {remainder}")
+    amounts = [amount_cents] * count if per_installment else split_amount(amount_cents, count, remainder)
+    return list(zip(amounts, due_dates(first_due, count, interval, unit)))
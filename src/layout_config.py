@@ -1,5 +1,6 @@
 """
 Configuration for the layout and styling of the Payment Manager System application.
+Runtime settings that do not affect the layout live in settings.py.
 """
 
 # Font settings
@@ -41,3 +42,21 @@ TOGGLE_PAID_BUTTON_BG_COLOR = "#cce5ff"
 CLIENT_CRUD_BUTTON_BG_COLOR = "#d1ecf1"
 PAYMENT_CRUD_BUTTON_BG_COLOR = "#d1ecf1"
 REFRESH_BUTTON_BG_COLOR = "#d1ecf1"
+PAGINATION_BUTTON_BG_COLOR = "#e2e3e5"
+REPORT_BUTTON_BG_COLOR = "#d1ecf1"
+DIAGNOSTICS_BUTTON_BG_COLOR = "#e2e3e5"
+IMPORT_BUTTON_BG_COLOR = "#d4edda"
+EXPORT_BUTTON_BG_COLOR = "#d1ecf1"
+
+# Virtual table settings
+VIRTUAL_TABLE_BUFFER = 20
+VIRTUAL_TABLE_DEFAULT_VISIBLE_ROWS = 20
+VIRTUAL_TABLE_DEFAULT_ROW_HEIGHT = 20
+VIRTUAL_TABLE_DEFAULT_HEADING_HEIGHT = 25
+
+# Diagnostics window settings
+DIAGNOSTICS_WINDOW_SIZE = "1100x600"
+DIAGNOSTICS_REFRESH_MS = 1000
+
+# Client search settings
+CLIENT_SEARCH_DEBOUNCE_MS = 150
@@ -0,0 +1,644 @@
+"""
+Local SQLite mirror of the Supabase tables.
+LocalMirror exposes the same table()/select()/eq()/.../execute() interface as
+the Supabase client, so every window and module uses it without knowing which
+source is live. Reads of the mirrored tables are answered from SQLite once
+the first full pull has finished (until then they go to Supabase). Writes go
+through to Supabase and are applied to the mirror. When Supabase cannot be
+reached, the write is applied locally and kept in an outbox. MirrorSync
+replays the outbox later and detects conflicts.
+"""
+import json
+import errno
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from settings import *
+from metrics import metrics
+
+MIRRORED_TABLES = {
+    "clients": ("id", "name", "phone", "updated_at"),
+    "payments": ("id", "client_id", "amount", "due_date", "is_paid", "updated_at"),
+}
+BOOLEAN_COLUMNS = {"is_paid"}
+LOCAL_TABLES = {"deleted_rows": ("id", "table_name", "row_id", "deleted_at")}
+
+SCHEMA = """
+create table if not exists clients (
+    id integer primary key, name text, phone text, updated_at text, remote_updated_at text
+);
+create table if not exists payments (
+    id integer primary key, client_id integer, amount real, due_date text, is_paid integer,
+    updated_at text, remote_updated_at text
+);
+create index if not exists payments_client_idx on payments (client_id);
+create index if not exists payments_due_date_idx on payments (due_date, id);
+create index if not exists payments_updated_at_idx on payments (updated_at, id);
+create index if not exists clients_updated_at_idx on clients (updated_at, id);
+create table if not exists deleted_rows (
+    id integer primary key autoincrement, table_name text, row_id integer, deleted_at text
+);
+create table if not exists outbox (
+    id integer primary key autoincrement, table_name text, operation text, row_id integer,
+    payload text, base_updated_at text, created_at text
+);
+create table if not exists id_map (
+    table_name text, provisional_id integer, real_id integer, primary key (table_name, provisional_id)
+);
+create table if not exists meta (key text primary key, value text);
+"""
+
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+# Socket errors raised while connecting, before any request was sent
+UNREACHABLE_ERRNOS = {errno.ECONNREFUSED, errno.ENETUNREACH, errno.EHOSTUNREACH, errno.ENETDOWN, errno.EHOSTDOWN}
+
+def is_offline_error(error):
+    """Whether an exception means Supabase could not be reached, as opposed to a rejected request"""
+    if isinstance(error, OSError):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, httpx.TransportError)
+
+def is_unsent_error(error):
+    """
+    Whether an exception means a request never reached Supabase, so sending it
+    again cannot apply it twice. A timeout or a dropped connection after the
+    request went out does not count: the server may have committed it.
+    """
+    if isinstance(error, (ConnectionRefusedError, socket.gaierror)):
+        return True
+    if isinstance(error, OSError) and error.errno in UNREACHABLE_ERRNOS:
+        return True
+    try:
+        import httpx
+    except ImportError:
+        return False
+    return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+def split_top_level(expression):
+    """Split a PostgREST logic expression on the commas that are not inside parentheses or quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in expression:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+class MirrorResponse:
+    """
+    Result of a mirror query, shaped like the Supabase response.
+    """
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+class MirrorQuery:
+    """
+    Query builder with the subset of the Supabase API used by the app.
+    Every call is recorded so the same query can be replayed on Supabase.
+    """
+    def __init__(self, mirror, table):
+        self.mirror = mirror
+        self.table = table
+        self.calls = []
+        self.operation = "select"
+        self.columns = "*"
+        self.count = None
+        self.payload = None
+        self.conditions = []
+        self.ordering = []
+        self.row_limit = None
+        self.source = "supabase"
+
+    def record(self, name, *args, **kwargs):
+        self.calls.append((name, args, kwargs))
+        return self
+
+    def column(self, name):
+        """Validate a column name before it is put in SQL"""
+        columns = self.mirror.columns(self.table)
+        if columns is not None and name not in columns:
+            raise ValueError(f"Unknown column {self.table}.{name}")
+        return name
+
+    @staticmethod
+    def value(value):
+        """Convert a filter value to what SQLite stores"""
+        if isinstance(value, bool):
+            return int(value)
+        if value in ("true", "false"):
+            return int(value == "true")
+        return value
+
+    def select(self, columns="*", count=None):
+        self.columns = columns
+        self.count = count
+        return self.record("select", columns, **({"count": count} if count else {}))
+
+    def insert(self, data):
+        self.operation, self.payload = "insert", data
+        return self.record("insert", data)
+
+    def update(self, data):
+        self.operation, self.payload = "update", data
+        return self.record("update", data)
+
+    def delete(self):
+        self.operation = "delete"
+        return self.record("delete")
+
+    def filter(self, column, operator, value):
+        self.conditions.append((f"{self.column(column)} {OPERATORS[operator]} ?", [self.value(value)]))
+        return self.record(operator, column, value)
+
+    def eq(self, column, value):
+        return self.filter(column, "eq", value)
+
+    def neq(self, column, value):
+        return self.filter(column, "neq", value)
+
+    def gt(self, column, value):
+        return self.filter(column, "gt", value)
+
+    def gte(self, column, value):
+        return self.filter(column, "gte", value)
+
+    def lt(self, column, value):
+        return self.filter(column, "lt", value)
+
+    def lte(self, column, value):
+        return self.filter(column, "lte", value)
+
+    def ilike(self, column, pattern):
+        self.conditions.append((f"lower({self.column(column)}) like lower(?)", [pattern]))
+        return self.record("ilike", column, pattern)
+
+    def in_(self, column, values):
+        values = [self.value(value) for value in values]
+        placeholders = ", ".join("?" for _ in values) or "null"
+        self.conditions.append((f"{self.column(column)} in ({placeholders})", values))
+        return self.record("in_", column, values)
+
+    def or_(self, expression):
+        self.conditions.append(self.logic("or", expression))
+        return self.record("or_", expression)
+
+    def logic(self, operator, expression):
+        """Compile an and/or list of PostgREST conditions such as id.gt.5,and(a.eq.1,b.lt.2)"""
+        parts, params = [], []
+        for condition in split_top_level(expression):
+            if condition.startswith(("and(", "or(")):
+                nested, inner = condition.split("(", 1)
+                sql, values = self.logic(nested, inner[:-1])
+            else:
+                column, operator_name, value = condition.split(".", 2)
+                if len(value) >= 2 and value[0] == value[-1] == '"':
+                    value = value[1:-1]
+                sql, values = f"{self.column(column)} {OPERATORS[operator_name]} ?", [self.value(value)]
+            parts.append(sql)
+            params.extend(values)
+        return "(" + f" {operator} ".join(parts) + ")", params
+
+    def order(self, column, desc=False):
+        self.ordering.append(f"{self.column(column)} {'desc' if desc else 'asc'}")
+        return self.record("order", column, **({"desc": True} if desc else {}))
+
+    def limit(self, count):
+        self.row_limit = int(count)
+        return self.record("limit", count)
+
+    def where(self):
+        """SQL where clause and parameters of the filters"""
+        if not self.conditions:
+            return "", []
+        return " where " + " and ".join(sql for sql, params in self.conditions), [param for sql, params in self.conditions for param in params]
+
+    def replay(self, client):
+        """Run the recorded query on another client, e.g. Supabase"""
+        query = client.table(self.table)
+        for name, args, kwargs in self.calls:
+            query = getattr(query, name)(*args, **kwargs)
+        return query.execute()
+
+    def execute(self):
+        started = time.perf_counter()
+        error = False
+        try:
+            if self.operation == "select":
+                if self.mirror.serves(self.table):
+                    self.source = "mirror"
+                    return self.mirror.read(self)
+                return self.replay(self.mirror.remote)
+            return self.mirror.write(self)
+        except Exception:
+            error = True
+            raise
+        finally:
+            metrics.record_query(self.table, self.operation, self.source, time.perf_counter() - started, error)
+
+class LocalMirror:
+    """
+    SQLite mirror of clients and payments with an outbox of writes made offline.
+    Safe to use from several threads. Listeners are called with "ready" after the
+    first full pull, "changed" when pulled or replayed rows change the mirror,
+    "conflict" when a queued write was refused, and "status" when the
+    connection state or the number of pending writes changes.
+    """
+    def __init__(self, connect, path=MIRROR_PATH):
+        self.connect = connect
+        self.client = None
+        self.connect_lock = threading.Lock()
+        self.connection = None
+        self.lock = threading.RLock()
+        self.write_lock = threading.RLock()
+        self.listeners = []
+        self.conflicts = []
+        self.online = True
+        self.open(path)
+
+    def open(self, path):
+        """
+        Switch to the mirror file at path. The outbox and the write lock only
+        guard one process, so every program that runs next to the app calls
+        this with its own file before its first query.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.write_lock, self.lock:
+            if self.connection is not None:
+                self.connection.close()
+            self.path = path
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.executescript(SCHEMA)
+            self.last_stamp = max(
+                self.connection.execute(f"select coalesce(max(updated_at), '') from {table}").fetchone()[0] for table in MIRRORED_TABLES
+            )
+            self.ready = self.is_ready()
+
+    def table(self, name):
+        return MirrorQuery(self, name)
+
+    @property
+    def remote(self):
+        """Supabase client, created on first use so startup does not wait for it"""
+        with self.connect_lock:
+            if self.client is None:
+                self.client = self.connect()
+            return self.client
+
+    # State
+
+    def add_listener(self, listener):
+        """Call listener(kind) on mirror events; it runs on the thread that caused the event"""
+        self.listeners.append(listener)
+
+    def notify(self, kind):
+        for listener in list(self.listeners):
+            listener(kind)
+
+    def set_online(self, online):
+        """Record whether Supabase answered the last request"""
+        if online != self.online:
+            self.online = online
+            self.notify("status")
+
+    def columns(self, table):
+        """Public columns of a local table, or None for tables only Supabase has"""
+        return MIRRORED_TABLES.get(table) or LOCAL_TABLES.get(table)
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.connection.execute("select value from meta where key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.connection:
+            self.connection.execute("insert or replace into meta (key, value) values (?, ?)", (key, json.dumps(value)))
+
+    def get_marks(self, table):
+        """Sync marks of the last pull of a table, or None before the first one"""
+        marks = self.get_meta(f"marks:{table}")
+        return (tuple(marks[0]), *marks[1:]) if marks else None
+
+    def is_ready(self):
+        """Whether every mirrored table has been pulled in full at least once"""
+        return all(self.get_marks(table) is not None for table in MIRRORED_TABLES)
+
+    def serves(self, table):
+        """Whether reads of a table are answered locally, which starts once every table has been pulled"""
+        return self.ready and (table in MIRRORED_TABLES or table in LOCAL_TABLES)
+
+    def pending_count(self):
+        """Number of writes waiting in the outbox"""
+        with self.lock:
+            return self.connection.execute("select count(*) from outbox").fetchone()[0]
+
+    def stamp(self):
+        """Local change timestamp, strictly increasing so delta syncs over the mirror never miss a row"""
+        with self.lock:
+            stamp = datetime.now(timezone.utc).isoformat(timespec="microseconds")
+            if stamp <= self.last_stamp:
+                stamp = (datetime.fromisoformat(self.last_stamp) + timedelta(microseconds=1)).isoformat(timespec="microseconds")
+            self.last_stamp = stamp
+            return stamp
+
+    # Reads
+
+    def read(self, query):
+        """Answer a select from SQLite"""
+        public = self.columns(query.table)
+        columns = public if query.columns.strip() == "*" else [query.column(name.strip()) for name in query.columns.split(",")]
+        where, params = query.where()
+        sql = f"select {', '.join(columns)} from {query.table}{where}"
+        if query.ordering:
+            sql += " order by " + ", ".join(query.ordering)
+        if query.row_limit is not None:
+            sql += f" limit {query.row_limit}"
+        with self.lock:
+            rows = [self.to_dict(row) for row in self.connection.execute(sql, params)]
+            count = self.connection.execute(f"select count(*) from {query.table}{where}", params).fetchone()[0] if query.count else None
+        return MirrorResponse(rows, count)
+
+    @staticmethod
+    def to_dict(row):
+        values = dict(row)
+        for column in BOOLEAN_COLUMNS & values.keys():
+            values[column] = bool(values[column])
+        return values
+
+    def rows_matching(self, query):
+        """Ids and remote timestamps of the local rows a write query targets"""
+        where, params = query.where()
+        with self.lock:
+            return self.connection.execute(f"select id, remote_updated_at from {query.table}{where}", params).fetchall()
+
+    def rows_by_id(self, table, ids):
+        ids = list(ids)
+        with self.lock:
+            rows = self.connection.execute(
+                f"select {', '.join(MIRRORED_TABLES[table])} from {table} where id in ({', '.join('?' for _ in ids) or 'null'})", ids
+            ).fetchall()
+        return [self.to_dict(row) for row in rows]
+
+    # Local changes
+
+    def store_rows(self, table, rows):
+        """Insert or replace rows coming from Supabase, keeping their timestamp for conflict checks"""
+        columns = [column for column in MIRRORED_TABLES[table] if column != "updated_at"]
+        with self.lock, self.connection:
+            for row in rows:
+                values = [self.value(row.get(column)) for column in columns]
+                self.connection.execute(
+                    f"insert or replace into {table} ({', '.join(columns)}, updated_at, remote_updated_at) values ({', '.join('?' for _ in columns)}, ?, ?)",
+                    values + [self.stamp(), row.get("updated_at")],
+                )
+
+    @staticmethod
+    def value(value):
+        return int(value) if isinstance(value, bool) else value
+
+    def remove_rows(self, table, ids):
+        """Delete rows and leave tombstones for delta syncs; deleting clients cascades to their payments"""
+        ids = list(ids)
+        if not ids:
+            return
+        with self.lock, self.connection:
+            if table == "clients":
+                placeholders = ", ".join("?" for _ in ids)
+                payment_ids = [row[0] for row in self.connection.execute(f"select id from payments where client_id in ({placeholders})", ids)]
+                self.remove_rows("payments", payment_ids)
+            for row_id in ids:
+                self.connection.execute(f"delete from {table} where id = ?", (row_id,))
+                self.connection.execute(
+                    "insert into deleted_rows (table_name, row_id, deleted_at) values (?, ?, ?)", (table, row_id, self.stamp())
+                )
+
+    def apply_write(self, table, operation, rows):
+        """Mirror the rows Supabase returned for a write"""
+        if table not in MIRRORED_TABLES or not rows:
+            return
+        if operation == "delete":
+            self.remove_rows(table, [row['id'] for row in rows])
+        else:
+            self.store_rows(table, rows)
+
+    def apply_remote(self, table, changed, deleted_ids, marks):
+        """Apply pulled changes, leaving alone the rows that still have queued writes"""
+        with self.lock:
+            pending = {row[0] for row in self.connection.execute("select row_id from outbox where table_name = ?", (table,))}
+            self.store_rows(table, [row for row in changed if row['id'] not in pending])
+            self.remove_rows(table, deleted_ids)
+            self.set_meta(f"marks:{table}", [list(marks[0]), marks[1], [list(items) for items in marks[2]]])
+        if not self.ready and self.is_ready():
+            # The windows loaded from Supabase so far and must reload from the mirror
+            self.ready = True
+            self.notify("ready")
+        elif self.ready and (changed or deleted_ids):
+            self.notify("changed")
+
+    # Writes
+
+    def write(self, query):
+        """
+        Write through to Supabase, or queue the write when it cannot be reached.
+        Errors after the request was sent, such as a read timeout, are raised:
+        the write may have been applied and queuing it could apply it twice.
+        """
+        with self.write_lock:
+            if not self.pending_count():
+                try:
+                    response = query.replay(self.remote)
+                except Exception as error:
+                    if not is_unsent_error(error):
+                        if is_offline_error(error):
+                            self.set_online(False)
+                        raise
+                else:
+                    self.set_online(True)
+                    self.apply_write(query.table, query.operation, response.data)
+                    return response
+            self.set_online(False)
+            query.source = "outbox"
+            response = self.queue(query)
+            self.notify("status")
+            return response
+
+    def queue(self, query):
+        """Apply a write locally and keep it in the outbox for replay"""
+        table, now = query.table, datetime.now(timezone.utc).isoformat()
+        if query.operation == "insert":
+            rows = query.payload if isinstance(query.payload, list) else [query.payload]
+            queued = []
+            with self.lock, self.connection:
+                for row in rows:
+                    row_id = None
+                    if table in MIRRORED_TABLES:
+                        row_id = self.provisional_id()
+                        self.store_rows(table, [dict(row, id=row_id, updated_at=None)])
+                    self.enqueue(table, "insert", row_id, row, None, now)
+                    queued.append(row_id)
+            data = self.rows_by_id(table, queued) if table in MIRRORED_TABLES else rows
+            return MirrorResponse(data)
+
+        if table not in MIRRORED_TABLES:
+            raise ConnectionError("Sem conexão com o banco de dados.")
+        targets = self.rows_matching(query)
+        ids = [row['id'] for row in targets]
+        with self.lock, self.connection:
+            for row in targets:
+                self.enqueue(table, query.operation, row['id'], query.payload, self.base_updated_at(table, row), now)
+            if query.operation == "update":
+                data = self.rows_by_id(table, ids)
+                self.store_rows(table, [dict(row, **query.payload, updated_at=self.remote_updated_at(table, row['id'])) for row in data])
+                return MirrorResponse(self.rows_by_id(table, ids))
+            data = self.rows_by_id(table, ids)
+            self.remove_rows(table, ids)
+            return MirrorResponse(data)
+
+    def enqueue(self, table, operation, row_id, payload, base_updated_at, created_at):
+        self.connection.execute(
+            "insert into outbox (table_name, operation, row_id, payload, base_updated_at, created_at) values (?, ?, ?, ?, ?, ?)",
+            (table, operation, row_id, json.dumps(payload), base_updated_at, created_at),
+        )
+
+    def base_updated_at(self, table, row):
+        """Server timestamp a queued write expects to find, which is the one before the first queued write of the row"""
+        first = self.connection.execute(
+            "select base_updated_at from outbox where table_name = ? and row_id = ? order by id limit 1", (table, row['id'])
+        ).fetchone()
+        return first[0] if first else row['remote_updated_at']
+
+    def remote_updated_at(self, table, row_id):
+        row = self.connection.execute(f"select remote_updated_at from {table} where id = ?", (row_id,)).fetchone()
+        return row[0] if row else None
+
+    def provisional_id(self):
+        """Negative id for a row created offline, replaced by the real id on replay"""
+        row_id = (self.get_meta("provisional_id") or 0) - 1
+        self.set_meta("provisional_id", row_id)
+        return row_id
+
+    # Replay
+
+    def replay_outbox(self):
+        """Send the queued writes in order; stops at the first one Supabase cannot receive"""
+        with self.write_lock:
+            while True:
+                with self.lock:
+                    entry = self.connection.execute("select * from outbox order by id limit 1").fetchone()
+                if entry is None:
+                    return
+                try:
+                    self.replay_entry(entry)
+                except Exception as error:
+                    if is_unsent_error(error) or (is_offline_error(error) and entry['operation'] != "insert"):
+                        # Not sent, or an update or delete that is safe to send again: retry on the next tick
+                        self.set_online(False)
+                        return
+                    if is_offline_error(error):
+                        # The insert may have been committed before the connection failed: sending it again could duplicate it
+                        self.record_conflict(entry, f"sem resposta do servidor, confira se o registro foi criado: {error}")
+                    else:
+                        # Supabase refused it: drop it so the rest of the queue is not blocked
+                        self.record_conflict(entry, f"recusada pelo servidor: {error}")
+                with self.lock, self.connection:
+                    self.connection.execute("delete from outbox where id = ?", (entry['id'],))
+                self.set_online(True)
+                self.notify("status")
+
+    def replay_entry(self, entry):
+        """Send one queued write, checking first that nobody changed the row meanwhile"""
+        table, operation = entry['table_name'], entry['operation']
+        payload = self.resolve_payload(table, json.loads(entry['payload']))
+        if operation == "insert":
+            data = self.remote.table(table).insert(payload).execute().data
+            if table in MIRRORED_TABLES and data:
+                self.replace_provisional(table, entry['row_id'], data[0])
+            return
+
+        row_id = self.resolve_id(table, entry['row_id'])
+        current = self.remote.table(table).select("id, updated_at").eq("id", row_id).execute().data
+        if not current:
+            self.record_conflict(entry, "o registro foi excluído por outro usuário")
+            self.remove_rows(table, [row_id])
+            return
+        if entry['base_updated_at'] is not None and current[0]['updated_at'] != entry['base_updated_at']:
+            self.record_conflict(entry, "o registro foi alterado por outro usuário")
+            self.store_rows(table, self.remote.table(table).select(", ".join(MIRRORED_TABLES[table])).eq("id", row_id).execute().data)
+            return
+        if operation == "update":
+            data = self.remote.table(table).update(payload).eq("id", row_id).execute().data
+            self.store_rows(table, data)
+        else:
+            self.remote.table(table).delete().eq("id", row_id).execute()
+        self.notify("changed")
+
+    def resolve_id(self, table, row_id):
+        """Real id of a row created offline, or the id itself"""
+        if row_id is None or row_id >= 0:
+            return row_id
+        with self.lock:
+            row = self.connection.execute(
+                "select real_id from id_map where table_name = ? and provisional_id = ?", (table, row_id)
+            ).fetchone()
+        return row[0] if row else row_id
+
+    def resolve_payload(self, table, payload):
+        """Point a queued payload at the real ids of clients created offline"""
+        if table == "payments" and isinstance(payload, dict) and (payload.get("client_id") or 0) < 0:
+            payload = dict(payload, client_id=self.resolve_id("clients", payload["client_id"]))
+        return payload
+
+    def replace_provisional(self, table, provisional_id, row):
+        """Swap a row created offline for the one Supabase created"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "insert or replace into id_map (table_name, provisional_id, real_id) values (?, ?, ?)", (table, provisional_id, row['id'])
+            )
+            if table == "clients":
+                # Keep the client's payments, pointing them at the real id
+                self.connection.execute(
+                    "update payments set client_id = ?, updated_at = ? where client_id = ?", (row['id'], self.stamp(), provisional_id)
+                )
+            self.connection.execute(f"delete from {table} where id = ?", (provisional_id,))
+            self.connection.execute(
+                "insert into deleted_rows (table_name, row_id, deleted_at) values (?, ?, ?)", (table, provisional_id, self.stamp())
+            )
+            self.connection.execute("update outbox set row_id = ? where table_name = ? and row_id = ?", (row['id'], table, provisional_id))
+            self.store_rows(table, [row])
+        self.notify("changed")
+
+    def record_conflict(self, entry, reason):
+        """Keep a refused queued write for the user to review"""
+        self.conflicts.append({
+            'table': entry['table_name'],
+            'operation': entry['operation'],
+            'row_id': entry['row_id'],
+            'payload': json.loads(entry['payload']),
+            'reason': reason,
+        })
+        self.notify("conflict")
+
+    def take_conflicts(self):
+        """Return and clear the recorded conflicts"""
+        conflicts, self.conflicts = self.conflicts, []
+        return conflicts
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
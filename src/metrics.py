@@ -0,0 +1,218 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from settings import *
+
+class Metrics:
+    """
+    Latency and count metrics for backend queries and Tk handlers.
+    Each query is tagged with its table, its operation, where it was served
+    (the local mirror, Supabase or the offline outbox) and the UI action that
+    caused it. The action follows the work from the Tk handler to the worker
+    threads of the BackgroundRunner. Every event is appended to a JSON-lines
+    file, rotated once it reaches max_log_bytes; the totals and a window of recent samples per series give the
+    p50/p95 shown in the diagnostics panel and written in Prometheus text format.
+    """
+    def __init__(self, log_path=METRICS_LOG_PATH, prometheus_path=METRICS_PROMETHEUS_PATH, sample_size=METRICS_SAMPLE_SIZE,
+                 max_log_bytes=METRICS_LOG_MAX_BYTES, log_backups=METRICS_LOG_BACKUPS):
+        self.log_path = log_path
+        self.max_log_bytes = max_log_bytes
+        self.log_backups = log_backups
+        self.prometheus_path = prometheus_path
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.queries = defaultdict(self.new_series)
+        self.handlers = defaultdict(self.new_series)
+        self.queries_by_action = defaultdict(int)
+        self.log_file = None
+
+    def new_series(self):
+        return {"count": 0, "sum": 0.0, "errors": 0, "samples": deque(maxlen=self.sample_size)}
+
+    # Actions
+
+    def current_action(self):
+        """UI action running on this thread, or None"""
+        return getattr(self.local, "action", None)
+
+    def set_action(self, action):
+        """Make action the current one on this thread and return the previous one"""
+        previous = self.current_action()
+        self.local.action = action
+        return previous
+
+    def bind(self, func, timed=False):
+        """
+        Wrap func so it runs under the action current at the time of the call to
+        bind, e.g. on a worker thread. With timed, its run time is recorded as a
+        handler named after the action, for result callbacks run on the Tk thread.
+        """
+        action = self.current_action()
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            previous = self.set_action(action)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if timed and action is not None:
+                    self.record_handler(f"{action}:callback", time.perf_counter() - started)
+                self.set_action(previous)
+        return run
+
+    # Recording
+
+    def record_query(self, table, operation, source, seconds, error=False):
+        action = self.current_action() or "(no action)"
+        with self.lock:
+            self.add(self.queries[(table, operation, source, action)], seconds, error)
+            self.queries_by_action[action] += 1
+        self.log({"type": "query", "table": table, "operation": operation, "source": source, "action": action, "seconds": seconds, "error": error})
+
+    def record_handler(self, action, seconds, error=False):
+        with self.lock:
+            self.add(self.handlers[action], seconds, error)
+        self.log({"type": "handler", "action": action, "seconds": seconds, "error": error})
+
+    @staticmethod
+    def add(series, seconds, error):
+        series["count"] += 1
+        series["sum"] += seconds
+        series["errors"] += error
+        series["samples"].append(seconds)
+
+    def log(self, event):
+        """Append an event to the JSON-lines file"""
+        event["time"] = datetime.now(timezone.utc).isoformat()
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self.lock:
+            try:
+                if self.log_file is None:
+                    os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                    self.log_file = open(self.log_path, "a", encoding="utf-8")
+                self.log_file.write(line)
+                if self.log_file.tell() >= self.max_log_bytes:
+                    self.rotate_log()
+            except OSError:
+                # Metrics must never break the app
+                pass
+
+    def rotate_log(self):
+        """Shift the log to .1, .1 to .2 and so on, dropping the oldest; the caller holds the lock"""
+        self.log_file.close()
+        self.log_file = None
+        for index in range(self.log_backups - 1, 0, -1):
+            if os.path.exists(f"{self.log_path}.{index}"):
+                os.replace(f"{self.log_path}.{index}", f"{self.log_path}.{index + 1}")
+        if self.log_backups > 0:
+            os.replace(self.log_path, f"{self.log_path}.1")
+        else:
+            os.remove(self.log_path)
+
+    # Reports
+
+    @staticmethod
+    def percentile(samples, fraction):
+        ordered = sorted(samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self, series):
+        samples = list(series["samples"])
+        return {
+            "count": series["count"],
+            "errors": series["errors"],
+            "sum": series["sum"],
+            "p50": self.percentile(samples, 0.5),
+            "p95": self.percentile(samples, 0.95),
+        }
+
+    def query_report(self):
+        """Summary per (table, operation, source, action), slowest p95 first"""
+        with self.lock:
+            report = [dict(self.summary(series), table=table, operation=operation, source=source, action=action)
+                      for (table, operation, source, action), series in self.queries.items()]
+        return sorted(report, key=lambda row: row["p95"], reverse=True)
+
+    def action_report(self):
+        """Summary per UI action with its handler latency and queries per run, most queries per run first"""
+        with self.lock:
+            report = []
+            for action, series in self.handlers.items():
+                row = dict(self.summary(series), action=action)
+                row["queries_per_run"] = self.queries_by_action.get(action, 0) / series["count"]
+                report.append(row)
+        return sorted(report, key=lambda row: row["queries_per_run"], reverse=True)
+
+    def prometheus_text(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = [
+            "# TYPE payment_manager_query_seconds summary",
+        ]
+        for row in self.query_report():
+            labels = f'table="{row["table"]}",operation="{row["operation"]}",source="{row["source"]}",action="{row["action"]}"'
+            lines.append(f'payment_manager_query_seconds{{{labels},quantile="0.5"}} {row["p50"]:.6f}')
+            lines.append(f'payment_manager_query_seconds{{{labels},quantile="0.95"}} {row["p95"]:.6f}')
+            lines.append(f'payment_manager_query_seconds_sum{{{labels}}} {row["sum"]:.6f}')
+            lines.append(f'payment_manager_query_seconds_count{{{labels}}} {row["count"]}')
+        lines.append("# TYPE payment_manager_handler_seconds summary")
+        for row in self.action_report():
+            labels = f'action="{row["action"]}"'
+            lines.append(f'payment_manager_handler_seconds{{{labels},quantile="0.5"}} {row["p50"]:.6f}')
+            lines.append(f'payment_manager_handler_seconds{{{labels},quantile="0.95"}} {row["p95"]:.6f}')
+            lines.append(f'payment_manager_handler_seconds_sum{{{labels}}} {row["sum"]:.6f}')
+            lines.append(f'payment_manager_handler_seconds_count{{{labels}}} {row["count"]}')
+        lines.append("# TYPE payment_manager_queries_per_action gauge")
+        for row in self.action_report():
+            lines.append(f'payment_manager_queries_per_action{{action="{row["action"]}"}} {row["queries_per_run"]:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Write the Prometheus file (for a node_exporter textfile collector) and flush the event log"""
+        text = self.prometheus_text()
+        try:
+            os.makedirs(os.path.dirname(self.prometheus_path), exist_ok=True)
+            temporary_path = self.prometheus_path + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as prometheus_file:
+                prometheus_file.write(text)
+            os.replace(temporary_path, self.prometheus_path)
+            with self.lock:
+                if self.log_file is not None:
+                    self.log_file.flush()
+        except OSError:
+            pass
+
+    def close(self):
+        self.export()
+        with self.lock:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
+
+metrics = Metrics()
+
+def timed_action(handler):
+    """Record the wall-clock time of a Tk handler and tag the queries it causes with its name, e.g. PaymentApp.send_reminder"""
+    action = handler.__qualname__
+
+    @functools.wraps(handler)
+    def run(*args, **kwargs):
+        previous = metrics.set_action(action)
+        started = time.perf_counter()
+        error = False
+        try:
+            return handler(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            metrics.record_handler(action, time.perf_counter() - started, error)
+            metrics.set_action(previous)
+    return run
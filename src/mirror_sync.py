@@ -0,0 +1,75 @@
+import threading
+import time
+import traceback
+from delta_sync import DeltaSync, EPOCH_MARK
+from local_mirror import MIRRORED_TABLES, is_offline_error
+from settings import *
+from metrics import metrics
+
+class MirrorSync:
+    """
+    Keeps a LocalMirror up to date from a background thread.
+    Every interval (or when woken up) it replays the outbox of writes made
+    offline, then pulls the rows changed and deleted in Supabase since the marks
+    stored in the mirror, clients before payments. The first pull of a table
+    starts from the epoch, which loads it in full.
+    """
+    def __init__(self, mirror, interval=MIRROR_SYNC_INTERVAL):
+        self.mirror = mirror
+        self.interval = interval
+        self.syncs = None
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name="mirror-sync", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        """Sync right away, then on every timer tick or wakeup until stopped"""
+        while not self.stopping:
+            started = time.perf_counter()
+            self.sync()
+            metrics.record_handler("MirrorSync.sync", time.perf_counter() - started)
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+    def request_sync(self):
+        """Sync as soon as possible, e.g. after the user asks for fresh data"""
+        self.wakeup.set()
+
+    def sync(self):
+        """Replay the outbox and pull every table, leaving the rest for the next tick when offline"""
+        try:
+            self.mirror.replay_outbox()
+            if self.mirror.pending_count():
+                # Writes still queued: pulling now would undo them on screen
+                return
+            if self.syncs is None:
+                # Built here so the Supabase client is created off the Tk thread
+                self.syncs = {
+                    table: DeltaSync(table, columns=", ".join(columns), client=self.mirror.remote)
+                    for table, columns in MIRRORED_TABLES.items()
+                }
+            for table, sync in self.syncs.items():
+                marks = self.mirror.get_marks(table)
+                if marks is None:
+                    # Deletions before the first pull do not matter, the full pull has none of those rows
+                    marks = (EPOCH_MARK, sync.fetch_marks()[1])
+                sync.set_marks(marks)
+                changed, deleted_ids, marks = sync.fetch_changes()
+                self.mirror.apply_remote(table, changed, deleted_ids, marks)
+            self.mirror.set_online(True)
+        except Exception as error:
+            if is_offline_error(error):
+                self.mirror.set_online(False)
+            else:
+                # Keep the thread alive; the next tick tries again
+                traceback.print_exc()
+
+    def stop(self, timeout=MIRROR_CLOSE_TIMEOUT):
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+        self.mirror.close()
@@ -0,0 +1,168 @@
+from math import ceil
+from supabase_client import supabase
+
+class KeysetPager:
+    """
+    Keyset (seek) pagination over a Supabase table.
+    Fetches only the rows of the current page, ordered by a key column with the
+    id as tie-breaker, and keeps the cursor of every visited page so the user
+    can go back without using OFFSET.
+    """
+    def __init__(self, table, columns="*", order_by="id", page_size=50):
+        self.table = table
+        self.columns = columns
+        self.order_by = order_by
+        self.page_size = page_size
+        self.filters = {}
+        self.upper_bounds = {}
+        self.search = None
+        self.total = 0
+        self.has_next = False
+        self.reset()
+
+    def reset(self):
+        """Go back to the first page"""
+        self.page = 0
+        self.cursors = [None]
+
+    def start_after(self, key, last_id):
+        """Make the first page start after the row with this order key and id, e.g. to resume an iteration"""
+        self.page = 0
+        self.cursors = [(key, last_id)]
+
+    def set_filter(self, column, value):
+        """Filter the rows by column equality, or remove the filter when value is None"""
+        if value is None:
+            self.filters.pop(column, None)
+        else:
+            self.filters[column] = value
+        self.reset()
+
+    def set_upper_bound(self, column, value):
+        """Keep only the rows whose column is at most value, or remove the bound when value is None"""
+        if value is None:
+            self.upper_bounds.pop(column, None)
+        else:
+            self.upper_bounds[column] = value
+        self.reset()
+
+    def set_search(self, column, text):
+        """Filter the rows by a case-insensitive substring, or remove the filter when text is empty"""
+        self.search = (column, text) if text else None
+        self.reset()
+
+    def fetch(self):
+        """
+        Fetch the rows of the current page and the total row count in one request.
+        Safe to call on a worker thread: the pager state only changes in apply.
+        """
+        page = self.page
+        query = self.filtered_query(self.columns)
+        cursor = self.cursors[page]
+        if cursor is not None:
+            key, last_id = cursor
+            if self.order_by == "id":
+                query = query.gt("id", last_id)
+            else:
+                query = query.or_(f"{self.order_by}.gt.{key},and({self.order_by}.eq.{key},id.gt.{last_id})")
+
+        query = query.order(self.order_by)
+        if self.order_by != "id":
+            query = query.order("id")
+
+        # One extra row tells whether a next page exists
+        response = query.limit(self.page_size + 1).execute()
+        return page, response.data, response.count or 0
+
+    def filtered_query(self, columns):
+        """Select of the rows under the filters, upper bounds and search, with their exact count"""
+        query = supabase.table(self.table).select(columns, count="exact")
+        for column, value in self.filters.items():
+            query = query.eq(column, value)
+        for column, value in self.upper_bounds.items():
+            query = query.lte(column, value)
+        if self.search:
+            column, text = self.search
+            query = query.ilike(column, f"%{text}%")
+        return query
+
+    def filter_state(self):
+        return dict(self.filters), dict(self.upper_bounds), self.search
+
+    def fetch_total(self):
+        """
+        Count every row under the filters and search, e.g. after changed rows
+        moved to other pages. Safe to call on a worker thread, like fetch.
+        """
+        state = self.filter_state()
+        return state, self.filtered_query("id").limit(1).execute().count or 0
+
+    def apply_total(self, result):
+        """Record a count returned by fetch_total, unless the filters changed since"""
+        state, count = result
+        if state == self.filter_state():
+            self.total = count
+
+    def apply(self, result):
+        """Record a page returned by fetch and return its rows"""
+        page, data, count = result
+        rows = data[:self.page_size]
+        self.has_next = len(data) > self.page_size
+        # The count covers the rows after the cursor, so add the rows of the pages before it
+        self.total = page * self.page_size + count
+
+        del self.cursors[page + 1:]
+        if self.has_next:
+            last = rows[-1]
+            self.cursors.append((last[self.order_by], last['id']))
+        return rows
+
+    def contains(self, row):
+        """Whether a row belongs on the current page under the filters, search and ordering"""
+        if any(row.get(column) != value for column, value in self.filters.items()):
+            return False
+        if any(row.get(column) is None or row[column] > value for column, value in self.upper_bounds.items()):
+            return False
+        if self.search:
+            column, text = self.search
+            if text.lower() not in str(row.get(column) or "").lower():
+                return False
+        if row.get(self.order_by) is None:
+            return False
+        key = (row[self.order_by], row['id'])
+        lower = self.cursors[self.page]
+        if lower is not None and key <= tuple(lower):
+            return False
+        if self.has_next and key > tuple(self.cursors[self.page + 1]):
+            return False
+        return True
+
+    def is_complete(self):
+        """Whether the loaded page holds every row of the table"""
+        return self.page == 0 and not self.has_next and not self.filters and not self.upper_bounds and not self.search
+
+    def iter_rows(self):
+        """Iterate over every row matching the filters, one page request at a time"""
+        self.reset()
+        while True:
+            yield from self.apply(self.fetch())
+            if not self.next_page():
+                return
+
+    def next_page(self):
+        """Move to the next page, returning False if there is none"""
+        if not self.has_next:
+            return False
+        self.page += 1
+        return True
+
+    def previous_page(self):
+        """Move to the previous page, returning False if already on the first one"""
+        if self.page == 0:
+            return False
+        self.page -= 1
+        return True
+
+    def page_count(self):
+        """Total number of pages for the current filters"""
+        return max(1, ceil(self.total / self.page_size))
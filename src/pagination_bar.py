@@ -0,0 +1,24 @@
+import tkinter as tk
+from layout_config import *
+
+class PaginationBar:
+    """
+    Previous/next controls and a page counter for a KeysetPager.
+    """
+    def __init__(self, parent, on_previous, on_next, bg=FRAME_BG_COLOR):
+        self.frame = tk.Frame(parent, bg=bg)
+
+        self.button_previous = tk.Button(self.frame, text="< Anterior", command=on_previous, font=FONT, bg=PAGINATION_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_previous.grid(row=0, column=0, padx=PADX)
+
+        self.label_page = tk.Label(self.frame, text="", font=FONT, bg=bg)
+        self.label_page.grid(row=0, column=1, padx=PADX)
+
+        self.button_next = tk.Button(self.frame, text="Próxima >", command=on_next, font=FONT, bg=PAGINATION_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_next.grid(row=0, column=2, padx=PADX)
+
+    def update(self, pager):
+        """Refresh the page counter and button states from the pager"""
+        self.label_page.config(text=f"Página {pager.page + 1} de {pager.page_count()} ({pager.total} registros)")
+        self.button_previous.config(state="normal" if pager.page > 0 else "disabled")
+        self.button_next.config(state="normal" if pager.has_next else "disabled")
@@ -0,0 +1,155 @@
+"""
+Streaming export of payments and the aging report to CSV or XLSX.
+Payments are paged from the database in chunks and flow through a pipeline of
+generators: each chunk is joined with its clients through the shared client
+index, its fees and total due are computed at once, and the rows are written
+as they come. Only one chunk is held in memory, however many payments match.
+"""
+import csv
+import os
+from datetime import datetime
+from decimal import Decimal
+from settings import *
+from fee_engine import AGING_BUCKETS, compute_charges, aging_report, cents_to_decimal
+from repositories import PaymentRepository
+
+EXPORT_HEADER = ("ID", "Cliente", "Telefone", "Valor", "Data de Vencimento", "Pagamento", "Dias de atraso", "Multa", "Juros", "Total devido")
+AGING_HEADER = ("Atraso", "Parcelas", "Valor", "Total devido")
+
+def payment_chunks(client_id=None, only_open=False, due_until=None, chunk_size=EXPORT_CHUNK_SIZE, repository=None, after=None):
+    """
+    Yield the payments matching the filters in lists of up to chunk_size, one
+    request per list, in (due_date, id) order; after is the (due_date, id) to start after.
+    """
+    pager = (repository or PaymentRepository()).pager(order_by=PAYMENTS_ORDER_BY, page_size=chunk_size)
+    if client_id is not None:
+        pager.set_filter("client_id", client_id)
+    if only_open:
+        pager.set_filter("is_paid", False)
+    if due_until is not None:
+        pager.set_upper_bound("due_date", due_until.isoformat())
+    if after is not None:
+        pager.start_after(*after)
+    while True:
+        payments = pager.apply(pager.fetch())
+        if payments:
+            yield payments
+        if not pager.next_page():
+            return
+
+def parse_due_date(text):
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+class AgingTotals:
+    """
+    Aging report of open payments, accumulated chunk by chunk.
+    """
+    def __init__(self):
+        self.buckets = {name: {'bucket': name, 'count': 0, 'amount': Decimal(0), 'total': Decimal(0)} for name in AGING_BUCKETS}
+
+    def add(self, charges, paid):
+        for bucket in aging_report(charges, paid):
+            totals = self.buckets[bucket['bucket']]
+            totals['count'] += bucket['count']
+            totals['amount'] += bucket['amount']
+            totals['total'] += bucket['total']
+
+    def rows(self):
+        return [(name, bucket['count'], bucket['amount'], bucket['total']) for name, bucket in self.buckets.items()]
+
+def export_rows(chunks, client_index, reference_date=None, aging=None):
+    """Yield one typed row per payment of the chunks, in EXPORT_HEADER order, adding each chunk to aging"""
+    for payments in chunks:
+        paid = [payment['is_paid'] for payment in payments]
+        charges = compute_charges(
+            [payment['amount'] for payment in payments],
+            [payment['due_date'] for payment in payments],
+            reference_date,
+            paid=paid,
+        )
+        if aging is not None:
+            aging.add(charges, paid)
+        for index, payment in enumerate(payments):
+            client = client_index.get(payment['client_id'])
+            if not charges.valid[index]:
+                # Missing or non-finite amount: export the row with empty money columns
+                yield (payment['id'], client['name'], client['phone'], None, parse_due_date(payment['due_date']),
+                       "Quitado" if payment['is_paid'] else "Pendente", None, None, None, None)
+                continue
+            yield (
+                payment['id'],
+                client['name'],
+                client['phone'],
+                cents_to_decimal(charges.amount[index]),
+                parse_due_date(payment['due_date']),
+                "Quitado" if payment['is_paid'] else "Pendente",
+                int(charges.days_late[index]),
+                cents_to_decimal(charges.late_fee[index]),
+                cents_to_decimal(charges.interest[index]),
+                cents_to_decimal(charges.total[index]),
+            )
+
+def csv_value(value):
+    """Format a value the way pt-BR spreadsheets read it: 1234,56 and dd/mm/yyyy"""
+    if isinstance(value, Decimal):
+        return f"{value:.2f}".replace('.', ',')
+    if value is None:
+        return ""
+    if hasattr(value, "strftime"):
+        return value.strftime("%d/%m/%Y")
+    return value
+
+def write_csv(path, header, rows):
+    """Write rows to a semicolon-separated CSV file as they are produced"""
+    with open(path, "w", encoding="utf-8-sig", newline="") as csv_file:
+        writer = csv.writer(csv_file, delimiter=";")
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow([csv_value(value) for value in row])
+
+def write_xlsx(path, rows, aging):
+    """Write the payments and then the aging report to an XLSX workbook in write-only (streaming) mode"""
+    # Only needed for XLSX exports
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    payments_sheet = workbook.create_sheet("Pagamentos")
+    payments_sheet.append(EXPORT_HEADER)
+    for row in rows:
+        payments_sheet.append(row)
+    aging_sheet = workbook.create_sheet("Atrasos")
+    aging_sheet.append(AGING_HEADER)
+    for row in aging.rows():
+        aging_sheet.append(row)
+    workbook.save(path)
+
+def export_payments(path, client_index, client_id=None, only_open=False, due_until=None, on_progress=None):
+    """
+    Export the payments matching the filters with the aging report of the open
+    ones. XLSX files get both on separate sheets; for CSV the aging report goes
+    to a second file with the AGING_EXPORT_SUFFIX. on_progress(count) is called
+    after each chunk. Returns the number of payments exported.
+    """
+    exported = 0
+
+    def counted(chunks):
+        nonlocal exported
+        for payments in chunks:
+            yield payments
+            exported += len(payments)
+            if on_progress:
+                on_progress(exported)
+
+    client_index.ensure_loaded()
+    aging = AgingTotals()
+    rows = export_rows(counted(payment_chunks(client_id, only_open, due_until)), client_index, aging=aging)
+    if path.lower().endswith(".xlsx"):
+        write_xlsx(path, rows, aging)
+    else:
+        write_csv(path, EXPORT_HEADER, rows)
+        root, extension = os.path.splitext(path)
+        write_csv(f"{root}{AGING_EXPORT_SUFFIX}{extension or '.csv'}", AGING_HEADER, aging.rows())
+    return exported
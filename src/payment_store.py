@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+class PaymentStore:
+    """
+    Loaded payments keyed by id, with secondary indexes by client, paid status
+    and due-date month ("YYYY-MM") so views can be filtered without a query.
+    The indexes are kept up to date as rows are added, changed or removed.
+    """
+    def __init__(self):
+        self.rows = {}
+        self.by_client = defaultdict(set)
+        self.by_paid = {True: set(), False: set()}
+        self.by_month = defaultdict(set)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows.values())
+
+    def __contains__(self, payment_id):
+        return payment_id in self.rows
+
+    def get(self, payment_id):
+        """Return a payment by id, or None"""
+        return self.rows.get(payment_id)
+
+    def load(self, payments):
+        """Replace the whole set of payments"""
+        self.rows = {}
+        self.by_client = defaultdict(set)
+        self.by_paid = {True: set(), False: set()}
+        self.by_month = defaultdict(set)
+        for payment in payments:
+            self.upsert(payment)
+
+    def upsert(self, payment):
+        """Add a payment or replace the stored one with the same id"""
+        payment_id = payment['id']
+        if payment_id in self.rows:
+            self.unindex(self.rows[payment_id])
+        self.rows[payment_id] = payment
+        self.by_client[payment['client_id']].add(payment_id)
+        self.by_paid[bool(payment['is_paid'])].add(payment_id)
+        self.by_month[self.month(payment)].add(payment_id)
+
+    def remove(self, payment_id):
+        """Remove a payment if it is stored"""
+        payment = self.rows.pop(payment_id, None)
+        if payment is not None:
+            self.unindex(payment)
+
+    def unindex(self, payment):
+        """Drop a payment from the secondary indexes"""
+        payment_id = payment['id']
+        self.discard(self.by_client, payment['client_id'], payment_id)
+        self.by_paid[bool(payment['is_paid'])].discard(payment_id)
+        self.discard(self.by_month, self.month(payment), payment_id)
+
+    @staticmethod
+    def discard(index, key, payment_id):
+        """Remove an id from an index bucket, dropping the bucket when it empties"""
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.discard(payment_id)
+            if not bucket:
+                del index[key]
+
+    @staticmethod
+    def month(payment):
+        """Due-date month key of a payment"""
+        return (payment.get('due_date') or "")[:7]
+
+    def ids(self, client_id=None, is_paid=None, months=None):
+        """Ids matching every given filter, by intersecting the indexes"""
+        matches = []
+        if client_id is not None:
+            matches.append(self.by_client.get(client_id, set()))
+        if is_paid is not None:
+            matches.append(self.by_paid[bool(is_paid)])
+        if months is not None:
+            matches.append(set().union(*(self.by_month.get(month, set()) for month in months)))
+        if not matches:
+            return set(self.rows)
+        matches.sort(key=len)
+        return matches[0].intersection(*matches[1:])
+
+    def query(self, client_id=None, is_paid=None, months=None):
+        """Payments matching every given filter, in load order"""
+        if client_id is None and is_paid is None and months is None:
+            return list(self.rows.values())
+        ids = self.ids(client_id, is_paid, months)
+        return [payment for payment_id, payment in self.rows.items() if payment_id in ids]
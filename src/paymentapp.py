@@ -1,14 +1,22 @@
 import tkinter as tk
-from os import getlogin
-from platform import system, version, processor
-from socket import gethostname
+from functools import cached_property
 from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
-from send_reminder import send_payment_reminder
+from decimal import Decimal
 from supabase_client import supabase
 from layout_config import *
-from clientcrud import ClientCRUD
-from paymentcrud import PaymentCRUD
+from settings import *
+from metrics import metrics, timed_action
+from audit_log import AuditLogWriter
+from background import BackgroundRunner
+from client_index import ClientIndex
+from mirror_sync import MirrorSync
+from fee_engine import compute_charges, aging_report, cents_to_decimal, format_cents, format_brl
+from virtual_table import VirtualTable
+from client_search import Debouncer
+from repositories import PaymentRepository
+from payment_store import PaymentStore
+from pagination_bar import PaginationBar
 
 class PaymentApp:
     """
@@ -22,14 +30,22 @@ class PaymentApp:
         self.root.resizable(*MAIN_WINDOW_RESIZABLE)
         self.root.configure(bg=WINDOW_BG_COLOR)
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
-        self.current_page = 0
+        self.runner = BackgroundRunner(self.root)
+        self.audit_log = AuditLogWriter()
+        self.client_index = ClientIndex()
+        self.repository = PaymentRepository()
+        self.pager = self.repository.pager(order_by=PAYMENTS_ORDER_BY, page_size=PAYMENTS_PAGE_SIZE)
+        self.payments = PaymentStore()
+        self.payment_sync = self.repository.delta_sync()
+        self.client_filter = None
 
         self.filter_frame = tk.Frame(self.root, bg=FRAME_BG_COLOR)
         self.filter_frame.pack(pady=PADY)
 
-        self.client_names = self.load_client_names()
+        self.client_names = []
         self.combobox_client_filter = ttk.Combobox(self.filter_frame, values=self.client_names, width=28, font=FONT)
         self.combobox_client_filter.grid(row=0, column=1, padx=PADX, pady=PADY)
+        self.client_search = Debouncer(self.combobox_client_filter, self.search_clients)
         self.combobox_client_filter.bind("<KeyRelease>", self.filter_items)
 
         self.button_send_reminder = tk.Button(self.filter_frame, text="Enviar Cobrança", command=self.send_reminder, font=FONT, bg=SEND_REMINDER_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
@@ -46,16 +62,20 @@ class PaymentApp:
         self.checkbox_reminder_within_32_days = tk.Checkbutton(self.filter_frame, text="Cobranças até 1 mês", variable=self.reminder_within_32_days_var, bg=FRAME_BG_COLOR, font=FONT)
         self.checkbox_reminder_within_32_days.grid(row=0, column=4, padx=PADX, pady=PADY)
 
+        self.button_export = tk.Button(self.filter_frame, text="Exportar", command=self.export_payments, font=FONT, bg=EXPORT_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_export.grid(row=0, column=5, padx=PADX, pady=PADY)
+
         self.table_frame = tk.Frame(self.root, bg=FRAME_BG_COLOR)
         self.table_frame.pack(fill='both', expand=True, padx=PADX, pady=FRAME_PADY)
 
-        self.table = ttk.Treeview(self.table_frame, columns=("ID", "Cliente", "Telefone", "Valor", "Data de Vencimento", "Pagamento"), show="headings", style="mystyle.Treeview")
-        self.table.heading("ID", text="ID", command=lambda: self.sort_table(self.table, "ID"))
-        self.table.heading("Cliente", text="Cliente", command=lambda: self.sort_table(self.table, "Cliente"))
-        self.table.heading("Telefone", text="Telefone", command=lambda: self.sort_table(self.table, "Telefone"))
-        self.table.heading("Valor", text="Valor", command=lambda: self.sort_table(self.table, "Valor"))
-        self.table.heading("Data de Vencimento", text="Data de Vencimento", command=lambda: self.sort_table(self.table, "Data de Vencimento"))
-        self.table.heading("Pagamento", text="Pagamento", command=lambda: self.sort_table(self.table, "Pagamento"))
+        self.table = VirtualTable(self.table_frame, columns=("ID", "Cliente", "Telefone", "Valor", "Total devido", "Data de Vencimento", "Pagamento"), show="headings", style="mystyle.Treeview")
+        self.table.heading("ID", text="ID", command=lambda: self.table.sort_by("ID"))
+        self.table.heading("Cliente", text="Cliente", command=lambda: self.table.sort_by("Cliente"))
+        self.table.heading("Telefone", text="Telefone", command=lambda: self.table.sort_by("Telefone"))
+        self.table.heading("Valor", text="Valor", command=lambda: self.table.sort_by("Valor"))
+        self.table.heading("Total devido", text="Total devido", command=lambda: self.table.sort_by("Total devido"))
+        self.table.heading("Data de Vencimento", text="Data de Vencimento", command=lambda: self.table.sort_by("Data de Vencimento"))
+        self.table.heading("Pagamento", text="Pagamento", command=lambda: self.table.sort_by("Pagamento"))
         self.table.grid(row=0, column=0, sticky='nsew')
 
         self.scrollbar = ttk.Scrollbar(self.table_frame, orient="vertical", command=self.table.yview)
@@ -65,6 +85,9 @@ class PaymentApp:
         self.table_frame.grid_rowconfigure(0, weight=1)
         self.table_frame.grid_columnconfigure(0, weight=1)
 
+        self.pagination_bar = PaginationBar(self.root, self.previous_page, self.next_page)
+        self.pagination_bar.frame.pack()
+
         self.bottom_frame = tk.Frame(self.root, bg=FRAME_BG_COLOR)
         self.bottom_frame.pack(pady=BOTTOM_FRAME_PADY)
 
@@ -77,10 +100,48 @@ class PaymentApp:
         self.button_refresh = tk.Button(self.bottom_frame, text="Atualizar Lista", command=self.refresh_data, font=FONT, bg=REFRESH_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
         self.button_refresh.grid(row=0, column=2, padx=PADX, pady=PADY)
 
-        self.load_data()
-        self.sort_order = {}
-        self.user = f"""{getlogin()}@{gethostname()} - {system()} : {version()} - {processor()}"""
+        self.button_aging_report = tk.Button(self.bottom_frame, text="Relatório de Atrasos", command=self.show_aging_report, font=FONT, bg=REPORT_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_aging_report.grid(row=0, column=3, padx=PADX, pady=PADY)
+
+        self.label_loading = tk.Label(self.bottom_frame, text="", font=FONT, bg=FRAME_BG_COLOR, width=14)
+        self.label_loading.grid(row=0, column=4, padx=PADX, pady=PADY)
+        self.runner.add_busy_listener(self.show_loading)
+
+        self.label_reminder_progress = tk.Label(self.bottom_frame, text="", font=FONT, bg=FRAME_BG_COLOR)
+        self.label_reminder_progress.grid(row=0, column=5, padx=PADX, pady=PADY)
+
+        self.button_diagnostics = tk.Button(self.bottom_frame, text="Diagnóstico", command=self.open_diagnostics, font=FONT, bg=DIAGNOSTICS_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_diagnostics.grid(row=0, column=6, padx=PADX, pady=PADY)
+
+        self.label_mirror_status = tk.Label(self.bottom_frame, text="", font=FONT, bg=FRAME_BG_COLOR)
+        self.label_mirror_status.grid(row=0, column=7, padx=PADX, pady=PADY)
+
+        self.mirror_sync = MirrorSync(supabase)
         self.root.bind('<Control-a>', self.select_all)
+        # Let Tk draw the window before any data is requested
+        self.root.after_idle(self.start)
+
+    @timed_action
+    def start(self):
+        """Load clients and the first page of payments concurrently and start syncing the local mirror"""
+        self.runner.submit((self, "clients"), self.client_index.ensure_loaded, lambda result: self.update_client_combobox())
+        self.load_data()
+        supabase.add_listener(lambda kind: self.runner.call_soon(self.on_mirror_event, kind))
+        self.mirror_sync.start()
+        self.root.after(METRICS_EXPORT_INTERVAL_MS, self.export_metrics)
+
+    def export_metrics(self):
+        """Write the metrics files periodically"""
+        metrics.export()
+        self.root.after(METRICS_EXPORT_INTERVAL_MS, self.export_metrics)
+
+    @cached_property
+    def user(self):
+        """User and machine recorded in the backlog, probed on first use"""
+        from os import getlogin
+        from platform import system, version, processor
+        from socket import gethostname
+        return f"""{getlogin()}@{gethostname()} - {system()} : {version()} - {processor()}"""
 
     def on_closing(self):
         """Handle the closing of the main window"""
@@ -88,52 +149,179 @@ class PaymentApp:
             for window in self.root.winfo_children():
                 if isinstance(window, tk.Toplevel):
                     window.destroy()
+            self.runner.shutdown()
+            self.audit_log.close()
+            self.mirror_sync.stop()
+            metrics.close()
             self.root.destroy()
 
-    def sort_table(self, table, column):
-        """Sort the table based on the clicked column"""
-        rows = list(table.get_children())
-        if column not in self.sort_order:
-            self.sort_order[column] = False  # Default to ascending order
-
-        if column == "Valor":
-            rows.sort(key=lambda row: float(table.item(row)["values"][table["columns"].index(column)].replace(',', '')), reverse=self.sort_order[column])
+    def show_loading(self, busy):
+        """Show or hide the loading indicator"""
+        self.label_loading.config(text="Carregando..." if busy else "")
+        self.root.config(cursor="watch" if busy else "")
+
+    @timed_action
+    def on_mirror_event(self, kind):
+        """React to the local mirror: reload once it is ready, patch pulled changes, report conflicts"""
+        if kind == "ready":
+            # Switch from Supabase to the mirror: its timestamps and tombstones are its own
+            self.payment_sync.reset()
+            self.load_data(update_clients=True, reset_clients=True)
+        elif kind == "changed":
+            self.client_index.invalidate()
+            self.sync_data()
+        elif kind == "conflict":
+            conflicts = supabase.take_conflicts()
+            if conflicts:
+                details = "\n".join(f"{conflict['table']} {conflict['row_id']}: {conflict['reason']}" for conflict in conflicts)
+                messagebox.showwarning("Conflito", f"Alterações feitas offline foram descartadas:\n{details}")
+        self.show_mirror_status()
+
+    def show_mirror_status(self):
+        """Show whether the app is offline and how many changes wait to be sent"""
+        pending = supabase.pending_count()
+        if not supabase.online:
+            text = f"Offline - {pending} alteração(ões) pendente(s)" if pending else "Offline"
         else:
-            rows.sort(key=lambda row: table.item(row)["values"][table["columns"].index(column)], reverse=self.sort_order[column])
-        
-        for index, row in enumerate(rows):
-            table.move(row, '', index)
-        
-        self.sort_order[column] = not self.sort_order[column]  # Toggle sort order for next click
-
-    def load_data(self):
-        """Load payments into the table"""
-        for row in self.table.get_children():
-            self.table.delete(row)
-
-        payments = supabase.table("payments").select("*").execute()
-
-        self.all_payments = payments.data
-        self.display_page(self.current_page)
-
-    def display_page(self, page):
-        """Display a specific page of payments in the table"""
-        for payment in self.all_payments:
-            client = supabase.table("clients").select("name, phone").eq("id", payment['client_id']).execute().data[0]
+            text = f"Enviando {pending} alteração(ões)..." if pending else ""
+        self.label_mirror_status.config(text=text)
+
+    def load_data(self, update_clients=False, reset_clients=False):
+        """Load the current page of payments into the table in the background"""
+        def fetch():
+            if reset_clients:
+                self.client_index.reset()
+            # Read the sync marks before the page so no later change is missed
+            marks = None if self.payment_sync.is_ready() else self.payment_sync.fetch_marks()
+            page = self.pager.fetch()
+            # Waits for a client load already running on another worker
+            self.client_index.ensure_loaded()
+            return marks, page
+
+        def show(result):
+            marks, page = result
+            if marks is not None:
+                self.payment_sync.set_marks(marks)
+            self.payments.load(self.pager.apply(page))
+            self.display_page()
+            self.pagination_bar.update(self.pager)
+            if update_clients:
+                self.update_client_combobox()
+
+        # A newer load supersedes one still in flight
+        self.runner.submit((self, "payments"), fetch, show)
+
+    def sync_data(self, redisplay=False):
+        """Fetch only the payments and clients changed since the last sync and patch the table in place"""
+        if not self.payment_sync.is_ready():
+            self.load_data(update_clients=True)
+            return
+
+        def fetch():
+            clients = self.client_index.by_id
+            self.client_index.ensure_loaded()
+            return self.client_index.changed_ids(clients), self.payment_sync.fetch_changes()
+
+        def show(result):
+            client_ids, changes = result
+            changed, deleted_ids = self.payment_sync.apply(changes)
+            self.patch_payments(changed, deleted_ids, client_ids)
+            if redisplay:
+                self.display_page()
+            self.update_client_combobox()
+
+        # Shares the key of load_data: a page load already brings every change
+        self.runner.submit((self, "payments"), fetch, show)
+
+    def patch_payments(self, changed, deleted_ids, client_ids=()):
+        """Apply changed and deleted payments to the store and the table without reloading the page"""
+        removed = set(deleted_ids)
+        for payment in changed:
+            if self.pager.contains(payment):
+                self.payments.upsert(payment)
+            else:
+                # The change moved it off the current page or out of the filters
+                removed.add(payment['id'])
+        for payment_id in removed:
+            self.payments.remove(payment_id)
+        if changed or removed:
+            self.refresh_total()
+
+        touched = {payment['id'] for payment in changed}
+        touched.update(*(self.payments.by_client.get(client_id, ()) for client_id in client_ids))
+        shown = [payment for payment in self.visible_payments() if payment['id'] in touched]
+        hidden = (removed | touched) - {payment['id'] for payment in shown}
+        hidden &= self.table.positions.keys()
+        if hidden:
+            self.table.delete(*hidden)
+        if shown:
+            self.table.upsert_rows(*self.build_rows(shown))
+
+    def refresh_total(self):
+        """Count the payments under the filters again: a row that left the page may have moved, not been deleted"""
+        def show(result):
+            self.pager.apply_total(result)
+            self.pagination_bar.update(self.pager)
+
+        self.runner.submit((self, "total"), self.pager.fetch_total, show)
+
+    def display_page(self):
+        """Display the loaded payments that pass the client and paid filters"""
+        self.table.set_rows(*self.build_rows(self.visible_payments()))
+
+    def build_rows(self, payments):
+        """Table rows of payments and their typed sort values, with the total due computed for the whole batch"""
+        charges = compute_charges(
+            [payment['amount'] for payment in payments],
+            [payment['due_date'] for payment in payments],
+            paid=[payment['is_paid'] for payment in payments],
+        )
+        rows, sort_values = [], []
+        for payment, total_due, valid in zip(payments, charges.total, charges.valid):
+            client = self.client_index.lookup(payment['client_id'])
             is_paid = "Quitado" if payment['is_paid'] else "Pendente"
             try:
-                due_date = datetime.strptime(payment['due_date'], "%Y-%m-%d").strftime("%d/%m/%Y")
+                due = datetime.strptime(payment['due_date'], "%Y-%m-%d").date()
+                due_date = due.strftime("%d/%m/%Y")
             except ValueError:
-                due_date = "Data inválida"
-            amount = f"{float(payment['amount']):.2f}".replace('.', ',')
-
-            if self.show_paid_var.get() or not payment['is_paid']:
-                self.table.insert("", "end", values=(payment['id'], client['name'], client['phone'], amount, due_date, is_paid))
-
+                due, due_date = None, "Data inválida"
+            if valid:
+                amount, total = Decimal(str(payment['amount'])), cents_to_decimal(total_due)
+                amount_text, total_text = f"{amount:.2f}".replace('.', ','), format_cents(total_due)
+            else:
+                amount = total = None
+                amount_text, total_text = "Valor inválido", ""
+            rows.append((payment['id'], client['name'], client['phone'], amount_text, total_text, due_date, is_paid))
+            sort_values.append((payment['id'], client['name'].casefold(), client['phone'], amount, total, due, bool(payment['is_paid'])))
+        return rows, sort_values
+
+    def visible_payments(self):
+        """Loaded payments that pass the client and paid filters, using the store indexes"""
+        return self.payments.query(client_id=self.client_filter, is_paid=None if self.show_paid_var.get() else False)
+
+    @timed_action
+    def next_page(self):
+        """Show the next page of payments"""
+        if self.pager.next_page():
+            self.load_data()
+
+    @timed_action
+    def previous_page(self):
+        """Show the previous page of payments"""
+        if self.pager.previous_page():
+            self.load_data()
+
+    @timed_action
     def refresh_data(self):
-        """Refresh table data and client combobox"""
-        self.load_data()
-        self.update_client_combobox()
+        """Refresh table data and client combobox, removing the client filter"""
+        self.mirror_sync.request_sync()
+        self.client_index.invalidate()
+        self.client_filter = None
+        if "client_id" in self.pager.filters:
+            self.pager.set_filter("client_id", None)
+            self.load_data(update_clients=True)
+        else:
+            self.sync_data(redisplay=True)
 
     def update_client_combobox(self):
         """Update client names in the combobox"""
@@ -142,27 +330,77 @@ class PaymentApp:
 
     def open_client_crud(self):
         """Open the client CRUD screen"""
+        from clientcrud import ClientCRUD
         client_crud = ClientCRUD(self.root, self)
         self.root.wait_window(client_crud.top)
-        self.refresh_data()
+        self.client_index.invalidate()
+        self.sync_data()
 
     def open_payment_crud(self):
         """Open the payment CRUD screen"""
+        # Imported on first use along with tkcalendar
+        from paymentcrud import PaymentCRUD
         payment_crud = PaymentCRUD(self.root, self)
         self.root.wait_window(payment_crud.top)
-        self.refresh_data()
+        self.client_index.invalidate()
+        self.sync_data()
+
+    def open_diagnostics(self):
+        """Open the latency diagnostics panel"""
+        from diagnostics import DiagnosticsWindow
+        DiagnosticsWindow(self.root)
+
+    def import_csv(self, kind, parent, on_progress, on_done):
+        """
+        Ask for a CSV file and import its clients or payments in the background.
+        on_progress(text) shows the progress on the Tk thread; on_done(report) runs
+        once the import has finished, after the summary has been shown.
+        """
+        from tkinter import filedialog
+        from csv_import import CsvImporter
+
+        path = filedialog.askopenfilename(parent=parent, title="Importar CSV", filetypes=[("CSV", "*.csv"), ("Todos os arquivos", "*.*")])
+        if not path:
+            return
+
+        def progress(bytes_read, total_bytes, report):
+            # Called from the worker thread after each batch
+            percent = 100 * bytes_read // max(1, total_bytes)
+            self.runner.call_soon(on_progress, f"Importando: {percent}% ({report.inserted} inseridos, {report.rejected} rejeitados)")
+
+        def done(report):
+            on_progress("")
+            self.client_index.invalidate()
+            self.sync_data()
+            self.log_backlog(f"Imported {report.inserted} {kind} from {path}, {report.rejected} rejected")
+            message = f"{report.inserted} registro(s) importado(s) de {report.read} linha(s)."
+            if report.rejected:
+                message += f"\n{report.rejected} linha(s) rejeitada(s), gravadas em {report.reject_path}"
+            if parent.winfo_exists():
+                messagebox.showinfo("Importação", message, parent=parent)
+            on_done(report)
+
+        def failed(error):
+            on_progress("")
+            messagebox.showerror("Erro", f"Falha na importação: {error}", parent=parent if parent.winfo_exists() else None)
+
+        importer = CsvImporter(kind, self.client_index, on_progress=progress)
+        self.runner.submit(None, lambda: importer.run(path), done, failed)
 
     def load_client_names(self):
-        """Load client names from the database"""
-        clients = supabase.table("clients").select("name").execute().data
-        return [client['name'] for client in clients]
+        """Load every client display name in alphabetical order from the shared index"""
+        return self.client_index.search_display_names("")
 
     def filter_items(self, event):
-        """Filter client names in the combobox while typing"""
-        query = self.combobox_client_filter.get().lower()
-        filtered_names = [name for name in self.client_names if query in name.lower()]
-        self.combobox_client_filter['values'] = filtered_names
+        """Filter client names in the combobox once typing pauses"""
+        self.client_search.trigger()
 
+    @timed_action
+    def search_clients(self):
+        """Show the best matches of the typed text in the combobox, ignoring accents and case"""
+        self.combobox_client_filter['values'] = self.client_index.search_display_names(self.combobox_client_filter.get())
+
+    @timed_action
     def filter_by_client(self):
         """Filter payments by client"""
         client_name = self.combobox_client_filter.get()
@@ -170,23 +408,19 @@ class PaymentApp:
             messagebox.showerror("Erro", "Selecione um cliente para filtrar.")
             return
 
-        client_id = supabase.table("clients").select("id").eq("name", client_name).execute().data
-        if not client_id:
+        client_id = self.client_index.id_for_display(client_name)
+        if client_id is None:
             messagebox.showerror("Erro", "Cliente não encontrado.")
             return
+        self.client_filter = client_id
+        if self.pager.is_complete():
+            # Every payment is loaded: filter with the indexes, no query needed
+            self.display_page()
+        else:
+            self.pager.set_filter("client_id", self.client_filter)
+            self.load_data()
 
-        client_id = client_id[0]['id']
-        payments = supabase.table("payments").select("*").eq("client_id", client_id).execute()
-
-        self.all_payments = payments.data
-        self.current_page = 0
-        
-        # Clear the table before displaying filtered payments
-        for row in self.table.get_children():
-            self.table.delete(row)
-        
-        self.display_page(self.current_page)
-
+    @timed_action
     def toggle_paid(self):
         """Toggle the display of paid payments"""
         self.show_paid_var.set(not self.show_paid_var.get())
@@ -194,8 +428,15 @@ class PaymentApp:
             self.button_toggle_paid.config(text="Esconder Pagamentos Quitados")
         else:
             self.button_toggle_paid.config(text="Mostrar Pagamentos Quitados")
-        self.refresh_data()
+        if self.pager.is_complete():
+            # Every payment is loaded: filter with the indexes, no query needed
+            self.display_page()
+        else:
+            # Filter in the query so pages stay full and the total counts only the shown payments
+            self.pager.set_filter("is_paid", None if self.show_paid_var.get() else False)
+            self.load_data()
 
+    @timed_action
     def send_reminder(self):
         """Send reminder to selected clients"""
         selected_items = self.table.selection()
@@ -204,20 +445,51 @@ class PaymentApp:
             messagebox.showerror("Erro", "Selecione pelo menos um pagamento para enviar a cobrança.")
             return
 
+        payment_ids = list(selected_items)
+        within_32_days = self.reminder_within_32_days_var.get()
+
+        def send():
+            payments = self.reminder_candidates(payment_ids, within_32_days)
+            if not payments:
+                return None
+            # The reminder backends are only needed when sending
+            from send_reminder import send_payment_reminder
+            return send_payment_reminder(payments, on_progress=progress)
+
+        def progress(done, total):
+            # Called from the dispatcher threads
+            self.runner.call_soon(self.label_reminder_progress.config, {"text": f"Cobranças enviadas: {done}/{total}"})
+
+        def done(report):
+            self.root.lift()
+            self.label_reminder_progress.config(text="")
+            if report is None:
+                messagebox.showinfo("Informação", "Nenhum pagamento pendente selecionado para cobrança.")
+                return
+            sent = [reminder['payment'] for reminder in report.sent]
+            if sent:
+                self.log_backlog(f"Sent reminder for payments: {[payment['client_name'] for payment in sent]}")
+            if report.failed:
+                messagebox.showwarning("Aviso", f"{len(sent)} cobrança(s) enviada(s), {len(report.failed)} falharam: {report.failed[0][1]}")
+            else:
+                messagebox.showinfo("Sucesso", "Cobranças enviadas com sucesso.")
+
+        self.runner.submit(None, send, done)
+
+    def reminder_candidates(self, payment_ids, within_32_days=False):
+        """Build the reminder of each unpaid payment among payment_ids; runs on a worker thread"""
         payments = []
-        for item in selected_items:
-            payment_id = self.table.item(item, 'values')[0]
-            payment = supabase.table("payments").select("*").eq("id", payment_id).execute().data[0]
+        for payment in self.repository.get_many(payment_ids):
             if payment['is_paid']:
                 continue
 
-            if self.reminder_within_32_days_var.get():
+            if within_32_days:
                 due_date = datetime.strptime(payment['due_date'], "%Y-%m-%d")
                 if due_date > datetime.now() + timedelta(days=32):
                     continue
 
-            client = supabase.table("clients").select("name, phone").eq("id", payment['client_id']).execute().data[0]
-            
+            client = self.client_index.get(payment['client_id'])
+
             payment_details = {
                 'client_name': client['name'],
                 'client_phone': client['phone'],
@@ -225,25 +497,74 @@ class PaymentApp:
                 'due_date': payment['due_date']
             }
             payments.append(payment_details)
-
-        if payments:
-            send_payment_reminder(payments, method='pywhatkit')
-            self.root.lift()
-            messagebox.showinfo("Sucesso", "Cobranças enviadas com sucesso.")
-            self.log_backlog(f"Sent reminder for payments: {[payment['client_name'] for payment in payments]}")
-        else:
+        return payments
+
+    @timed_action
+    def show_aging_report(self):
+        """Show open payments grouped by days late, computed over the whole receivables book"""
+        def compute():
+            pager = self.repository.pager(columns="id, amount, due_date", page_size=REPORT_PAGE_SIZE)
+            pager.set_filter("is_paid", False)
+            amounts, due_dates = [], []
+            for payment in pager.iter_rows():
+                amounts.append(payment['amount'])
+                due_dates.append(payment['due_date'])
+            return aging_report(compute_charges(amounts, due_dates))
+
+        def show(report):
+            lines = [
+                f"{bucket['bucket']}: {bucket['count']} parcela(s), valor {format_brl(bucket['amount'].scaleb(2))}, total devido {format_brl(bucket['total'].scaleb(2))}"
+                for bucket in report
+            ]
             self.root.lift()
-            messagebox.showinfo("Informação", "Nenhum pagamento pendente selecionado para cobrança.")
+            messagebox.showinfo("Relatório de Atrasos", "\n".join(lines))
+
+        self.runner.submit((self, "aging_report"), compute, show)
+
+    @timed_action
+    def export_payments(self):
+        """Export the payments in the current view (client, paid and 32-day filters) with the aging report"""
+        from tkinter import filedialog
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="Exportar Pagamentos", defaultextension=".xlsx",
+            initialfile=f"pagamentos_{datetime.now():%Y-%m}", filetypes=[("Excel", "*.xlsx"), ("CSV", "*.csv")],
+        )
+        if not path:
+            return
+        client_id = self.client_filter
+        only_open = not self.show_paid_var.get()
+        due_until = (datetime.now() + timedelta(days=32)).date() if self.reminder_within_32_days_var.get() else None
+
+        def export():
+            from payment_export import export_payments
+            return export_payments(path, self.client_index, client_id, only_open, due_until, on_progress=progress)
+
+        def progress(count):
+            # Called from the worker thread after each chunk
+            self.runner.call_soon(self.label_reminder_progress.config, {"text": f"Exportando: {count} pagamento(s)"})
+
+        def done(count):
+            self.label_reminder_progress.config(text="")
+            self.log_backlog(f"Exported {count} payments to {path}")
+            messagebox.showinfo("Exportação", f"{count} pagamento(s) exportado(s) para {path}")
+
+        def failed(error):
+            self.label_reminder_progress.config(text="")
+            messagebox.showerror("Erro", f"Falha na exportação: {error}")
+
+        self.runner.submit((self, "export"), export, done, failed)
 
     def log_backlog(self, description):
         """Log a new entry in the backlog table"""
-        data = {
-            "responsible_user": self.user,
-            "description": description
-        }
-        supabase.table("backlog").insert(data).execute()
+        self.log_backlog_many([description])
+
+    def log_backlog_many(self, descriptions):
+        """Queue several entries for the backlog table; they are inserted in batches"""
+        if descriptions:
+            self.audit_log.log(self.user, descriptions)
 
+    @timed_action
     def select_all(self, event):
         """Select all rows in the table"""
-        self.table.selection_set(self.table.get_children())
+        self.table.select_all()
 
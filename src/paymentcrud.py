@@ -3,8 +3,22 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from tkcalendar import DateEntry
 from datetime import datetime
-from supabase_client import supabase
+from decimal import Decimal
 from layout_config import *
+from settings import *
+from metrics import timed_action
+from repositories import PaymentRepository
+from validation import is_amount_input, is_valid_amount
+from installments import plan_installments
+from fee_engine import cents_to_decimal, parse_amount
+from payment_store import PaymentStore
+from virtual_table import VirtualTable
+from client_search import Debouncer
+from pagination_bar import PaginationBar
+
+# Labels of the installment plan options and their values for plan_installments
+INTERVAL_UNIT_LABELS = {"meses": "months", "semanas": "weeks", "dias": "days"}
+REMAINDER_LABELS = {"na última": "last", "na primeira": "first"}
 
 class PaymentCRUD:
     """
@@ -18,9 +32,11 @@ class PaymentCRUD:
         self.top.geometry(PAYMENT_CRUD_WINDOW_SIZE)
         self.top.resizable(*PAYMENT_CRUD_WINDOW_RESIZABLE)
 
-        self.current_page = 0
-
-        self.sort_order = {}
+        self.repository = PaymentRepository()
+        self.pager = self.repository.pager(order_by=PAYMENTS_ORDER_BY, page_size=PAYMENTS_PAGE_SIZE)
+        self.payments = PaymentStore()
+        self.payment_sync = self.repository.delta_sync()
+        self.client_filter = None
 
         self.frame_inputs = tk.Frame(self.top)
         self.frame_inputs.pack(pady=20)
@@ -37,11 +53,36 @@ class PaymentCRUD:
 
         self.label_client = tk.Label(self.frame_inputs, text="Cliente", font=FONT)
         self.label_client.grid(row=2, column=0, padx=10, pady=10)
-        self.client_names = self.load_client_names()
+        self.client_names = []
         self.combobox_client = ttk.Combobox(self.frame_inputs, values=self.client_names, width=28, font=FONT)
         self.combobox_client.grid(row=2, column=1, padx=10, pady=10)
+        self.client_search = Debouncer(self.combobox_client, self.search_clients)
         self.combobox_client.bind("<KeyRelease>", self.filter_items)
 
+        self.frame_installments = tk.Frame(self.frame_inputs)
+        self.frame_installments.grid(row=0, column=2, rowspan=2, padx=10, sticky="w")
+
+        self.label_installments = tk.Label(self.frame_installments, text="Parcelas", font=FONT)
+        self.label_installments.grid(row=0, column=0, padx=5, pady=5)
+        self.spinbox_installments = tk.Spinbox(self.frame_installments, from_=1, to=INSTALLMENTS_MAX, width=4, font=FONT)
+        self.spinbox_installments.grid(row=0, column=1, padx=5, pady=5)
+        self.label_interval = tk.Label(self.frame_installments, text="a cada", font=FONT)
+        self.label_interval.grid(row=0, column=2, padx=5, pady=5)
+        self.spinbox_interval = tk.Spinbox(self.frame_installments, from_=1, to=365, width=4, font=FONT)
+        self.spinbox_interval.grid(row=0, column=3, padx=5, pady=5)
+        self.combobox_interval_unit = ttk.Combobox(self.frame_installments, values=list(INTERVAL_UNIT_LABELS), state="readonly", width=8, font=FONT)
+        self.combobox_interval_unit.set("meses")
+        self.combobox_interval_unit.grid(row=0, column=4, padx=5, pady=5)
+
+        self.per_installment_var = tk.BooleanVar(value=False)
+        self.checkbox_per_installment = tk.Checkbutton(self.frame_installments, text="Valor por parcela", variable=self.per_installment_var, font=FONT)
+        self.checkbox_per_installment.grid(row=1, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+        self.label_remainder = tk.Label(self.frame_installments, text="Centavos", font=FONT)
+        self.label_remainder.grid(row=1, column=2, padx=5, pady=5)
+        self.combobox_remainder = ttk.Combobox(self.frame_installments, values=list(REMAINDER_LABELS), state="readonly", width=11, font=FONT)
+        self.combobox_remainder.set("na última")
+        self.combobox_remainder.grid(row=1, column=3, columnspan=2, padx=5, pady=5, sticky="w")
+
         self.button_filter = tk.Button(self.frame_inputs, text="Filtrar por Cliente", command=self.filter_by_client, font=FONT, bg=FILTER_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
         self.button_filter.grid(row=2, column=2, padx=10, pady=10)
 
@@ -66,18 +107,24 @@ class PaymentCRUD:
         self.button_change_status = tk.Button(self.frame_buttons, text="Alterar Status", command=self.change_status, font=FONT, bg=EDIT_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
         self.button_change_status.grid(row=0, column=5, padx=5)
 
-        self.button_refresh = tk.Button(self.top, text="Atualizar Lista", command=self.load_payments, font=FONT, bg=FILTER_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_import = tk.Button(self.frame_buttons, text="Importar CSV", command=self.import_csv, font=FONT, bg=IMPORT_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
+        self.button_import.grid(row=0, column=6, padx=5)
+
+        self.label_import_progress = tk.Label(self.frame_buttons, text="", font=FONT)
+        self.label_import_progress.grid(row=1, column=0, columnspan=7)
+
+        self.button_refresh = tk.Button(self.top, text="Atualizar Lista", command=self.refresh_payments, font=FONT, bg=FILTER_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
         self.button_refresh.pack(pady=5)
 
         self.payment_table_frame = tk.Frame(self.top)
         self.payment_table_frame.pack(fill='both', expand=True, padx=10, pady=10)
 
-        self.payment_table = ttk.Treeview(self.payment_table_frame, columns=("ID", "Cliente", "Valor", "Data de Vencimento", "Status"), show="headings", selectmode="extended", style="mystyle.Treeview")
-        self.payment_table.heading("ID", text="ID", command=lambda: self.sort_table(self.payment_table, "ID"))
-        self.payment_table.heading("Cliente", text="Cliente", command=lambda: self.sort_table(self.payment_table, "Cliente"))
-        self.payment_table.heading("Valor", text="Valor", command=lambda: self.sort_table(self.payment_table, "Valor"))
-        self.payment_table.heading("Data de Vencimento", text="Data de Vencimento", command=lambda: self.sort_table(self.payment_table, "Data de Vencimento"))
-        self.payment_table.heading("Status", text="Status", command=lambda: self.sort_table(self.payment_table, "Status"))
+        self.payment_table = VirtualTable(self.payment_table_frame, columns=("ID", "Cliente", "Valor", "Data de Vencimento", "Status"), show="headings", selectmode="extended", style="mystyle.Treeview")
+        self.payment_table.heading("ID", text="ID", command=lambda: self.payment_table.sort_by("ID"))
+        self.payment_table.heading("Cliente", text="Cliente", command=lambda: self.payment_table.sort_by("Cliente"))
+        self.payment_table.heading("Valor", text="Valor", command=lambda: self.payment_table.sort_by("Valor"))
+        self.payment_table.heading("Data de Vencimento", text="Data de Vencimento", command=lambda: self.payment_table.sort_by("Data de Vencimento"))
+        self.payment_table.heading("Status", text="Status", command=lambda: self.payment_table.sort_by("Status"))
 
         self.payment_table.column("ID", width=60, anchor="center")
         self.payment_table.column("Cliente", width=200, anchor="w")
@@ -96,84 +143,161 @@ class PaymentCRUD:
 
         self.payment_table.bind('<<TreeviewSelect>>', self.on_select)
 
+        self.pagination_bar = PaginationBar(self.top, self.previous_page, self.next_page, bg=self.top.cget("bg"))
+        self.pagination_bar.frame.pack()
+
         self.show_paid_var = tk.BooleanVar(value=True)
         self.button_toggle_paid = tk.Button(self.top, text="Esconder Pagamentos Quitados", command=self.toggle_paid, font=FONT, bg=TOGGLE_BUTTON_BG_COLOR, fg=BUTTON_FG_COLOR)
         self.button_toggle_paid.pack(pady=5)
 
         self.top.bind('<Control-a>', self.select_all)
 
-        self.load_payments()
+        self.app.runner.add_busy_listener(self.show_loading)
+        self.top.bind("<Destroy>", self.on_destroy)
+
+        self.load_payments(update_clients=True)
 
     def validate_amount(self, new_value):
         """Validate the amount input to accept only numbers and up to two decimal places"""
-        if not new_value:
-            return True
-        try:
-            new_value = new_value.replace(',', '.')
-            float_value = float(new_value)
-            if float_value < 0:
-                return False
-            parts = new_value.split('.')
-            if len(parts) > 2 or (len(parts) == 2 and len(parts[1]) > 2):
-                return False
-            return True
-        except ValueError:
-            return False
+        return is_amount_input(new_value)
 
     def load_client_names(self):
-        """Load client names from the database"""
-        clients = supabase.table("clients").select("name").execute().data
-        return [client['name'] for client in clients]
+        """Load every client display name in alphabetical order from the shared index"""
+        return self.app.client_index.search_display_names("")
 
     def filter_items(self, event):
-        """Filter client names in the combobox while typing"""
-        query = self.combobox_client.get().lower()
-        filtered_names = [name for name in self.client_names if query in name.lower()]
-        self.combobox_client['values'] = filtered_names
-
-    def sort_table(self, table, column):
-        """Sort the table based on the clicked column"""
-        rows = list(table.get_children())
-        if column not in self.sort_order:
-            self.sort_order[column] = False  # Default to ascending order
-
-        if column == "Valor":
-            rows.sort(key=lambda row: float(table.item(row)["values"][table["columns"].index(column)].replace(',', '')), reverse=self.sort_order[column])
+        """Filter client names in the combobox once typing pauses"""
+        self.client_search.trigger()
+
+    @timed_action
+    def search_clients(self):
+        """Show the best matches of the typed text in the combobox, ignoring accents and case"""
+        self.combobox_client['values'] = self.app.client_index.search_display_names(self.combobox_client.get())
+
+    def load_payments(self, update_clients=False):
+        """Load the current page of payments into the table in the background"""
+        def fetch():
+            self.app.client_index.ensure_loaded()
+            # Read the sync marks before the page so no later change is missed
+            marks = None if self.payment_sync.is_ready() else self.payment_sync.fetch_marks()
+            return marks, self.pager.fetch()
+
+        def show(result):
+            marks, page = result
+            if marks is not None:
+                self.payment_sync.set_marks(marks)
+            self.payments.load(self.pager.apply(page))
+            self.display_page()
+            self.pagination_bar.update(self.pager)
+            if update_clients:
+                self.client_names = self.load_client_names()
+                self.combobox_client['values'] = self.client_names
+
+        self.app.runner.submit((self, "payments"), fetch, show, owner=self.top)
+
+    def sync_payments(self, redisplay=False):
+        """Fetch only the payments changed since the last sync and patch the table in place"""
+        if not self.payment_sync.is_ready():
+            self.load_payments()
+            return
+
+        def fetch():
+            clients = self.app.client_index.by_id
+            self.app.client_index.ensure_loaded()
+            return self.app.client_index.changed_ids(clients), self.payment_sync.fetch_changes()
+
+        def show(result):
+            client_ids, changes = result
+            changed, deleted_ids = self.payment_sync.apply(changes)
+            self.patch_payments(changed, deleted_ids, client_ids)
+            if redisplay:
+                self.display_page()
+
+        self.app.runner.submit((self, "payments"), fetch, show, owner=self.top)
+
+    def patch_payments(self, changed, deleted_ids, client_ids=()):
+        """Apply changed and deleted payments to the store and the table without reloading the page"""
+        removed = set(deleted_ids)
+        for payment in changed:
+            if self.pager.contains(payment):
+                self.payments.upsert(payment)
+            else:
+                # The change moved it off the current page or out of the filters
+                removed.add(payment['id'])
+        for payment_id in removed:
+            self.payments.remove(payment_id)
+        if changed or removed:
+            self.refresh_total()
+
+        touched = {payment['id'] for payment in changed}
+        touched.update(*(self.payments.by_client.get(client_id, ()) for client_id in client_ids))
+        shown = [payment for payment in self.visible_payments() if payment['id'] in touched]
+        hidden = (removed | touched) - {payment['id'] for payment in shown}
+        hidden &= self.payment_table.positions.keys()
+        if hidden:
+            self.payment_table.delete(*hidden)
+        if shown:
+            self.payment_table.upsert_rows(*self.build_rows(shown))
+
+    def refresh_total(self):
+        """Count the payments under the filters again: a row that left the page may have moved, not been deleted"""
+        def show(result):
+            self.pager.apply_total(result)
+            self.pagination_bar.update(self.pager)
+
+        self.app.runner.submit((self, "total"), self.pager.fetch_total, show, owner=self.top)
+
+    def visible_payments(self):
+        """Loaded payments that pass the client and paid filters, using the store indexes"""
+        return self.payments.query(client_id=self.client_filter, is_paid=None if self.show_paid_var.get() else False)
+
+    @timed_action
+    def refresh_payments(self):
+        """Refresh the payments, removing the client filter"""
+        self.client_filter = None
+        if "client_id" in self.pager.filters:
+            self.pager.set_filter("client_id", None)
+            self.load_payments()
         else:
-            rows.sort(key=lambda row: table.item(row)["values"][table["columns"].index(column)], reverse=self.sort_order[column])
-        
-        for index, row in enumerate(rows):
-            table.move(row, '', index)
-        
-        self.sort_order[column] = not self.sort_order[column]  # Toggle sort order for next click
-
-    def load_payments(self):
-        """Load payments into the table"""
-        for row in self.payment_table.get_children():
-            self.payment_table.delete(row)
-
-        payments = supabase.table("payments").select("*").execute()
-
-        self.all_payments = payments.data
-        self.display_page(self.current_page)
-
-    def display_page(self, page):
-        """Display a specific page of payments in the table"""
-        for payment in self.all_payments:
-            client = supabase.table("clients").select("name").eq("id", payment['client_id']).execute().data[0]
+            self.sync_payments(redisplay=True)
+
+    @timed_action
+    def next_page(self):
+        """Show the next page of payments"""
+        if self.pager.next_page():
+            self.load_payments()
+
+    @timed_action
+    def previous_page(self):
+        """Show the previous page of payments"""
+        if self.pager.previous_page():
+            self.load_payments()
+
+    def display_page(self):
+        """Display the loaded payments that pass the client and paid filters"""
+        self.payment_table.set_rows(*self.build_rows(self.visible_payments()))
+
+    def build_rows(self, payments):
+        """Table rows of payments and their typed sort values"""
+        rows, sort_values = [], []
+        for payment in payments:
+            client = self.app.client_index.lookup(payment['client_id'])
             status = "Quitado" if payment['is_paid'] else "Pendente"
             try:
-                due_date = datetime.strptime(payment['due_date'], "%Y-%m-%d").strftime("%d/%m/%Y")
+                due = datetime.strptime(payment['due_date'], "%Y-%m-%d").date()
+                due_date = due.strftime("%d/%m/%Y")
             except ValueError:
-                due_date = "Data inválida"
-            amount = f"{float(payment['amount']):.2f}".replace('.', ',')
-
-            if self.show_paid_var.get() or not payment['is_paid']:
-                self.payment_table.insert("", "end", values=(payment['id'], client['name'], amount, due_date, status))
-
+                due, due_date = None, "Data inválida"
+            amount = parse_amount(payment['amount'])
+            amount_text = "Valor inválido" if amount is None else f"{amount:.2f}".replace('.', ',')
+            rows.append((payment['id'], client['name'], amount_text, due_date, status))
+            sort_values.append((payment['id'], client['name'].casefold(), amount, due, bool(payment['is_paid'])))
+        return rows, sort_values
+
+    @timed_action
     def add_payment(self):
-        """Add a payment"""
-        amount = self.entry_amount.get().replace(',', '.')
+        """Add a payment, or an installment plan of several payments in one insert"""
+        amount = self.entry_amount.get()
         due_date = self.entry_due_date.get_date()
         client_name = self.combobox_client.get()
 
@@ -181,26 +305,65 @@ class PaymentCRUD:
             self.top.lift()
             self.show_messagebox("Erro", "Preencha todos os campos.")
             return
+        if not is_valid_amount(amount):
+            self.top.lift()
+            self.show_messagebox("Erro", "Valor inválido.")
+            return
+        amount = amount.replace(',', '.')
 
-        client_id_data = supabase.table("clients").select("id").eq("name", client_name).execute().data
-        if not client_id_data:
+        client_id = self.app.client_index.id_for_display(client_name)
+        if client_id is None:
             self.top.lift()
             self.show_messagebox("Erro", "Cliente não encontrado.")
             return
 
-        client_id = client_id_data[0]['id']
-        due_date_str = due_date.strftime("%Y-%m-%d")
-
-        data = {"amount": float(amount), "due_date": due_date_str, "client_id": client_id, "is_paid": False}
-        supabase.table("payments").insert(data).execute()
-
-        self.entry_amount.delete(0, tk.END)
-        self.entry_due_date.set_date(None)
-        self.combobox_client.set('')
-
-        self.load_payments()
-        self.app.log_backlog(f"Added payment: Amount {amount} for client ID {client_id} ({client_name})")
+        try:
+            count = int(self.spinbox_installments.get())
+            interval = int(self.spinbox_interval.get())
+        except ValueError:
+            count = interval = 0
+        if not 1 <= count <= INSTALLMENTS_MAX or interval < 1:
+            self.top.lift()
+            self.show_messagebox("Erro", f"Informe de 1 a {INSTALLMENTS_MAX} parcelas e um intervalo de pelo menos 1.")
+            return
 
+        plan = plan_installments(
+            int(Decimal(amount) * 100), count, due_date, interval,
+            unit=INTERVAL_UNIT_LABELS[self.combobox_interval_unit.get()],
+            per_installment=self.per_installment_var.get(),
+            remainder=REMAINDER_LABELS[self.combobox_remainder.get()],
+        )
+        if any(cents <= 0 for cents, due in plan) and count > 1:
+            self.top.lift()
+            self.show_messagebox("Erro", "O valor é pequeno demais para o número de parcelas.")
+            return
+        records = [{"amount": float(cents_to_decimal(cents)), "due_date": due.strftime("%Y-%m-%d"), "is_paid": False} for cents, due in plan]
+
+        def insert():
+            return self.repository.insert_many([dict(record, client_id=client_id) for record in records])
+
+        def done(payments):
+            if len(payments) == 1:
+                self.app.log_backlog(f"Added payment: Amount {amount} for client ID {client_id} ({client_name})")
+            else:
+                total = cents_to_decimal(sum(cents for cents, due in plan))
+                self.app.log_backlog(
+                    f"Added installment plan: {len(payments)} payments totalling {total} for client ID {client_id} ({client_name}), "
+                    f"due {records[0]['due_date']} to {records[-1]['due_date']}"
+                )
+            if not self.top.winfo_exists():
+                return
+            self.entry_amount.delete(0, tk.END)
+            self.entry_due_date.set_date(None)
+            self.combobox_client.set('')
+            self.spinbox_installments.delete(0, tk.END)
+            self.spinbox_installments.insert(0, "1")
+            # The insert returned the new rows: show them without fetching anything
+            self.patch_payments(payments, [])
+
+        self.app.runner.submit(None, insert, done)
+
+    @timed_action
     def edit_payment(self):
         """Edit the selected payment amount"""
         selected_items = self.payment_table.selection()
@@ -209,21 +372,23 @@ class PaymentCRUD:
             self.show_messagebox("Erro", "Selecione exatamente um pagamento para editar.")
             return
 
-        payment_id = self.payment_table.item(selected_items[0], 'values')[0]
-        amount = self.entry_amount.get().replace(',', '.')
+        payment_id = selected_items[0]
+        amount = self.entry_amount.get()
 
         if not amount:
             self.top.lift()
             self.show_messagebox("Erro", "Preencha o valor do pagamento.")
             return
+        if not is_valid_amount(amount):
+            self.top.lift()
+            self.show_messagebox("Erro", "Valor inválido.")
+            return
+        amount = amount.replace(',', '.')
 
-        old_amount = self.payment_table.item(selected_items[0], 'values')[2]
-        data = {"amount": float(amount)}
-        supabase.table("payments").update(data).eq("id", payment_id).execute()
-
-        self.load_payments()
-        self.app.log_backlog(f"Edited payment: ID {payment_id}, from {old_amount} to {amount}")
+        old_amount = self.payment_table.item(payment_id, 'values')[2]
+        self.update_payment(payment_id, {"amount": float(amount)}, f"Edited payment: ID {payment_id}, from {old_amount} to {amount}")
 
+    @timed_action
     def edit_client(self):
         """Edit the client of the selected payment"""
         selected_items = self.payment_table.selection()
@@ -232,7 +397,7 @@ class PaymentCRUD:
             self.show_messagebox("Erro", "Selecione exatamente um pagamento para editar.")
             return
 
-        payment_id = self.payment_table.item(selected_items[0], 'values')[0]
+        payment_id = selected_items[0]
         client_name = self.combobox_client.get()
 
         if not client_name:
@@ -240,16 +405,18 @@ class PaymentCRUD:
             self.show_messagebox("Erro", "Preencha o nome do cliente.")
             return
 
-        old_client_id = self.payment_table.item(selected_items[0], 'values')[1]
-        old_client_name = supabase.table("clients").select("name").eq("id", old_client_id).execute().data[0]['name']
-        client_id = supabase.table("clients").select("id").eq("name", client_name).execute().data[0]['id']
-        new_client_name = supabase.table("clients").select("name").eq("id", client_id).execute().data[0]['name']
-        data = {"client_id": client_id}
-        supabase.table("payments").update(data).eq("id", payment_id).execute()
+        client_index = self.app.client_index
+        old_client_id = self.payments.get(payment_id)['client_id']
+        old_client_name = client_index.display_by_id.get(old_client_id) or self.payment_table.item(payment_id, 'values')[1]
 
-        self.load_payments()
-        self.app.log_backlog(f"Edited payment client: ID {payment_id}, from {old_client_name} (ID {old_client_id}) to {new_client_name} (ID {client_id})")
+        client_id = client_index.id_for_display(client_name)
+        if client_id is None:
+            self.top.lift()
+            self.show_messagebox("Erro", "Cliente não encontrado.")
+            return
+        self.update_payment(payment_id, {"client_id": client_id}, f"Edited payment client: ID {payment_id}, from {old_client_name} (ID {old_client_id}) to {client_name} (ID {client_id})")
 
+    @timed_action
     def edit_due_date(self):
         """Edit the due date of the selected payment"""
         selected_items = self.payment_table.selection()
@@ -258,7 +425,7 @@ class PaymentCRUD:
             self.show_messagebox("Erro", "Selecione exatamente um pagamento para editar.")
             return
 
-        payment_id = self.payment_table.item(selected_items[0], 'values')[0]
+        payment_id = selected_items[0]
         due_date = self.entry_due_date.get_date()
 
         if not due_date:
@@ -266,14 +433,43 @@ class PaymentCRUD:
             self.show_messagebox("Erro", "Preencha a data de vencimento.")
             return
 
-        old_due_date = self.payment_table.item(selected_items[0], 'values')[3]
+        old_due_date = self.payment_table.item(payment_id, 'values')[3]
         due_date_str = due_date.strftime("%Y-%m-%d")
-        data = {"due_date": due_date_str}
-        supabase.table("payments").update(data).eq("id", payment_id).execute()
-
-        self.load_payments()
-        self.app.log_backlog(f"Edited payment due date: ID {payment_id}, from {old_due_date} to {due_date_str}")
-
+        self.update_payment(payment_id, {"due_date": due_date_str}, f"Edited payment due date: ID {payment_id}, from {old_due_date} to {due_date_str}")
+
+    def update_payment(self, payment_id, data, description):
+        """
+        Apply an edit to one payment right away and confirm it in the background.
+        If the write fails the previous values are restored and an error is shown.
+        """
+        previous = self.payments.get(payment_id)
+        self.replace_payment(dict(previous, **data))
+
+        def confirm(payment):
+            self.app.log_backlog(description)
+            if payment and self.top.winfo_exists():
+                self.replace_payment(payment)
+
+        def rollback(error):
+            if not self.top.winfo_exists():
+                self.app.runner.show_error(error)
+                return
+            if self.payments.get(payment_id) is not None:
+                self.replace_payment(previous)
+            self.show_messagebox("Erro", f"Falha ao salvar a alteração, que foi desfeita: {error}")
+
+        self.app.runner.submit(None, lambda: self.repository.update(payment_id, data), confirm, rollback)
+
+    def replace_payment(self, payment):
+        """Put a changed payment in the store and update only its table row, keeping order and scroll"""
+        self.payments.upsert(payment)
+        if payment['id'] in self.payments.ids(client_id=self.client_filter, is_paid=None if self.show_paid_var.get() else False):
+            rows, sort_values = self.build_rows([payment])
+            self.payment_table.update_row(rows[0], sort_values[0])
+        elif payment['id'] in self.payment_table.positions:
+            self.payment_table.delete(payment['id'])
+
+    @timed_action
     def delete_payments(self):
         """Delete selected payments"""
         selected_items = self.payment_table.selection()
@@ -286,16 +482,32 @@ class PaymentCRUD:
         if not confirm:
             return
 
-        for selected_item in selected_items:
-            payment_id = self.payment_table.item(selected_item, 'values')[0]
-            client_name = self.payment_table.item(selected_item, 'values')[1]
-            client_id = supabase.table("clients").select("id").eq("name", client_name).execute().data[0]['id']
-            supabase.table("payments").delete().eq("id", payment_id).execute()
-            self.app.log_backlog(f"Deleted payment: ID {payment_id} for client {client_name} (ID {client_id})")
+        payment_ids = list(selected_items)
+        client_names = {payment_id: self.payment_table.item(payment_id, 'values')[1] for payment_id in payment_ids}
+        client_ids = {payment_id: self.payments.get(payment_id)['client_id'] for payment_id in payment_ids}
+
+        def done(deleted_ids):
+            self.app.log_backlog_many([
+                f"Deleted payment: ID {payment_id} for client {client_names[payment_id]} (ID {client_ids[payment_id]})"
+                for payment_id in deleted_ids
+            ])
+            if not self.top.winfo_exists():
+                return
+            self.remove_payments(deleted_ids)
+            self.top.lift()
 
-        self.top.lift()
-        self.load_payments()
+        self.app.runner.submit(None, lambda: self.repository.delete_many(payment_ids), done)
 
+    def remove_payments(self, payment_ids):
+        """Remove deleted payments from the loaded page without reloading it"""
+        removed = [payment_id for payment_id in payment_ids if payment_id in self.payments]
+        for payment_id in removed:
+            self.payments.remove(payment_id)
+        self.payment_table.delete(*removed)
+        self.pager.total -= len(removed)
+        self.pagination_bar.update(self.pager)
+
+    @timed_action
     def change_status(self):
         """Change the status of the selected payment"""
         selected_items = self.payment_table.selection()
@@ -304,16 +516,14 @@ class PaymentCRUD:
             self.show_messagebox("Erro", "Selecione exatamente um pagamento para alterar o status.")
             return
 
-        payment_id = self.payment_table.item(selected_items[0], 'values')[0]
-        current_status = self.payment_table.item(selected_items[0], 'values')[4]
+        payment_id = selected_items[0]
+        current_status = self.payment_table.item(payment_id, 'values')[4]
 
         new_status = "Pendente" if current_status == "Quitado" else "Quitado"
         is_paid = new_status == "Quitado"
+        self.update_payment(payment_id, {"is_paid": is_paid}, f"Changed payment status: ID {payment_id}, from {current_status} to {new_status}")
 
-        supabase.table("payments").update({"is_paid": is_paid}).eq("id", payment_id).execute()
-        self.load_payments()
-        self.app.log_backlog(f"Changed payment status: ID {payment_id}, from {current_status} to {new_status}")
-
+    @timed_action
     def on_select(self, event):
         """Action when selecting a payment"""
         selected_items = self.payment_table.selection()
@@ -329,6 +539,7 @@ class PaymentCRUD:
             self.button_edit_due_date.config(state="disabled")
             self.button_change_status.config(state="disabled")
 
+    @timed_action
     def filter_by_client(self):
         """Filter payments by client"""
         client_name = self.combobox_client.get()
@@ -337,33 +548,20 @@ class PaymentCRUD:
             self.show_messagebox("Erro", "Selecione um cliente para filtrar.")
             return
 
-        client_id = supabase.table("clients").select("id").eq("name", client_name).execute().data
-        if not client_id:
+        client_id = self.app.client_index.id_for_display(client_name)
+        if client_id is None:
             self.top.lift()
             self.show_messagebox("Erro", "Cliente não encontrado.")
             return
+        self.client_filter = client_id
+        if self.pager.is_complete():
+            # Every payment is loaded: filter with the indexes, no query needed
+            self.display_page()
+        else:
+            self.pager.set_filter("client_id", self.client_filter)
+            self.load_payments()
 
-        client_id = client_id[0]['id']
-        payments = supabase.table("payments").select("*").eq("client_id", client_id).execute()
-
-        self.all_payments = payments.data
-        self.display_filtered_payments(self.all_payments)
-
-    def display_filtered_payments(self, filtered_payments):
-        """Display filtered payments in the table"""
-        self.payment_table.delete(*self.payment_table.get_children())
-        for payment in filtered_payments:
-            client = supabase.table("clients").select("name").eq("id", payment['client_id']).execute().data[0]
-            status = "Quitado" if payment['is_paid'] else "Pendente"
-            try:
-                due_date = datetime.strptime(payment['due_date'], "%Y-%m-%d").strftime("%d/%m/%Y")
-            except ValueError:
-                due_date = "Data inválida"
-            amount = f"{float(payment['amount']):.2f}".replace('.', ',')
-
-            if self.show_paid_var.get() or not payment['is_paid']:
-                self.payment_table.insert("", "end", values=(payment['id'], client['name'], amount, due_date, status))
-
+    @timed_action
     def toggle_paid(self):
         """Toggle the display of paid payments"""
         self.show_paid_var.set(not self.show_paid_var.get())
@@ -371,11 +569,42 @@ class PaymentCRUD:
             self.button_toggle_paid.config(text="Esconder Pagamentos Quitados")
         else:
             self.button_toggle_paid.config(text="Mostrar Pagamentos Quitados")
-        self.load_payments()
+        if self.pager.is_complete():
+            # Every payment is loaded: filter with the indexes, no query needed
+            self.display_page()
+        else:
+            # Filter in the query so pages stay full and the total counts only the shown payments
+            self.pager.set_filter("is_paid", None if self.show_paid_var.get() else False)
+            self.load_payments()
 
+    @timed_action
     def select_all(self, event):
         """Select all rows in the table"""
-        self.payment_table.selection_set(self.payment_table.get_children())
+        self.payment_table.select_all()
+
+    @timed_action
+    def import_csv(self):
+        """Import payments from a CSV file"""
+        def done(report):
+            if self.top.winfo_exists():
+                self.top.lift()
+                self.sync_payments()
+
+        self.app.import_csv("payments", self.top, self.show_import_progress, done)
+
+    def show_import_progress(self, text):
+        """Show the progress of a running import"""
+        if self.top.winfo_exists():
+            self.label_import_progress.config(text=text)
+
+    def show_loading(self, busy):
+        """Show the busy cursor while requests are in flight"""
+        self.top.config(cursor="watch" if busy else "")
+
+    def on_destroy(self, event):
+        """Stop following the background requests when the window closes"""
+        if event.widget is self.top:
+            self.app.runner.remove_busy_listener(self.show_loading)
 
     def show_messagebox(self, title, message, icon=messagebox.ERROR):
         """Show a messagebox and keep the CRUD window in front"""
@@ -0,0 +1,153 @@
+"""
+Delivery channels for payment reminders.
+Each backend sends one message at a time and declares how much concurrency and
+what send rate it tolerates; the ReminderDispatcher enforces both.
+"""
+import abc
+import random
+import threading
+import time
+import webbrowser
+from urllib.parse import quote
+from settings import *
+
+class ReminderBackend(abc.ABC):
+    """
+    Interface of a reminder delivery channel.
+    """
+    name = "base"
+    max_concurrency = 1
+    rate_per_minute = None
+
+    def open(self):
+        """Prepare the channel before the first message (login, browser...)"""
+
+    @abc.abstractmethod
+    def send(self, phone, message):
+        """Deliver one message, raising an exception on failure"""
+
+    def close(self):
+        """Release the channel after the last message"""
+
+class PyWhatKitBackend(ReminderBackend):
+    """
+    Sends through WhatsApp Web driven by pywhatkit, which types the message in a new tab.
+    """
+    name = "pywhatkit"
+
+    def __init__(self, login_wait=WHATSAPP_LOGIN_WAIT, wait_time=PYWHATKIT_WAIT_TIME):
+        self.login_wait = login_wait
+        self.wait_time = wait_time
+
+    def open(self):
+        """Open WhatsApp Web and give the user time to log in"""
+        webbrowser.open("https://web.whatsapp.com")
+        time.sleep(self.login_wait)
+
+    def send(self, phone, message):
+        # pywhatkit checks the connection when imported, so only load it when sending
+        import pywhatkit as kit
+        kit.sendwhatmsg_instantly(phone, message, wait_time=self.wait_time, tab_close=True)
+
+class SeleniumBackend(ReminderBackend):
+    """
+    Sends through WhatsApp Web in a browser controlled by Selenium.
+    A persistent profile directory keeps the WhatsApp session between runs.
+    """
+    name = "selenium"
+    rate_per_minute = 10
+
+    def __init__(self, profile_dir=SELENIUM_PROFILE_DIR, login_timeout=WHATSAPP_LOGIN_TIMEOUT, send_timeout=SELENIUM_SEND_TIMEOUT):
+        self.profile_dir = profile_dir
+        self.login_timeout = login_timeout
+        self.send_timeout = send_timeout
+        self.driver = None
+
+    def open(self):
+        """Start Chrome and wait until the WhatsApp session is ready"""
+        try:
+            from selenium import webdriver
+        except ImportError:
+            raise RuntimeError("O envio por Selenium requer o pacote selenium: pip install -r requirements.txt") from None
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        options = webdriver.ChromeOptions()
+        options.add_argument(f"--user-data-dir={self.profile_dir}")
+        self.driver = webdriver.Chrome(options=options)
+        self.driver.get("https://web.whatsapp.com")
+        WebDriverWait(self.driver, self.login_timeout).until(
+            expected_conditions.presence_of_element_located((By.ID, "side"))
+        )
+
+    def send(self, phone, message):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.driver.get(f"https://web.whatsapp.com/send?phone={phone.lstrip('+')}&text={quote(message)}")
+        button = WebDriverWait(self.driver, self.send_timeout).until(
+            expected_conditions.element_to_be_clickable((By.CSS_SELECTOR, "button[aria-label='Enviar'], button[aria-label='Send']"))
+        )
+        button.click()
+        # Give WhatsApp time to hand the message to the server before navigating away
+        time.sleep(2)
+
+    def close(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+class WaLinkBackend(ReminderBackend):
+    """
+    Opens a wa.me link with the message filled in; the user confirms the send in WhatsApp.
+    """
+    name = "wa_link"
+    rate_per_minute = 6
+
+    def send(self, phone, message):
+        if not webbrowser.open(f"https://wa.me/{phone.lstrip('+')}?text={quote(message)}"):
+            raise RuntimeError("Não foi possível abrir o navegador.")
+
+class PrintBackend(ReminderBackend):
+    """
+    Prints the messages instead of sending them (dry run).
+    """
+    name = "print"
+
+    def send(self, phone, message):
+        print(f"Phone: {phone}")
+        print(f"Message: {message}")
+
+class FakeBackend(ReminderBackend):
+    """
+    Offline backend that simulates send latency and failures, for throughput tests.
+    """
+    name = "fake"
+
+    def __init__(self, latency=0.05, failure_rate=0.0, max_concurrency=8, rate_per_minute=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_concurrency = max_concurrency
+        self.rate_per_minute = rate_per_minute
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, phone, message):
+        time.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("Falha simulada no envio.")
+        with self.lock:
+            self.sent.append((phone, message))
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (PyWhatKitBackend, SeleniumBackend, WaLinkBackend, PrintBackend, FakeBackend)
+}
+
+def create_backend(method, **options):
+    """Instantiate the backend registered under method"""
+    if method not in BACKENDS:
+        raise ValueError(f"Unknown reminder method: {method}")
+    return BACKENDS[method](**options)
@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+from settings import *
+from reminder_backends import create_backend
+
+class RateLimiter:
+    """
+    Spaces out calls so that at most rate_per_minute start in any minute.
+    Shared by all the workers of a dispatch.
+    """
+    def __init__(self, rate_per_minute=None):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self, cancelled):
+        """Block until the next slot is free, returning False if cancelled meanwhile"""
+        if not self.interval:
+            return not cancelled.is_set()
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        # Event.wait returns True when the event is set, i.e. when cancelled
+        return not cancelled.wait(max(0.0, slot - time.monotonic()))
+
+class DispatchReport:
+    """
+    Outcome of a dispatch: the reminders that were sent and the ones that failed.
+    """
+    def __init__(self, total):
+        self.total = total
+        self.sent = []
+        self.failed = []
+        self.cancelled = False
+
+    def done(self):
+        """Number of reminders that were processed"""
+        return len(self.sent) + len(self.failed)
+
+class ReminderDispatcher:
+    """
+    Sends reminders through a backend from a queue worked by a pool of threads,
+    with per-backend concurrency and rate limits, retries with exponential
+    backoff and progress reporting. Reminders are dicts with at least 'phone'
+    and 'message'; they are returned untouched in the report.
+    """
+    def __init__(self, backend, concurrency=None, rate_per_minute=None, max_retries=REMINDER_MAX_RETRIES, backoff=REMINDER_RETRY_BACKOFF, on_progress=None):
+        self.backend = backend
+        self.concurrency = min(concurrency or backend.max_concurrency, backend.max_concurrency)
+        self.limiter = RateLimiter(rate_per_minute or backend.rate_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.on_progress = on_progress
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        """Stop after the messages currently being sent"""
+        self.cancelled.set()
+
+    def dispatch(self, reminders, open_backend=True):
+        """
+        Send every reminder and block until all are sent, failed or cancelled.
+        With open_backend False the caller opens and closes the backend, e.g. to
+        keep one WhatsApp session across several dispatches.
+        """
+        report = DispatchReport(len(reminders))
+        if not reminders:
+            return report
+
+        work = queue.Queue()
+        for reminder in reminders:
+            work.put(reminder)
+
+        if open_backend:
+            self.backend.open()
+        try:
+            workers = [
+                threading.Thread(target=self.work, args=(work, report), name=f"reminder-{index}", daemon=True)
+                for index in range(max(1, min(self.concurrency, len(reminders))))
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            if open_backend:
+                self.backend.close()
+
+        report.cancelled = self.cancelled.is_set()
+        return report
+
+    def work(self, work, report):
+        """Worker loop: take reminders from the queue until it is empty or the dispatch is cancelled"""
+        while not self.cancelled.is_set():
+            try:
+                reminder = work.get_nowait()
+            except queue.Empty:
+                return
+            error = self.send_with_retries(reminder)
+            with self.lock:
+                if error is None:
+                    report.sent.append(reminder)
+                else:
+                    report.failed.append((reminder, error))
+                done = report.done()
+            if self.on_progress:
+                self.on_progress(done, report.total)
+
+    def send_with_retries(self, reminder):
+        """Send one reminder, retrying with exponential backoff; return the last error or None"""
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt and self.cancelled.wait(self.backoff * 2 ** (attempt - 1)):
+                break
+            if not self.limiter.wait(self.cancelled):
+                break
+            try:
+                self.backend.send(reminder['phone'], reminder['message'])
+                return None
+            except Exception as exception:
+                error = exception
+        return error or RuntimeError("Envio cancelado.")
+
+if __name__ == "__main__":
+    # Offline throughput check with the fake backend
+    backend = create_backend("fake", latency=0.02, failure_rate=0.05, max_concurrency=8)
+    dispatcher = ReminderDispatcher(backend, backoff=0.01)
+    reminders = [{'phone': f"+55449{index:08d}", 'message': f"Mensagem {index}"} for index in range(1000)]
+    start = time.perf_counter()
+    report = dispatcher.dispatch(reminders)
+    elapsed = time.perf_counter() - start
+    print(f"Sent {len(report.sent)}, failed {len(report.failed)} in {elapsed:.2f}s ({len(report.sent) / elapsed:.0f} msg/s)")
@@ -0,0 +1,314 @@
+"""
+Long-running reminder scheduler.
+Keeps the next reminder of every unpaid payment in a min-heap: a few days
+before it is due, on the due date, the day after and then every few days while
+it stays overdue, always at the send hour. The heap is built once and then
+updated with the payments changed or deleted since the last sync, so a tick
+never rescans the table. Reminders that fire together are coalesced into one
+message per client; the ones that fail to send are tried again a few minutes
+later. Never imports Tk.
+
+    python src/reminder_scheduler.py --method selenium
+    python src/reminder_scheduler.py --dry-run
+"""
+import argparse
+import getpass
+import heapq
+import json
+import os
+import signal
+import socket
+import threading
+import time as clock
+import traceback
+from datetime import date, datetime, time, timedelta
+from itertools import count
+from settings import *
+from supabase_client import supabase
+from metrics import metrics
+from mirror_sync import MirrorSync
+from audit_log import AuditLogWriter
+from client_index import ClientIndex
+from repositories import PaymentRepository
+from payment_export import payment_chunks
+from reminder_backends import BACKENDS, create_backend
+from reminder_dispatcher import ReminderDispatcher
+from send_reminder import build_client_reminders
+
+class ReminderSchedule:
+    """
+    Min-heap of (fire time, payment id, version) with the next reminder of
+    every unpaid payment. A change to a payment bumps its version instead of
+    searching the heap; entries with an old version are skipped when they
+    reach the top and dropped when they outnumber the live ones.
+    """
+    def __init__(self, send_hour=REMINDER_SEND_HOUR, soon_days=REMINDER_DAYS_AHEAD, overdue_every=REMINDER_OVERDUE_EVERY_DAYS):
+        self.send_hour = send_hour
+        self.soon_days = soon_days
+        self.overdue_every = overdue_every
+        self.payments = {}
+        self.heap = []
+        self.versions = count()
+
+    def __len__(self):
+        return len(self.payments)
+
+    def fire_time(self, day):
+        """Timestamp of the send hour on a day"""
+        return datetime.combine(day, time(self.send_hour)).timestamp()
+
+    def next_event(self, due, after):
+        """Time of the first reminder of a payment due on due that falls after the timestamp after, or None"""
+        for day in (due - timedelta(days=self.soon_days), due, due + timedelta(days=1)):
+            fire_at = self.fire_time(day)
+            if fire_at > after:
+                return fire_at
+        if not self.overdue_every:
+            return None
+        # Jump straight to the repeat of the overdue reminder that comes after
+        first_overdue = due + timedelta(days=1)
+        day = first_overdue + timedelta(days=(date.fromtimestamp(after) - first_overdue).days // self.overdue_every * self.overdue_every)
+        while self.fire_time(day) <= after:
+            day += timedelta(days=self.overdue_every)
+        return self.fire_time(day)
+
+    def entry(self, payment, after):
+        """Store a payment and return its heap entry, or None if it needs no reminder"""
+        payment_id = payment['id']
+        due = parse_due_date(payment.get('due_date'))
+        if payment.get('is_paid') or due is None:
+            self.payments.pop(payment_id, None)
+            return None
+        version = next(self.versions)
+        self.payments[payment_id] = (payment['client_id'], payment['amount'], payment['due_date'], version)
+        fire_at = self.next_event(due, after)
+        return None if fire_at is None else (fire_at, payment_id, version)
+
+    def load(self, payments, after):
+        """Replace the schedule with payments, building the heap in one pass"""
+        self.payments = {}
+        self.heap = [entry for entry in (self.entry(payment, after) for payment in payments) if entry is not None]
+        heapq.heapify(self.heap)
+
+    def upsert(self, payment, after):
+        """Schedule the next reminder of an added or changed payment; paid ones are dropped"""
+        entry = self.entry(payment, after)
+        if entry is not None:
+            heapq.heappush(self.heap, entry)
+        self.compact()
+
+    def retry(self, payment_id, at):
+        """Fire a payment's reminder again at the timestamp at, then carry on with its usual schedule"""
+        stored = self.payments.get(payment_id)
+        if stored is None:
+            return
+        # A new version drops the next reminder pop_due scheduled; the retry reschedules it when it fires
+        version = next(self.versions)
+        self.payments[payment_id] = stored[:3] + (version,)
+        heapq.heappush(self.heap, (at, payment_id, version))
+
+    def remove(self, payment_id):
+        """Drop a deleted payment; its heap entry goes stale"""
+        self.payments.pop(payment_id, None)
+        self.compact()
+
+    def is_current(self, entry):
+        stored = self.payments.get(entry[1])
+        return stored is not None and stored[3] == entry[2]
+
+    def next_time(self):
+        """Time of the next reminder, or None when nothing is scheduled"""
+        while self.heap and not self.is_current(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """Remove the reminders due by now, schedule the next one of each payment and return the payments"""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if not self.is_current(entry):
+                continue
+            client_id, amount, due_date, version = self.payments[entry[1]]
+            payment = {'id': entry[1], 'client_id': client_id, 'amount': amount, 'due_date': due_date}
+            due.append(payment)
+        for payment in due:
+            # Reschedule only after the pops, so an event at exactly now cannot fire twice
+            next_at = self.next_event(parse_due_date(payment['due_date']), now)
+            if next_at is not None:
+                heapq.heappush(self.heap, (next_at, payment['id'], self.payments[payment['id']][3]))
+        return due
+
+    def compact(self):
+        """Rebuild the heap without stale entries once they outnumber the live ones"""
+        if len(self.heap) > SCHEDULER_COMPACT_FACTOR * len(self.payments) + SCHEDULER_COMPACT_MIN:
+            self.heap = [entry for entry in self.heap if self.is_current(entry)]
+            heapq.heapify(self.heap)
+
+def parse_due_date(text):
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+class ReminderScheduler:
+    """
+    Runs a ReminderSchedule against the database: loads the unpaid payments
+    once, applies their changes through a DeltaSync over the local mirror (kept
+    up to date by a MirrorSync thread), sends the reminders when they fire and
+    logs them in the backlog. The time up to which reminders have fired is kept
+    in a state file, so a restart neither repeats nor floods them.
+    """
+    def __init__(self, backend, mirror=supabase, state_path=SCHEDULER_STATE_PATH, sync_interval=SCHEDULER_SYNC_INTERVAL,
+                 retry_delay=SCHEDULER_RETRY_DELAY, dry_run=False):
+        self.backend = backend
+        self.mirror = mirror
+        self.state_path = state_path
+        self.sync_interval = sync_interval
+        self.retry_delay = retry_delay
+        self.dry_run = dry_run
+        self.schedule = ReminderSchedule()
+        self.repository = PaymentRepository()
+        self.payment_sync = self.repository.delta_sync()
+        self.client_index = ClientIndex()
+        self.mirror_sync = MirrorSync(mirror)
+        self.dispatcher = ReminderDispatcher(backend)
+        self.audit_log = None
+        self.user = f"{getpass.getuser()}@{socket.gethostname()} - reminder_scheduler"
+        self.fired_until = self.read_state()
+        self.reload_needed = False
+        self.stopping = False
+        self.wakeup = threading.Event()
+
+    def read_state(self):
+        """Time up to which reminders have fired; a first run starts from now"""
+        if self.state_path and os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as state_file:
+                return json.load(state_file)['fired_until']
+        return clock.time()
+
+    def save_state(self):
+        if self.dry_run or not self.state_path:
+            return
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        temporary_path = self.state_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as state_file:
+            json.dump({"fired_until": self.fired_until}, state_file)
+        os.replace(temporary_path, self.state_path)
+
+    def load(self):
+        """Build the schedule from every unpaid payment"""
+        marks = self.payment_sync.fetch_marks()
+        self.schedule.load((payment for payments in payment_chunks(only_open=True, chunk_size=SCHEDULER_LOAD_CHUNK_SIZE) for payment in payments), self.fired_until)
+        self.payment_sync.set_marks(marks)
+
+    def apply_changes(self):
+        """Reschedule the payments changed or deleted since the last sync"""
+        changed, deleted_ids = self.payment_sync.apply(self.payment_sync.fetch_changes())
+        for payment in changed:
+            self.schedule.upsert(payment, self.fired_until)
+        for payment_id in deleted_ids:
+            self.schedule.remove(payment_id)
+
+    def fire(self, now):
+        """
+        Send the reminders due by now, one message per client. The ones that
+        fail are scheduled again after retry_delay; fired_until only moves to
+        now once the dispatch has run, so an error leaves it for the next start.
+        """
+        due = self.schedule.pop_due(now)
+        if not due:
+            self.fired_until = now
+            return
+        try:
+            today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+            payments = []
+            for payment in due:
+                client = self.client_index.get(payment['client_id'])
+                if client['phone']:
+                    payments.append(dict(payment, client_name=client['name'], client_phone=client['phone']))
+            report = self.dispatcher.dispatch(build_client_reminders(payments, today), open_backend=False)
+        except Exception:
+            for payment in due:
+                self.schedule.retry(payment['id'], now + self.retry_delay)
+            raise
+        sent_ids = {payment['id'] for reminder in report.sent for payment in reminder['payments']}
+        for payment in payments:
+            if payment['id'] not in sent_ids:
+                self.schedule.retry(payment['id'], now + self.retry_delay)
+        if self.audit_log is not None:
+            entries = [f"Sent scheduled reminder for payments: {[payment['id'] for payment in reminder['payments']]}" for reminder in report.sent]
+            entries += [f"Failed scheduled reminder for payments: {[payment['id'] for payment in reminder['payments']]}: {error}" for reminder, error in report.failed]
+            self.audit_log.log(self.user, entries)
+        self.fired_until = now
+        self.save_state()
+
+    def on_mirror_event(self, kind):
+        """Called from the mirror threads: sync on the next tick, reloading once the mirror is first ready"""
+        if kind == "ready":
+            self.reload_needed = True
+        if kind in ("ready", "changed"):
+            self.client_index.invalidate()
+            self.wakeup.set()
+
+    def run(self):
+        """Load the schedule and fire reminders until stop is called"""
+        metrics.set_action("ReminderScheduler")
+        self.mirror_sync.sync()
+        self.mirror.add_listener(self.on_mirror_event)
+        self.load()
+        self.mirror_sync.start()
+        self.audit_log = None if self.dry_run else AuditLogWriter(AUDIT_SCHEDULER_SPOOL_PATH)
+        self.backend.open()
+        last_sync = clock.monotonic()
+        try:
+            while not self.stopping:
+                try:
+                    if self.reload_needed:
+                        # The mirror has replaced the remote reads: start over from its marks
+                        self.payment_sync.reset()
+                        self.load()
+                        self.reload_needed = False
+                    elif self.wakeup.is_set() or clock.monotonic() - last_sync >= self.sync_interval:
+                        self.apply_changes()
+                        last_sync = clock.monotonic()
+                    self.wakeup.clear()
+                    self.fire(clock.time())
+                except Exception:
+                    # Keep the scheduler alive; the next tick tries again after the retry delay
+                    traceback.print_exc()
+                    self.wakeup.clear()
+                    self.wakeup.wait(self.retry_delay)
+                    continue
+                next_time = self.schedule.next_time()
+                timeout = self.sync_interval if next_time is None else min(self.sync_interval, max(0.0, next_time - clock.time()))
+                self.wakeup.wait(timeout)
+        finally:
+            self.backend.close()
+            self.save_state()
+            if self.audit_log is not None:
+                self.audit_log.close()
+            self.mirror_sync.stop()
+            metrics.close()
+
+    def stop(self):
+        """Finish the current tick and exit run; safe to call from a signal handler"""
+        self.stopping = True
+        self.wakeup.set()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n\n")[0])
+    parser.add_argument("--method", choices=sorted(BACKENDS), default=REMINDER_METHOD, help="reminder backend")
+    parser.add_argument("--dry-run", action="store_true", help="print the messages instead of sending them; nothing is logged or saved")
+    args = parser.parse_args()
+
+    supabase.open(MIRROR_SCHEDULER_PATH)
+    scheduler = ReminderScheduler(create_backend("print" if args.dry_run else args.method), dry_run=args.dry_run)
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
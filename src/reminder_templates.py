@@ -0,0 +1,164 @@
+"""
+Reminder message templates.
+One template per reminder kind: upcoming, soon (due within REMINDER_DAYS_AHEAD
+days), today and overdue, plus the summary sent to a client with several
+payments and its lines. Operators can override any of them in a JSON file at
+REMINDER_TEMPLATES_PATH, e.g. {"today": "Olá {name}, sua parcela de {amount} vence hoje."};
+a file that cannot be used is reported and the last good templates are kept.
+Templates are checked and compiled once, and a whole batch is rendered against
+a single reference date: the charges and the days to each due date are computed
+for every payment at once with NumPy, and each distinct amount and due date is
+formatted only once.
+"""
+import json
+import os
+import string
+import sys
+import numpy as np
+from settings import *
+from fee_engine import compute_charges, parse_dates, format_brl
+
+PAYMENT_KINDS = ("upcoming", "soon", "today", "overdue")
+# Placeholders of each template, in the order compiled templates take their values
+PAYMENT_FIELDS = ("name", "amount", "due_date", "total", "days")
+SUMMARY_FIELDS = ("name", "lines")
+# Values a template is rendered with once when compiled, so a bad format spec fails there instead of on every message
+SAMPLE_PAYMENT_VALUES = ("Nome", "R$ 1,00", "01/01/2025", "R$ 1,00", 1)
+SAMPLE_SUMMARY_VALUES = ("Nome", "- R$ 1,00, vence no dia 01/01/2025")
+
+DEFAULT_TEMPLATES = {
+    "upcoming": "Olá {name}, lembramos que sua parcela de {amount} vence no dia {due_date}.",
+    "soon": "Olá {name}, lembramos que sua parcela de {amount} vence em breve, no dia {due_date}.",
+    "today": "Olá {name}, sua parcela de {amount} vence hoje, {due_date}. Por favor, efetue o pagamento.",
+    "overdue": ("Olá {name}, sua parcela de {amount} está atrasada desde {due_date}. "
+                "Com multa e juros, o valor total é de {total}. Por favor, efetue o pagamento o quanto antes."),
+    "summary": "Olá {name}, estas são as suas parcelas em aberto:\n{lines}\nPor favor, efetue o pagamento.",
+    "summary_upcoming": "- {amount}, vence no dia {due_date}",
+    "summary_today": "- {amount}, vence hoje, {due_date}",
+    "summary_overdue": "- {amount}, atrasada desde {due_date} (com multa e juros, {total})",
+}
+# Summary line used for each payment kind
+SUMMARY_LINES = {"upcoming": "summary_upcoming", "soon": "summary_upcoming", "today": "summary_today", "overdue": "summary_overdue"}
+
+def compile_template(kind, text):
+    """
+    Compile a template into the bound format method of an equivalent
+    positional template, so rendering takes a tuple of values instead of a
+    dict. Returns it with the placeholders used; raises ValueError.
+    """
+    if kind not in DEFAULT_TEMPLATES:
+        raise ValueError(f"Unknown reminder template: {kind}")
+    allowed = SUMMARY_FIELDS if kind == "summary" else PAYMENT_FIELDS
+    parts = []
+    used = set()
+    for literal, field, spec, conversion in string.Formatter().parse(text):
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None:
+            continue
+        if field not in allowed:
+            raise ValueError(f"Unknown placeholder {{{field}}} in reminder template '{kind}'; use {', '.join(sorted(allowed))}")
+        used.add(field)
+        parts.append("{" + str(allowed.index(field)) + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}")
+    compiled = "".join(parts).format
+    try:
+        compiled(*(SAMPLE_SUMMARY_VALUES if kind == "summary" else SAMPLE_PAYMENT_VALUES))
+    except (ValueError, TypeError, IndexError, KeyError) as error:
+        raise ValueError(f"Invalid reminder template '{kind}': {error}") from None
+    return compiled, used
+
+def format_due_date(text):
+    """Format a "YYYY-MM-DD" date as dd/mm/yyyy without parsing it"""
+    return f"{text[8:10]}/{text[5:7]}/{text[:4]}"
+
+class FormatCache(dict):
+    """
+    Formatted values by raw value, formatting each one the first time it is looked up.
+    """
+    def __init__(self, format):
+        super().__init__()
+        self.format = format
+
+    def __missing__(self, value):
+        text = self[value] = self.format(value)
+        return text
+
+class ReminderTemplates:
+    """
+    Compiled reminder templates, the defaults updated with an operator's
+    overrides. soon_days is how many days before the due date the soon
+    template replaces the upcoming one.
+    """
+    def __init__(self, overrides=None, soon_days=REMINDER_DAYS_AHEAD):
+        self.soon_days = soon_days
+        self.formats = {}
+        used = {}
+        for kind, text in dict(DEFAULT_TEMPLATES, **(overrides or {})).items():
+            self.formats[kind], used[kind] = compile_template(kind, text)
+        # The total due is only formatted for the kinds whose messages show it
+        self.shows_total = [("total" in used[kind] or "total" in used[SUMMARY_LINES[kind]]) for kind in PAYMENT_KINDS]
+
+    def fields(self, payments, today):
+        """Yield the kind and template values of each payment, or (None, None) when its due date or amount is invalid"""
+        reference = np.datetime64(today.date() if hasattr(today, "date") else today, "D")
+        due_dates = [payment['due_date'] for payment in payments]
+        charges = compute_charges([payment['amount'] for payment in payments], due_dates, reference)
+        due = parse_dates(due_dates)
+        days = (due - reference).astype(np.int64)
+        kinds = np.select([np.isnat(due) | ~charges.valid, days < 0, days == 0, days <= self.soon_days], [-1, 3, 2, 1], 0)
+        # Many payments share an amount or a due date: format each one once
+        money = FormatCache(format_brl)
+        dates = FormatCache(format_due_date)
+        shows_total = self.shows_total
+        for payment, kind, day_count, amount, total, due_date in zip(payments, kinds.tolist(), np.abs(days).tolist(), charges.amount.tolist(), charges.total.tolist(), due_dates):
+            if kind < 0:
+                yield None, None
+                continue
+            yield PAYMENT_KINDS[kind], (
+                payment['client_name'],
+                money[amount],
+                dates[due_date],
+                money[total] if shows_total[kind] else "",
+                day_count,
+            )
+
+    def render(self, payments, today):
+        """Message of every payment, in order; None for payments with an invalid due date or amount"""
+        formats = self.formats
+        return [None if kind is None else formats[kind](*values) for kind, values in self.fields(payments, today)]
+
+    def render_summary(self, name, payment_fields):
+        """Message listing several payments of one client, given their (kind, values) in due date order"""
+        lines = "\n".join(self.formats[SUMMARY_LINES[kind]](*values) for kind, values in payment_fields)
+        return self.formats["summary"](name, lines)
+
+loaded_templates = {}
+
+def read_overrides(path):
+    """Templates saved in the JSON file at path; raises ValueError or OSError"""
+    with open(path, encoding="utf-8") as templates_file:
+        overrides = json.load(templates_file)
+    if not isinstance(overrides, dict) or not all(isinstance(text, str) for text in overrides.values()):
+        raise ValueError("Expected an object of template texts")
+    return overrides
+
+def load_templates(path=REMINDER_TEMPLATES_PATH):
+    """
+    Templates with the overrides saved at path, compiled again only when the
+    file changes. A file that cannot be read or compiled is reported once and
+    the last good templates, or the defaults, are used until it is fixed.
+    """
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        modified = None
+    cached = loaded_templates.get(path)
+    if cached is None or cached[0] != modified:
+        templates = None if cached is None else cached[1]
+        try:
+            templates = ReminderTemplates(read_overrides(path) if modified is not None else {})
+        except (OSError, ValueError) as error:
+            print(f"Reminder templates in {path} not used: {error}", file=sys.stderr)
+            if templates is None:
+                templates = ReminderTemplates()
+        cached = loaded_templates[path] = (modified, templates)
+    return cached[1]
@@ -0,0 +1,111 @@
+from supabase_client import supabase
+from delta_sync import DeltaSync
+from pagination import KeysetPager
+from settings import *
+
+class Repository:
+    """
+    Data access for one table.
+    Every query goes through the shared client (the local mirror over one
+    keep-alive Supabase session with explicit timeouts) and selects only the
+    columns the app uses. The *_many methods send one request per chunk of ids
+    instead of one per row.
+    """
+    table = None
+    columns = "*"
+
+    def __init__(self, client=None, chunk_size=REPOSITORY_CHUNK_SIZE):
+        self.client = client or supabase
+        self.chunk_size = chunk_size
+
+    def query(self):
+        return self.client.table(self.table)
+
+    def chunks(self, ids):
+        ids = list(ids)
+        for start in range(0, len(ids), self.chunk_size):
+            yield ids[start:start + self.chunk_size]
+
+    def get(self, row_id):
+        """Return one row, or None if it does not exist"""
+        rows = self.query().select(self.columns).eq("id", row_id).execute().data
+        return rows[0] if rows else None
+
+    def get_many(self, ids):
+        """Return the rows with the given ids that exist"""
+        rows = []
+        for chunk in self.chunks(ids):
+            rows.extend(self.query().select(self.columns).in_("id", chunk).execute().data)
+        return rows
+
+    def insert(self, data):
+        """Insert one row and return it as stored"""
+        return self.query().insert(data).execute().data[0]
+
+    def insert_many(self, rows):
+        """Insert several rows in one request per chunk and return them as stored"""
+        inserted = []
+        for chunk in self.chunks(rows):
+            inserted.extend(self.query().insert(chunk).execute().data)
+        return inserted
+
+    def update(self, row_id, data):
+        """Update one row and return it as stored, or None if it no longer exists"""
+        rows = self.query().update(data).eq("id", row_id).execute().data
+        return rows[0] if rows else None
+
+    def update_many(self, ids, data):
+        """Apply the same change to several rows and return the rows updated"""
+        updated = []
+        for chunk in self.chunks(ids):
+            updated.extend(self.query().update(data).in_("id", chunk).execute().data)
+        return updated
+
+    def delete(self, row_id):
+        """Delete one row and return whether it existed"""
+        return bool(self.query().delete().eq("id", row_id).execute().data)
+
+    def delete_many(self, ids):
+        """Delete several rows and return the ids actually deleted"""
+        deleted = []
+        for chunk in self.chunks(ids):
+            deleted.extend(row['id'] for row in self.query().delete().in_("id", chunk).execute().data)
+        return deleted
+
+    def pager(self, **kwargs):
+        """Keyset pager over the table with the repository columns"""
+        kwargs.setdefault("columns", self.columns)
+        return KeysetPager(self.table, **kwargs)
+
+    def delta_sync(self):
+        """Incremental sync of the table with the repository columns"""
+        return DeltaSync(self.table, columns=self.columns)
+
+class ClientRepository(Repository):
+    """
+    Clients: id, name and phone.
+    """
+    table = "clients"
+    columns = "id, name, phone, updated_at"
+
+    def all(self):
+        """Return every client, one page per request since PostgREST caps the rows of a response"""
+        return list(self.pager(columns="id, name, phone", page_size=REPOSITORY_PAGE_SIZE).iter_rows())
+
+    def ids_with_name(self, name):
+        """Return the ids of the clients with exactly this name"""
+        return [row['id'] for row in self.query().select("id").eq("name", name).execute().data]
+
+class PaymentRepository(Repository):
+    """
+    Payments: amount, due date and paid flag of a client's installment.
+    """
+    table = "payments"
+    columns = "id, client_id, amount, due_date, is_paid, updated_at"
+
+class BacklogRepository(Repository):
+    """
+    Audit entries of the backlog table; they are only ever inserted.
+    """
+    table = "backlog"
+    columns = "id, responsible_user, description, created_at"
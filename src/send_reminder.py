@@ -1,69 +1,51 @@
-import pywhatkit as kit
-from datetime import datetime, timedelta
-from time import sleep
-import webbrowser
-import time
+from datetime import datetime
+from settings import *
+from reminder_templates import load_templates
+from reminder_backends import create_backend
+from reminder_dispatcher import ReminderDispatcher
 
-def send_payment_reminder(payments, method='pywhatkit'):
-    if method == 'pywhatkit':
-        open_whatsapp_web()
-    
-    for payment in payments:
-        client_name = payment['client_name']
-        phone = payment['client_phone']
-        if len(phone) <= 11:
-            phone = "+55" + phone
-        amount = float(payment['amount'])
-        due_date = datetime.strptime(payment['due_date'], "%Y-%m-%d")
-        today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+def send_payment_reminder(payments, method=REMINDER_METHOD, on_progress=None, backend=None):
+    """Build the reminder messages and send them through the dispatcher; return the DispatchReport"""
+    dispatcher = ReminderDispatcher(backend or create_backend(method), on_progress=on_progress)
+    return dispatcher.dispatch(build_reminders(payments))
 
-        message = ""
-        
-        if today > due_date:
-            days_late = (today - due_date).days
-            late_fee = amount * 0.05
-            daily_interest = (amount * 0.03) / 30
-            total_interest = daily_interest * days_late
-            total_amount = amount + late_fee + total_interest
-            message = (f"Olá {client_name}, sua parcela de R${amount:.2f} está atrasada desde {due_date.strftime('%d/%m/%Y')}. "
-                       f"Com multa e juros, o valor total é de R${total_amount:.2f}. Por favor, efetue o pagamento o quanto antes.")
-        
-        elif today == due_date:
-            message = f"Olá {client_name}, sua parcela de R${amount:.2f} vence hoje, {due_date.strftime('%d/%m/%Y')}. Por favor, efetue o pagamento."
-        
-        elif today >= due_date - timedelta(days=3):
-            message = f"Olá {client_name}, lembramos que sua parcela de R${amount:.2f} vence em breve, no dia {due_date.strftime('%d/%m/%Y')}."
-        
-        elif today < due_date:
-            message = f"Olá {client_name}, lembramos que sua parcela de R${amount:.2f} vence no dia {due_date.strftime('%d/%m/%Y')}."
-        
+def build_reminders(payments, today=None, templates=None):
+    """Reminders (phone with country code, message and payment) of the payments that get a message"""
+    today = today or datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    messages = (templates or load_templates()).render(payments, today)
+    reminders = []
+    for payment, message in zip(payments, messages):
         # Apenas envia a mensagem se foi criada
         if message:
-            if method == 'pywhatkit':
-                send_with_pywhatkit(phone, message)
-            elif method == 'selenium':
-                send_with_selenium(phone, message)
-            elif method == 'wa_link':
-                send_with_wa_link(phone, message)
-            elif method == 'print':
-                print_message(phone, message)
+            reminders.append({'phone': international_phone(payment['client_phone']), 'message': message, 'payment': payment})
+    return reminders
 
-def open_whatsapp_web():
-    webbrowser.open("https://web.whatsapp.com")
-    time.sleep(45)
+def build_client_reminders(payments, today=None, templates=None):
+    """One reminder per client covering all of its payments; payments need a 'client_id'"""
+    today = today or datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    templates = templates or load_templates()
+    by_client = {}
+    for payment, (kind, values) in zip(payments, templates.fields(payments, today)):
+        if kind is not None:
+            by_client.setdefault(payment['client_id'], []).append((payment, kind, values))
+    reminders = []
+    for client_payments in by_client.values():
+        if len(client_payments) == 1:
+            payment, kind, values = client_payments[0]
+            message = templates.formats[kind](*values)
+        else:
+            client_payments.sort(key=lambda item: item[0]['due_date'])
+            message = templates.render_summary(client_payments[0][0]['client_name'], [(kind, values) for payment, kind, values in client_payments])
+        reminders.append({
+            'phone': international_phone(client_payments[0][0]['client_phone']),
+            'message': message,
+            'payments': [payment for payment, kind, values in client_payments],
+        })
+    return reminders
 
-def send_with_pywhatkit(phone, message):
-    kit.sendwhatmsg_instantly(phone, message, wait_time=10, tab_close=True)
-
-def send_with_selenium(phone, message):
-    pass
-
-def send_with_wa_link(phone, message):
-    pass
-
-def print_message(phone, message):
-    print(f"Phone: {phone}")
-    print(f"Message: {message}")
+def international_phone(phone):
+    """Add the Brazilian country code to a local phone number"""
+    return "+55" + phone if len(phone) <= 11 else phone
 
 if __name__ == "__main__":
     payments = [
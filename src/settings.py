@@ -0,0 +1,100 @@
+"""
+Runtime settings of the Payment Manager System: local data files, data
+access, background work, reminders, metrics, imports and exports. Layout and
+styling live in layout_config.py.
+"""
+import os
+
+# Local data directory (backlog spool, mirror, metrics); PAYMENT_MANAGER_DATA_DIR overrides it
+DATA_DIR = os.environ.get("PAYMENT_MANAGER_DATA_DIR", os.path.join(os.path.expanduser("~"), ".payment_manager"))
+
+# Pagination settings
+PAYMENTS_PAGE_SIZE = 200
+CLIENTS_PAGE_SIZE = 200
+PAYMENTS_ORDER_BY = "due_date"
+CLIENTS_ORDER_BY = "id"
+REPORT_PAGE_SIZE = 1000
+
+# Background loading settings
+MAX_REQUESTS_IN_FLIGHT = 4
+BACKGROUND_POLL_MS = 50
+
+# Audit log settings
+# One spool per program: a writer rewrites its spool with only its own pending entries
+AUDIT_SPOOL_PATH = os.path.join(DATA_DIR, "backlog_spool.jsonl")
+AUDIT_BATCH_SPOOL_PATH = os.path.join(DATA_DIR, "backlog_spool_batch.jsonl")
+AUDIT_SCHEDULER_SPOOL_PATH = os.path.join(DATA_DIR, "backlog_spool_scheduler.jsonl")
+AUDIT_BATCH_SIZE = 50
+AUDIT_FLUSH_INTERVAL = 2.0
+AUDIT_CLOSE_TIMEOUT = 5.0
+
+# Reminder settings
+REMINDER_METHOD = "pywhatkit"
+REMINDER_MAX_RETRIES = 2
+REMINDER_RETRY_BACKOFF = 5.0
+WHATSAPP_LOGIN_WAIT = 45
+WHATSAPP_LOGIN_TIMEOUT = 120
+PYWHATKIT_WAIT_TIME = 10
+SELENIUM_SEND_TIMEOUT = 30
+SELENIUM_PROFILE_DIR = os.path.join(DATA_DIR, "selenium_profile")
+REMINDER_DAYS_AHEAD = 3
+REMINDER_BATCH_SIZE = 100
+REMINDER_CHECKPOINT_PATH = os.path.join(DATA_DIR, "reminder_checkpoint.json")
+REMINDER_SEND_HOUR = 9
+REMINDER_OVERDUE_EVERY_DAYS = 7
+# JSON file with the operator's overrides of the reminder message templates
+REMINDER_TEMPLATES_PATH = os.path.join(DATA_DIR, "reminder_templates.json")
+
+# Reminder scheduler settings
+SCHEDULER_STATE_PATH = os.path.join(DATA_DIR, "reminder_scheduler.json")
+SCHEDULER_SYNC_INTERVAL = 60.0
+SCHEDULER_LOAD_CHUNK_SIZE = 5000
+SCHEDULER_COMPACT_FACTOR = 2
+SCHEDULER_COMPACT_MIN = 1000
+# Seconds before a scheduled reminder that failed to send, or a tick that failed, is tried again
+SCHEDULER_RETRY_DELAY = 300.0
+
+# Delta sync settings
+DELTA_SYNC_BATCH_SIZE = 1000
+# Seconds of changes re-read on every sync, longer than any write transaction, so
+# a row stamped before a later one but committed after it is not skipped
+DELTA_SYNC_OVERLAP = 60.0
+
+# Data access settings
+SUPABASE_TIMEOUT = 10.0
+SUPABASE_CONNECT_TIMEOUT = 5.0
+REPOSITORY_CHUNK_SIZE = 200
+# Rows per request when reading a whole table; PostgREST returns at most max_rows (1000 by default) per request
+REPOSITORY_PAGE_SIZE = 500
+
+# Metrics settings
+METRICS_LOG_PATH = os.path.join(DATA_DIR, "metrics.jsonl")
+METRICS_PROMETHEUS_PATH = os.path.join(DATA_DIR, "metrics.prom")
+METRICS_SAMPLE_SIZE = 1000
+# The JSON-lines log is rotated to metrics.jsonl.1, .2... once it reaches this size
+METRICS_LOG_MAX_BYTES = 5 * 1024 * 1024
+METRICS_LOG_BACKUPS = 3
+METRICS_EXPORT_INTERVAL_MS = 15000
+
+# Local mirror settings
+# One mirror per program: its outbox must not be replayed by two processes
+MIRROR_PATH = os.path.join(DATA_DIR, "mirror.sqlite3")
+MIRROR_BATCH_PATH = os.path.join(DATA_DIR, "mirror_batch.sqlite3")
+MIRROR_SCHEDULER_PATH = os.path.join(DATA_DIR, "mirror_scheduler.sqlite3")
+MIRROR_SYNC_INTERVAL = 30.0
+MIRROR_CLOSE_TIMEOUT = 5.0
+
+# Client search settings
+CLIENT_SEARCH_LIMIT = 50
+
+# CSV import settings
+IMPORT_BATCH_SIZE = 1000
+IMPORT_SNIFF_BYTES = 64 * 1024
+IMPORT_REJECTS_SUFFIX = ".rejeitados.csv"
+
+# Export settings
+EXPORT_CHUNK_SIZE = 1000
+AGING_EXPORT_SUFFIX = "_atrasos"
+
+# Installment plan settings
+INSTALLMENTS_MAX = 120
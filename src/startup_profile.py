@@ -0,0 +1,79 @@
+import builtins
+import sys
+import time
+from contextlib import contextmanager
+
+SLOWEST_IMPORTS = 15
+
+class StartupProfiler:
+    """
+    Measures where the time goes while the app starts: the time each module
+    takes to import (including the modules it imports), the time until the
+    main window is built and first painted, and the time until the first data
+    load finishes. Does nothing unless enabled; the report goes to stderr.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.import_times = {}
+        self.marks = []
+        self.painted = False
+        self.loaded = False
+
+    @contextmanager
+    def imports(self):
+        """Time the modules first imported inside the block"""
+        if not self.enabled:
+            yield
+            return
+        original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                # Relative imports are counted in the package that makes them
+                return original_import(name, globals, locals, fromlist, level)
+            started = time.perf_counter()
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                self.import_times.setdefault(name, time.perf_counter() - started)
+
+        builtins.__import__ = timed_import
+        try:
+            yield
+        finally:
+            builtins.__import__ = original_import
+            self.mark("imports")
+
+    def mark(self, label):
+        """Record the time elapsed since startup under label"""
+        if self.enabled:
+            self.marks.append((label, time.perf_counter() - self.start))
+
+    def watch(self, root, runner):
+        """Mark the first paint of the window and the end of the first data load, then report"""
+        if not self.enabled:
+            return
+        self.mark("window built")
+        root.bind("<Expose>", lambda event: self.on_paint(), add="+")
+        runner.add_busy_listener(self.on_busy)
+
+    def on_paint(self):
+        if not self.painted:
+            self.painted = True
+            self.mark("first paint")
+
+    def on_busy(self, busy):
+        if not busy and self.painted and not self.loaded:
+            self.loaded = True
+            self.mark("first data loaded")
+            self.report()
+
+    def report(self):
+        """Print the slowest imports and the startup milestones"""
+        lines = ["Startup profile", "  slowest imports (cumulative):"]
+        slowest = sorted(self.import_times.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_IMPORTS]
+        lines.extend(f"    {seconds * 1000:8.1f} ms  {name}" for name, seconds in slowest)
+        lines.append("  milestones:")
+        lines.extend(f"    {seconds * 1000:8.1f} ms  {label}" for label, seconds in self.marks)
+        print("\n".join(lines), file=sys.stderr)
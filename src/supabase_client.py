@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from settings import *
+from local_mirror import LocalMirror
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -9,5 +10,14 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
-# Criar cliente Supabase
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def create_remote():
+    """Criar cliente Supabase; importado só no primeiro uso porque a biblioteca é pesada"""
+    from httpx import Timeout
+    from supabase import create_client, ClientOptions
+    # Uma única sessão HTTP keep-alive compartilhada por todas as consultas, com timeouts explícitos
+    options = ClientOptions(postgrest_client_timeout=Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT))
+    return create_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+
+# Espelho local em SQLite: leituras instantâneas e escritas offline, sincronizado por MirrorSync.
+# O cliente Supabase é criado na primeira consulta que precisar dele, fora da thread do Tk.
+supabase = LocalMirror(create_remote)
@@ -0,0 +1,98 @@
+from itertools import count
+
+MAX_SORT_COLUMNS = 3
+
+def sort_key(value):
+    """Sort key that puts missing values (None) after every other value"""
+    return (value is None, value)
+
+class TableModel:
+    """
+    Rows of a table as tuples of display strings, each with a tuple of typed
+    sort values (int ids, Decimal amounts, date due dates...) kept next to it.
+    The first display value is the row key.
+    Sorting is stable and multi-column: clicking a column makes it the primary
+    key and the columns clicked before break its ties, with the load order as
+    the last tie-breaker. The sorted order of every sort specification is
+    cached until the rows change.
+    """
+    def __init__(self):
+        self.rows = []
+        self.positions = {}
+        self.sort_values = {}
+        self.sequence = {}
+        self.counter = count()
+        self.cache = {}
+        self.spec = []
+        self.directions = {}
+
+    def set_rows(self, rows, sort_values=None):
+        """Replace every row, keeping the current sort"""
+        self.rows = list(rows)
+        self.sort_values = {}
+        self.sequence = {}
+        self.store_values(self.rows, sort_values)
+        self.reindex()
+        if self.spec:
+            self.sort(self.spec)
+
+    def upsert(self, rows, sort_values=None):
+        """Replace rows with the same key in place and append new ones"""
+        rows = list(rows)
+        for values in rows:
+            position = self.positions.get(values[0])
+            if position is None:
+                self.positions[values[0]] = len(self.rows)
+                self.rows.append(values)
+            else:
+                self.rows[position] = values
+        self.store_values(rows, sort_values)
+
+    def delete(self, keys):
+        """Remove rows by key"""
+        self.rows = [values for values in self.rows if values[0] not in keys]
+        for key in keys:
+            self.sort_values.pop(key, None)
+            self.sequence.pop(key, None)
+        self.reindex()
+        self.cache.clear()
+
+    def store_values(self, rows, sort_values):
+        """Record the typed values of rows; rows without them sort by their display values"""
+        if sort_values is None:
+            sort_values = rows
+        for values, typed in zip(rows, sort_values):
+            key = values[0]
+            self.sort_values[key] = tuple(typed)
+            if key not in self.sequence:
+                self.sequence[key] = next(self.counter)
+        self.cache.clear()
+
+    def reindex(self):
+        """Rebuild the key -> position lookup after the rows change order"""
+        self.positions = {values[0]: position for position, values in enumerate(self.rows)}
+
+    def toggle_sort(self, column):
+        """Sort by a column index, alternating ascending and descending on each call"""
+        reverse = self.directions.get(column, False)
+        self.directions[column] = not reverse
+        previous = [(index, direction) for index, direction in self.spec if index != column]
+        self.spec = [(column, reverse)] + previous[:MAX_SORT_COLUMNS - 1]
+        self.sort(self.spec)
+
+    def sorted_keys(self, spec):
+        """Row keys in the order of a sort specification, a sequence of (column index, reverse)"""
+        spec = tuple(spec)
+        keys = self.cache.get(spec)
+        if keys is None:
+            keys = sorted(self.sort_values, key=self.sequence.__getitem__)
+            # Stable sorts from the least significant column to the primary one
+            for column, reverse in reversed(spec):
+                keys.sort(key=lambda key: sort_key(self.sort_values[key][column]), reverse=reverse)
+            self.cache[spec] = keys
+        return keys
+
+    def sort(self, spec):
+        """Reorder every row at once following a sort specification"""
+        self.rows = [self.rows[self.positions[key]] for key in self.sorted_keys(spec)]
+        self.reindex()
@@ -0,0 +1,32 @@
+"""
+Input rules shared by the CRUD windows and the CSV import.
+"""
+import math
+import re
+
+PHONE_MIN_DIGITS = 10
+PHONE_MAX_DIGITS = 14
+# Plain digits with up to two decimal places after a comma or a point: no sign, exponent, "nan" or "inf"
+AMOUNT_PATTERN = re.compile(r"[0-9]+([.,][0-9]{1,2})?")
+# What may be in the amount field while it is being typed, e.g. "12,"
+AMOUNT_INPUT_PATTERN = re.compile(r"[0-9]*([.,][0-9]{0,2})?")
+
+def is_phone_input(value):
+    """Whether a phone as typed contains only numbers and allowed special characters"""
+    return all(char.isdigit() or char in "X()-+" for char in value)
+
+def phone_digits(value):
+    """The digits of a phone number"""
+    return re.sub(r'\D', '', value)
+
+def is_valid_phone(digits):
+    """Whether a phone number has between 10 and 14 digits"""
+    return PHONE_MIN_DIGITS <= len(digits) <= PHONE_MAX_DIGITS
+
+def is_amount_input(value):
+    """Whether an amount being typed can still become a valid amount"""
+    return AMOUNT_INPUT_PATTERN.fullmatch(value) is not None
+
+def is_valid_amount(value):
+    """Whether an amount is a finite non-negative number with up to two decimal places"""
+    return AMOUNT_PATTERN.fullmatch(value) is not None and math.isfinite(float(value.replace(',', '.')))
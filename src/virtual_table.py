@@ -0,0 +1,307 @@
+from tkinter import ttk
+from layout_config import *
+from metrics import timed_action
+from table_model import TableModel
+
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+class VirtualTable:
+    """
+    Treeview that keeps the full dataset in a TableModel and only
+    materializes the rows in view plus a small buffer above and below them.
+    Rows are tuples of values whose first element (the ID column) is the row key,
+    optionally with typed sort values next to them.
+    Selection, sorting and select-all work over the whole model; any other
+    Treeview method (heading, column, grid...) is forwarded to the widget.
+    """
+    def __init__(self, parent, columns, buffer=VIRTUAL_TABLE_BUFFER, **kwargs):
+        self.tree = ttk.Treeview(parent, columns=columns, **kwargs)
+        self.columns = columns
+        self.buffer = buffer
+        self.model = TableModel()
+        self.keys_by_iid = {}
+        self.selected = set()
+        self.rendered_selection = set()
+        self.anchor = None
+        self.extend_selection = False
+        self.offset = 0
+        self.start = 0
+        self.end = 0
+        self.visible_rows = VIRTUAL_TABLE_DEFAULT_VISIBLE_ROWS
+        self.height = 0
+        self.measured = False
+        self.yscrollcommand = None
+        self.select_callbacks = []
+
+        self.tree.configure(yscrollcommand=self.on_tree_scroll)
+        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        self.tree.bind("<ButtonPress-1>", self.on_button_press)
+        self.tree.bind("<KeyPress>", self.on_key_press)
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_rows(3))
+        self.tree.bind("<Configure>", self.on_configure)
+
+    def __getattr__(self, name):
+        if name == "tree":
+            raise AttributeError(name)
+        return getattr(self.tree, name)
+
+    @property
+    def rows(self):
+        return self.model.rows
+
+    @property
+    def positions(self):
+        return self.model.positions
+
+    def configure(self, yscrollcommand=None, **kwargs):
+        """Configure the widget, keeping the scrollbar callback for the virtual view"""
+        if yscrollcommand is not None:
+            self.yscrollcommand = yscrollcommand
+            self.update_scrollbar()
+        if kwargs:
+            self.tree.configure(**kwargs)
+
+    def bind(self, sequence, func, add=None):
+        """Bind an event, dispatching <<TreeviewSelect>> for model selection changes"""
+        if sequence == "<<TreeviewSelect>>":
+            self.select_callbacks.append(func)
+        else:
+            self.tree.bind(sequence, func, add)
+
+    # Model
+
+    def set_rows(self, rows, sort_values=None):
+        """Replace the whole dataset, keeping the current sort, and scroll back to the top"""
+        self.model.set_rows(rows, sort_values)
+        self.reindex()
+        self.selected = set()
+        self.anchor = None
+        self.offset = 0
+        self.render()
+        self.notify_select()
+
+    def reindex(self):
+        """Rebuild the iid -> key lookup after the rows change"""
+        self.keys_by_iid = {str(key): key for key in self.positions}
+
+    def get_children(self):
+        """Return the keys of every row in display order"""
+        return tuple(values[0] for values in self.rows)
+
+    def item(self, key, option=None):
+        """Return the values of a row, like Treeview.item"""
+        values = self.rows[self.positions[key]]
+        if option == "values":
+            return values
+        return {"values": values}
+
+    def delete(self, *keys):
+        """Remove rows from the model"""
+        keys = set(keys)
+        self.model.delete(keys)
+        self.reindex()
+        self.selected -= keys
+        self.offset = min(self.offset, self.max_offset())
+        self.render()
+        self.notify_select()
+
+    def upsert_rows(self, rows, sort_values=None):
+        """Replace rows with the same key in place and append new ones, keeping scroll and selection"""
+        rows = list(rows)
+        self.model.upsert(rows, sort_values)
+        for values in rows:
+            self.keys_by_iid[str(values[0])] = values[0]
+        self.render()
+
+    def update_row(self, values, sort_values=None):
+        """Replace one row in place, touching only its Treeview item if it is rendered"""
+        position = self.positions.get(values[0])
+        self.model.upsert([values], None if sort_values is None else [sort_values])
+        if position is None:
+            self.keys_by_iid[str(values[0])] = values[0]
+            self.render()
+        elif self.start <= position < self.end:
+            self.tree.item(str(values[0]), values=values)
+
+    @timed_action
+    def sort_by(self, column):
+        """Sort by a column, toggling its direction, and reorder the view in one pass"""
+        self.model.toggle_sort(self.columns.index(column))
+        self.render()
+
+    # Selection
+
+    def selection(self):
+        """Return the keys of the selected rows in display order"""
+        return tuple(sorted(self.selected, key=self.positions.__getitem__))
+
+    def selection_set(self, keys):
+        """Select the given rows, whether they are rendered or not"""
+        self.selected = set(keys) & self.positions.keys()
+        self.refresh_selection()
+        self.notify_select()
+
+    def select_all(self):
+        """Select every row of the model"""
+        self.selection_set(self.positions.keys())
+
+    def refresh_selection(self):
+        """Mirror the model selection onto the materialized rows"""
+        visible = [str(values[0]) for values in self.rows[self.start:self.end] if values[0] in self.selected]
+        self.rendered_selection = set(visible)
+        self.tree.selection_set(visible)
+
+    def notify_select(self):
+        """Run the callbacks bound to <<TreeviewSelect>>"""
+        for callback in self.select_callbacks:
+            callback(None)
+
+    def on_button_press(self, event):
+        """Apply shift-click ranges over the model and remember modifiers for the next selection event"""
+        if self.tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return
+        iid = self.tree.identify_row(event.y)
+        key = self.keys_by_iid.get(iid)
+        if key is None:
+            return
+        if event.state & SHIFT_MASK and self.anchor in self.positions:
+            first, last = sorted((self.positions[self.anchor], self.positions[key]))
+            self.selected = {values[0] for values in self.rows[first:last + 1]}
+            self.tree.focus(iid)
+            self.refresh_selection()
+            self.notify_select()
+            return "break"
+        self.anchor = key
+        self.extend_selection = bool(event.state & CONTROL_MASK)
+
+    def on_key_press(self, event):
+        """Remember whether keyboard navigation extends the selection"""
+        self.extend_selection = bool(event.state & (SHIFT_MASK | CONTROL_MASK))
+
+    def on_tree_select(self, event):
+        """Fold a selection change made by the user on the widget back into the model"""
+        current = set(self.tree.selection())
+        if current == self.rendered_selection:
+            return
+        rendered = {values[0] for values in self.rows[self.start:self.end]}
+        chosen = {self.keys_by_iid[iid] for iid in current if iid in self.keys_by_iid}
+        if self.extend_selection:
+            self.selected = (self.selected - rendered) | chosen
+        else:
+            self.selected = chosen
+        self.rendered_selection = current
+        self.notify_select()
+
+    # Viewport
+
+    def max_offset(self):
+        """Largest offset that still fills the view"""
+        return max(0, len(self.rows) - self.visible_rows)
+
+    def render(self):
+        """Materialize the rows in view plus the buffer around them"""
+        focus = self.keys_by_iid.get(self.tree.focus())
+        self.start = max(0, self.offset - self.buffer)
+        self.end = min(len(self.rows), self.offset + self.visible_rows + self.buffer)
+
+        self.tree.delete(*self.tree.get_children())
+        for values in self.rows[self.start:self.end]:
+            self.tree.insert("", "end", iid=str(values[0]), values=values)
+
+        self.refresh_selection()
+        if focus in self.positions and self.start <= self.positions[focus] < self.end:
+            self.tree.focus(str(focus))
+        self.place_view()
+        if not self.measured and self.rows:
+            self.tree.after_idle(self.measure)
+
+    def place_view(self):
+        """Scroll the materialized rows so the row at the offset is on top"""
+        count = self.end - self.start
+        if count:
+            self.tree.yview_moveto((self.offset - self.start) / count)
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        """Report the position of the view over the whole model to the scrollbar"""
+        if not self.yscrollcommand:
+            return
+        total = len(self.rows)
+        if total:
+            self.yscrollcommand(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+        else:
+            self.yscrollcommand(0.0, 1.0)
+
+    def covers(self, offset):
+        """Whether the materialized rows hold the view at offset with some buffer left around it"""
+        margin = self.buffer // 2
+        top = self.start == 0 or offset - self.start >= margin
+        bottom = self.end == len(self.rows) or self.end - (offset + self.visible_rows) >= margin
+        return top and bottom
+
+    def scroll_to(self, offset):
+        """Move the view, rendering a new window only when the buffer runs out"""
+        self.offset = max(0, min(offset, self.max_offset()))
+        if self.covers(self.offset):
+            self.place_view()
+        else:
+            self.render()
+
+    def scroll_rows(self, amount):
+        """Scroll the view by a number of rows"""
+        self.scroll_to(self.offset + amount)
+        return "break"
+
+    def yview(self, *args):
+        """Scrollbar command over the whole model"""
+        if not args:
+            total = len(self.rows) or 1
+            return self.offset / total, min(1.0, (self.offset + self.visible_rows) / total)
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if args[2] == "pages":
+                amount *= self.visible_rows
+            self.scroll_to(self.offset + amount)
+
+    def on_mouse_wheel(self, event):
+        """Scroll the virtual view with the mouse wheel"""
+        return self.scroll_rows(-3 if event.delta > 0 else 3)
+
+    def on_tree_scroll(self, first, last):
+        """Follow scrolls made by the widget itself, e.g. keyboard navigation"""
+        count = self.end - self.start
+        if not count:
+            self.update_scrollbar()
+            return
+        offset = self.start + round(float(first) * count)
+        if offset != self.offset:
+            self.offset = offset
+            if not self.covers(offset):
+                self.tree.after_idle(self.render)
+        self.update_scrollbar()
+
+    def on_configure(self, event):
+        """Recompute how many rows fit after the widget is resized"""
+        self.height = event.height
+        self.measure()
+
+    def measure(self):
+        """Measure the row and heading heights and adjust the number of visible rows"""
+        row_height, heading_height = VIRTUAL_TABLE_DEFAULT_ROW_HEIGHT, VIRTUAL_TABLE_DEFAULT_HEADING_HEIGHT
+        if self.start <= self.offset < self.end:
+            bbox = self.tree.bbox(str(self.rows[self.offset][0]))
+            if bbox:
+                heading_height, row_height = bbox[1], bbox[3]
+                self.measured = True
+        if not self.height:
+            return
+        visible_rows = max(1, (self.height - heading_height) // row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.offset = min(self.offset, self.max_offset())
+            self.render()